@@ -1,19 +1,24 @@
 import streamlit as st
-import os
 import datetime
 import time
 import pandas as pd
-from dotenv import load_dotenv
-from auth import setup_auth, register_user, save_user_data, load_user_data, login, logout, hash_password, CONFIG_PATH
-from chatbot import EMOTIONS, initialize_chat_history, display_chat_history, add_message, get_ai_response, start_new_chat, analyze_emotion, get_system_prompt
+from auth import register_user, load_user_data, load_chat_messages, ensure_system_message, delete_chat_session, apply_emotion_stats_change, append_goal_events, search_chat_sessions, find_similar_sessions, login, logout, hash_password, CONFIG_PATH
+from chatbot import EMOTIONS, EMOTION_ICONS, initialize_chat_history, display_chat_history, add_message, assign_message_seq, reset_render_cursor, get_ai_response, start_new_chat, analyze_emotion, get_system_prompt
+from persistence import persistence
+from session_index import get_session_index
+from emotion_analytics import get_emotion_analytics, emotion_frequency, daily_counts
+from emotion_stats import apply_change, get_emotion_stats
+from emotion_goals import apply_goal_event, emotion_goal_events, empty_goals
+from search_index import conversation_messages
+from resources import load_environment, get_default_api_key, get_credentials, get_css
 from pathlib import Path
 import yaml
 import numpy as np
 from collections import Counter
 import pytz
 
-# 환경 변수 로드
-load_dotenv()
+# 환경 변수 로드 (프로세스당 한 번)
+load_environment()
 
 # 한국 시간대 설정
 KST = pytz.timezone('Asia/Seoul')
@@ -26,67 +31,40 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
-# 감정 아이콘 매핑
-EMOTION_ICONS = {
-    "기쁨": "😊",
-    "슬픔": "😢",
-    "분노": "😠",
-    "불안": "😰",
-    "스트레스": "😫",
-    "외로움": "😔",
-    "후회": "😞",
-    "좌절": "😩",
-    "혼란": "😕",
-    "감사": "🙏"
-}
-
 # 감정 목표 업데이트 함수
 def update_emotion_goal(emotion):
     """
-    감정에 따라 사용자의 감정 목표 진행도를 업데이트하는 함수
+    감정에 따라 사용자의 감정 목표 진행을 기록하는 함수
+    (진행도는 날짜별 성과 횟수에서 계산하고, 저장소에는 목표 이벤트만 추가)
     """
     if not st.session_state.logged_in:
         return
     
-    username = st.session_state.username
-    user_data = st.session_state.user_data
-    
-    # 활성화된 감정 목표 확인
-    emotion_goals = user_data.get("emotion_goals", {"active_goal": None, "history": []})
-    active_goal = emotion_goals.get("active_goal", None)
-    
-    if not active_goal:
+    # 활성화된 감정 목표에 대한 이벤트 (목표 감정과 일치할 때만 생김)
+    emotion_goals = st.session_state.user_data.setdefault("emotion_goals", empty_goals())
+    today = datetime.datetime.now().strftime("%Y-%m-%d")
+    events = emotion_goal_events(emotion_goals, emotion, today)
+    if not events:
         return
     
-    # 목표 감정과 현재 감정 비교
-    target_emotion = active_goal.get("target_emotion")
-    if emotion == target_emotion:
-        # 목표 감정과 일치하는 경우 진행도 증가
-        progress = active_goal.get("progress", 0)
-        # 5% 증가, 최대 100%
-        progress = min(progress + 5, 100)
-        active_goal["progress"] = progress
-        
-        # 성과 기록
-        today = datetime.datetime.now().strftime("%Y-%m-%d")
-        active_goal.setdefault("achievements", []).append({
-            "date": today,
-            "description": f"목표 감정 '{target_emotion}'을(를) 경험했습니다."
-        })
-        
-        # 목표 달성 시 자동 완료
-        if progress >= 100:
-            active_goal["completed"] = True
-            active_goal["completion_date"] = today
-            emotion_goals["history"].append(active_goal)
-            emotion_goals["active_goal"] = None
-    
-    # 사용자 데이터 업데이트
-    user_data["emotion_goals"] = emotion_goals
-    st.session_state.user_data = user_data
+    # 이벤트를 적용하고, 달성한 목표는 목표 보관함으로 옮김
+    completed = [goal for goal in (apply_goal_event(emotion_goals, event) for event in events) if goal]
+    append_goal_events(st.session_state.username, events, completed)
+
+# 감정 누적 통계 업데이트 함수
+def update_emotion_stats(chat_id, chat_date, previous_emotion, emotion):
+    """
+    대화 하나의 감정 변경을 누적 통계에 반영하고 저장하는 함수
+    (새 대화는 previous_emotion=None, 삭제한 대화는 emotion=None)
+    화면용 통계는 바로 고치고, 저장소에는 변경만 넘겨 저장된 통계에 반영하게 함
+    """
+    if not st.session_state.logged_in:
+        return
     
-    # 데이터 저장
-    save_user_data(username, user_data)
+    stats = get_emotion_stats(st.session_state.user_data)
+    session_index = get_session_index(st.session_state)
+    if apply_change(stats, chat_date, previous_emotion, emotion, session_index.latest_date):
+        apply_emotion_stats_change(st.session_state.username, chat_id, chat_date, previous_emotion, emotion)
 
 # 감정 선택 저장 처리
 def handle_emotion_selection(emotion):
@@ -96,65 +74,76 @@ def handle_emotion_selection(emotion):
     # 감정 설정
     st.session_state.selected_emotion = emotion
     
-    # 현재 채팅 세션에 감정 저장
-    if 'chat_id' not in st.session_state:
+    # 아직 사용자가 말하지 않은 현재 채팅이면 그 세션의 감정만 바꾸고, 아니면 새 채팅 id 부여
+    session_index = get_session_index(st.session_state)
+    current_chat = session_index.get(st.session_state.get('current_chat_id'))
+    if current_chat is None or "messages" not in current_chat or any(
+            msg.get("role") == "user" for msg in current_chat["messages"]):
         timestamp = datetime.datetime.now().isoformat()
-        st.session_state.chat_id = f"chat_{timestamp}"
-    
-    chat_id = st.session_state.chat_id
+        chat_id = f"chat_{timestamp}"
+        current_chat = None
+    else:
+        chat_id = current_chat["id"]
     
     # 채팅 세션 업데이트
     if 'user_data' in st.session_state and 'chat_sessions' in st.session_state.user_data:
-        chat_sessions = st.session_state.user_data['chat_sessions']
-        found = False
-        for i, chat in enumerate(chat_sessions):
-            if chat['id'] == chat_id:
-                chat['emotion'] = emotion
-                found = True
-                break
-                
-        if not found:
+        if current_chat is not None:
+            previous_emotion = current_chat.get("emotion")
+            session_index.set_emotion(chat_id, emotion)
+        else:
+            previous_emotion = None
             # 새 채팅 세션 생성
-            chat_sessions.append({
+            current_chat = {
                 "id": chat_id,
                 "date": datetime.datetime.now().isoformat(),
                 "emotion": emotion,
                 "preview": "새로운 대화",
                 "messages": []
-            })
+            }
+            session_index.add(current_chat)
         
-        # 채팅 기록 업데이트
-        st.session_state.user_data['chat_sessions'] = chat_sessions
+        # 변경된 세션으로 표시
+        persistence.mark_dirty(st.session_state.username, current_chat)
         
-        # 사용자 데이터 저장
-        save_user_data(st.session_state.username, st.session_state.user_data)
-        
-        # 감정 목표 업데이트
+        # 감정 누적 통계 / 감정 목표 업데이트
+        update_emotion_stats(current_chat["id"], current_chat["date"], previous_emotion, emotion)
         update_emotion_goal(emotion)
     
     # 새 채팅 시작
     st.session_state.chat_started = True
-    start_new_chat(emotion)
+    start_new_chat(emotion, chat_id)
     
     # 화면 갱신
     st.rerun()
 
-# DataFrames를 페이지네이션과 함께 표시하는 함수
-def display_dataframe_with_pagination(df, page_size=10, key="pagination"):
+# 기록 화면 한 페이지에 표시할 대화 카드 수
+HISTORY_PAGE_SIZE = 10
+
+# 대화 검색 결과 수
+SEARCH_RESULT_LIMIT = 10
+
+# 선택한 대화 화면에 표시할 비슷한 대화 수
+SIMILAR_SESSION_LIMIT = 5
+
+# 페이지 이동 컨트롤 표시 함수
+def pagination_controls(total_items, page_size=10, key="pagination"):
     """
-    DataFrame을 페이지네이션과 함께 표시하는 함수
+    이전/다음 버튼과 페이지 정보를 표시하고 현재 페이지의 (시작, 끝) 인덱스를 반환하는 함수
     """
     # 세션 상태 초기화
     if f'{key}_page' not in st.session_state:
         st.session_state[f'{key}_page'] = 0
     
-    # 전체 페이지 수 계산
-    total_pages = max(len(df) // page_size, 1)
+    # 전체 페이지 수 계산 (마지막 일부 페이지 포함)
+    total_pages = max(-(-total_items // page_size), 1)
     
-    # 현재 페이지 데이터 가져오기
+    # 항목 수가 줄어 현재 페이지가 범위를 벗어나면 마지막 페이지로 이동
+    if st.session_state[f'{key}_page'] > total_pages - 1:
+        st.session_state[f'{key}_page'] = total_pages - 1
+    
+    # 현재 페이지 범위
     start_idx = st.session_state[f'{key}_page'] * page_size
-    end_idx = min(start_idx + page_size, len(df))
-    page_df = df.iloc[start_idx:end_idx]
+    end_idx = min(start_idx + page_size, total_items)
     
     # 하단 컨트롤
     cols = st.columns([1, 3, 1])
@@ -167,7 +156,7 @@ def display_dataframe_with_pagination(df, page_size=10, key="pagination"):
     
     # 페이지 정보
     with cols[1]:
-        st.markdown(f"**{st.session_state[f'{key}_page'] + 1}/{total_pages} 페이지** (총 {len(df)}개)")
+        st.markdown(f"**{st.session_state[f'{key}_page'] + 1}/{total_pages} 페이지** (총 {total_items}개)")
     
     # 다음 페이지 버튼
     with cols[2]:
@@ -175,482 +164,119 @@ def display_dataframe_with_pagination(df, page_size=10, key="pagination"):
             st.session_state[f'{key}_page'] = min(total_pages - 1, st.session_state[f'{key}_page'] + 1)
             st.rerun()
     
-    # 현재 페이지 데이터 표시
-    st.dataframe(page_df, use_container_width=True)
+    return start_idx, end_idx
 
-# CSS 스타일 적용
-st.markdown("""
-<style>
-    /* 기본 스타일 */
-    :root {
-        --primary-color: #4f8bf9;
-        --secondary-color: #f6a8cc;
-        --background-color: #f9f9f9;
-        --card-background: white;
-        --text-color: #333;
-        --secondary-text-color: #666;
-        --border-color: #e0e0e0;
-        --hover-color: #f9f9ff;
-        --button-color: #6a89cc;
-        --button-hover: #5679c1;
-        --warning-color: #f44336;
-        --success-color: #4CAF50;
-        --emotion-grid-columns: 4;
-    }
-    
-    /* 다크 모드 */
-    [data-theme="dark"] {
-        --primary-color: #6a89cc;
-        --secondary-color: #f6a8cc;
-        --background-color: #1e1e1e;
-        --card-background: #2d2d2d;
-        --text-color: #f0f0f0;
-        --secondary-text-color: #aaaaaa;
-        --border-color: #444444;
-        --hover-color: #3d3d3d;
-        --button-color: #5679c1;
-        --button-hover: #4a6cb3;
-        --warning-color: #ff5252;
-        --success-color: #81c784;
-    }
+# DataFrames를 페이지네이션과 함께 표시하는 함수
+def display_dataframe_with_pagination(df, page_size=10, key="pagination"):
+    """
+    DataFrame을 페이지네이션과 함께 표시하는 함수
+    """
+    start_idx, end_idx = pagination_controls(len(df), page_size=page_size, key=key)
     
-    /* 기본적으로 라이트 모드 */
-    body {
-        color: var(--text-color);
-        background-color: var(--background-color);
-        transition: all 0.3s ease;
-    }
+    # 현재 페이지 데이터 표시
+    st.dataframe(df.iloc[start_idx:end_idx], use_container_width=True)
+
+# 대화 검색 결과 표시 함수
+def display_search_results(query):
+    """
+    모든 대화에서 검색한 결과를 점수 순으로 표시하는 함수 (일치한 메시지 일부 포함)
+    """
+    results = search_chat_sessions(st.session_state.username, query, limit=SEARCH_RESULT_LIMIT)
+    if not results:
+        st.info("검색 결과가 없습니다.")
+        return
     
-    /* 반응형 디자인 */
-    @media (max-width: 768px) {
-        .main-header {
-            font-size: 1.8rem !important;
-        }
-        
-        .sub-header {
-            font-size: 1.2rem !important;
-        }
-        
-        :root {
-            --emotion-grid-columns: 2;
-        }
-        
-        .emotion-button {
-            padding: 8px !important;
-            margin: 4px !important;
-            font-size: 0.9rem !important;
-        }
-        
-        .emotion-grid {
-            display: grid;
-            grid-template-columns: repeat(var(--emotion-grid-columns), 1fr);
-            gap: 8px;
-            margin-bottom: 16px;
-        }
-        
-        .chat-container {
-            height: 350px !important;
-            padding: 15px !important;
-        }
-        
-        .chat-card {
-            padding: 10px !important;
-            margin-bottom: 10px !important;
-        }
-        
-        /* 모바일에서 테이블 스크롤 가능하게 */
-        .dataframe-container {
-            overflow-x: auto !important;
-            width: 100% !important;
-        }
+    st.markdown(f"<div style='margin-bottom: 10px;'><strong>{len(results)}개</strong>의 대화에서 찾았습니다.</div>", unsafe_allow_html=True)
+    
+    session_index = get_session_index(st.session_state)
+    for result in results:
+        chat = session_index.get(result["chat_id"])
+        if chat is None:
+            continue
+        
+        # 가장 많이 일치한 메시지를 미리보기로 표시
+        messages = conversation_messages(load_chat_messages(st.session_state.username, chat))
+        snippet = next(
+            (messages[offset].get('content', '') for offset in result["offsets"] if offset < len(messages)),
+            chat.get('preview', '대화 내용 없음')
+        )
+        
+        st.markdown(f"""
+        <div class="chat-card">
+            <div class="chat-card-header">
+                <span class="chat-card-emotion">{EMOTION_ICONS.get(chat.get('emotion', ''), '')} {chat.get('emotion', '알 수 없음')}</span>
+                <span class="chat-card-date">{datetime.datetime.fromisoformat(chat.get('date', '')).strftime("%Y년 %m월 %d일 %H:%M")}</span>
+            </div>
+            <div class="chat-card-preview">{snippet[:100]}...</div>
+        </div>
+        """, unsafe_allow_html=True)
         
-        /* 모바일에서 사이드바가 너무 좁지 않게 */
-        .css-1d391kg, .css-1lcbmhc {
-            width: 100% !important;
-        }
-    }
-    
-    /* 공통 스타일 */
-    .main-header {
-        font-size: 2.5rem;
-        color: var(--primary-color);
-        text-align: center;
-        margin-bottom: 1rem;
-    }
-    
-    .sub-header {
-        font-size: 1.5rem;
-        color: var(--primary-color);
-        margin-bottom: 1rem;
-    }
-    
-    /* 감정 선택 UI 개선 */
-    .emotion-container {
-        padding: 15px;
-        border-radius: 10px;
-        background-color: var(--card-background);
-        margin-bottom: 20px;
-        box-shadow: 0 2px 10px rgba(0,0,0,0.1);
-    }
-    
-    .emotion-grid {
-        display: grid;
-        grid-template-columns: repeat(var(--emotion-grid-columns), 1fr);
-        gap: 12px;
-        margin: 15px 0;
-    }
-    
-    .emotion-button {
-        background-color: var(--card-background);
-        color: var(--text-color);
-        border: 1px solid var(--border-color);
-        border-radius: 10px;
-        padding: 15px 10px;
-        text-align: center;
-        cursor: pointer;
-        transition: all 0.3s ease;
-        display: flex;
-        flex-direction: column;
-        align-items: center;
-        justify-content: center;
-        box-shadow: 0 2px 5px rgba(0,0,0,0.05);
-    }
-    
-    .emotion-button:hover {
-        transform: translateY(-2px);
-        box-shadow: 0 5px 15px rgba(0,0,0,0.1);
-        background-color: var(--hover-color);
-    }
-    
-    .emotion-button .emoji {
-        font-size: 2rem;
-        margin-bottom: 8px;
-        display: block;
-    }
-    
-    .emotion-button.selected {
-        background-color: var(--button-color);
-        color: white;
-        border-color: transparent;
-    }
-    
-    /* 채팅 컨테이너 개선 */
-    .chat-container {
-        border-radius: 10px;
-        padding: 20px;
-        background-color: var(--card-background);
-        height: 400px;
-        overflow-y: auto;
-        box-shadow: 0 2px 10px rgba(0,0,0,0.1);
-        margin-bottom: 15px;
-        border: 1px solid var(--border-color);
-    }
-    
-    /* 입력 필드 개선 */
-    .stTextInput > div > div > input {
-        border-radius: 20px;
-        padding: 10px 15px;
-        border: 1px solid var(--border-color);
-        background-color: var(--card-background);
-        color: var(--text-color);
-        transition: all 0.3s ease;
-    }
-    
-    .stTextInput > div > div > input:focus {
-        border-color: var(--primary-color);
-        box-shadow: 0 0 0 2px rgba(79, 139, 249, 0.2);
-    }
-    
-    .stTextInput input, .stSelectbox, .stDateInput input, .stTextArea textarea {
-        background-color: var(--card-background) !important;
-        color: var(--text-color) !important;
-        border-color: var(--border-color) !important;
-    }
-    
-    .stDataFrame {
-        background-color: var(--card-background) !important;
-    }
-    
-    .stDataFrame th {
-        background-color: var(--primary-color) !important;
-        color: white !important;
-    }
-    
-    .stDataFrame td {
-        color: var(--text-color) !important;
-    }
-    
-    /* 테이블 스타일 개선 */
-    .dataframe-container {
-        border-radius: 10px;
-        overflow: hidden;
-        box-shadow: 0 2px 10px rgba(0,0,0,0.1);
-        margin-bottom: 20px;
-    }
-    
-    .table-controls {
-        display: flex;
-        justify-content: space-between;
-        align-items: center;
-        margin-bottom: 10px;
-        flex-wrap: wrap;
-    }
-    
-    .table-search {
-        flex: 1;
-        max-width: 300px;
-        margin-right: 10px;
-    }
-    
-    .table-page-controls {
-        display: flex;
-        align-items: center;
-    }
-    
-    .table-page-controls button {
-        margin: 0 5px;
-        min-width: 30px;
-    }
-    
-    .sortable-header {
-        cursor: pointer;
-        position: relative;
-    }
-    
-    .sortable-header:hover {
-        background-color: rgba(0,0,0,0.05);
-    }
-    
-    .sortable-header::after {
-        content: "↕";
-        position: absolute;
-        right: 8px;
-        opacity: 0.5;
-    }
-    
-    .sort-asc::after {
-        content: "↑";
-        opacity: 1;
-    }
-    
-    .sort-desc::after {
-        content: "↓";
-        opacity: 1;
-    }
-    
-    /* 채팅 카드 스타일 */
-    .chat-card {
-        border: 1px solid var(--border-color);
-        border-radius: 10px;
-        padding: 15px;
-        margin-bottom: 15px;
-        background-color: var(--card-background);
-        box-shadow: 0 2px 5px rgba(0,0,0,0.1);
-        transition: transform 0.2s, box-shadow 0.2s;
-        position: relative;
-        z-index: 1;
-        cursor: pointer;
-    }
-    
-    .chat-card:hover {
-        transform: translateY(-2px);
-        box-shadow: 0 4px 8px rgba(0,0,0,0.15);
-        background-color: var(--hover-color);
-        border-color: var(--button-color);
-    }
-    
-    .chat-card:after {
-        content: "›";
-        position: absolute;
-        right: 15px;
-        top: 50%;
-        transform: translateY(-50%);
-        font-size: 24px;
-        color: var(--button-color);
-        opacity: 0;
-        transition: opacity 0.2s;
-    }
-    
-    .chat-card:hover:after {
-        opacity: 1;
-    }
-    
-    /* Streamlit 버튼 스타일링 - 보이지 않지만 클릭 가능하게 */
-    div.chat-history-card div.stButton {
-        position: absolute;
-        top: 0;
-        left: 0;
-        width: 100%;
-        height: 100%;
-        z-index: 2;
-    }
-    
-    div.chat-history-card div.stButton > button {
-        position: absolute;
-        top: 0;
-        left: 0;
-        width: 100% !important;
-        height: 100% !important;
-        background: transparent !important;
-        border: none !important;
-        box-shadow: none !important;
-        color: transparent !important;
-        opacity: 0 !important;
-    }
-    
-    .chat-card-header {
-        border-bottom: 1px solid var(--border-color);
-        padding-bottom: 10px;
-        margin-bottom: 10px;
-        display: flex;
-        justify-content: space-between;
-    }
-    
-    .chat-card-emotion {
-        font-weight: bold;
-        color: var(--primary-color);
-    }
-    
-    .chat-card-date {
-        color: var(--secondary-text-color);
-        font-size: 0.9rem;
-    }
-    
-    .chat-card-preview {
-        color: var(--text-color);
-        overflow: hidden;
-        text-overflow: ellipsis;
-        display: -webkit-box;
-        -webkit-line-clamp: 2;
-        -webkit-box-orient: vertical;
-    }
-    
-    .filter-section {
-        background-color: var(--background-color);
-        border-radius: 10px;
-        padding: 15px;
-        margin-bottom: 20px;
-        border: 1px solid var(--border-color);
-    }
-    
-    .filter-title {
-        font-size: 1.2rem;
-        font-weight: bold;
-        margin-bottom: 10px;
-        color: var(--primary-color);
-    }
-    
-    .filter-item {
-        margin-bottom: 5px;
-    }
-    
-    .action-button {
-        border-radius: 20px;
-        padding: 10px 15px;
-        font-weight: bold;
-        transition: all 0.3s;
-    }
-    
-    .icon-button {
-        display: flex;
-        justify-content: center;
-        align-items: center;
-        width: 36px;
-        height: 36px;
-        border-radius: 50%;
-        font-size: 1.2rem;
-        cursor: pointer;
-        transition: background-color 0.3s;
-    }
-    
-    .view-button {
-        background-color: var(--background-color);
-        color: var(--primary-color);
-    }
-    
-    .view-button:hover {
-        background-color: var(--hover-color);
-    }
-    
-    .delete-button {
-        background-color: #ffebee;
-        color: var(--warning-color);
-    }
-    
-    .delete-button:hover {
-        background-color: #ffcdd2;
-    }
-    
-    .pagination-button {
-        margin: 0 4px;
-        padding: 6px 12px;
-        border-radius: 4px;
-        background-color: var(--background-color);
-        color: var(--text-color);
-        border: 1px solid var(--border-color);
-        cursor: pointer;
-        transition: all 0.3s;
-    }
-    
-    .pagination-button:hover {
-        background-color: var(--hover-color);
-    }
-    
-    .pagination-active {
-        background-color: var(--primary-color);
-        color: white;
-        border-color: var(--primary-color);
-    }
+        if st.button("보기", key=f"search_result_{chat['id']}"):
+            st.session_state.selected_chat_id = chat['id']
+            st.rerun()
+
+# 감정 통계 화면 표시 함수
+def display_emotion_dashboard():
+    """
+    감정 빈도, 주별 추이, 연속 기록, 감정 전이를 표시하는 함수
+    (감정 빈도 / 일별 기록 / 마지막 기록은 누적 통계에서 읽고,
+    나머지 통계는 세션 목록이 바뀔 때만 다시 계산)
+    """
+    st.title("감정 통계")
     
-    .filter-badge {
-        display: inline-block;
-        padding: 4px 8px;
-        margin: 2px;
-        border-radius: 4px;
-        background-color: var(--button-color);
-        color: white;
-        font-size: 0.8rem;
-    }
+    session_index = get_session_index(st.session_state)
+    analytics = get_emotion_analytics(
+        st.session_state.get('username'), session_index.data_version, session_index.sessions, EMOTIONS
+    )
+    stats = get_emotion_stats(st.session_state.user_data)
     
-    /* 로그인/회원가입 버튼 스타일 */
-    .login-button, .auth-container button {
-        display: block;
-        width: 100%;
-        background-color: var(--button-color);
-        color: white;
-        padding: 8px 15px;
-        border-radius: 5px;
-        border: none;
-        cursor: pointer;
-        font-weight: 500;
-        margin: 8px 0;
-        text-align: center;
-        opacity: 1;
-        position: relative;
-    }
+    if not analytics["total_sessions"]:
+        st.info("아직 대화 기록이 없습니다.")
+        return
     
-    .login-button:hover, .auth-container button:hover {
-        background-color: var(--button-hover);
-    }
-</style>
-""", unsafe_allow_html=True)
+    # 요약 지표
+    streaks = analytics["streaks"]
+    metric_cols = st.columns(3)
+    metric_cols[0].metric("전체 대화", f"{analytics['total_sessions']}개")
+    metric_cols[1].metric("현재 연속 기록", f"{streaks['current_days']}일")
+    metric_cols[2].metric("최장 연속 기록", f"{streaks['longest_days']}일")
+    if streaks["longest_emotion"]:
+        emotion_icon = EMOTION_ICONS.get(streaks["longest_emotion"], "")
+        st.markdown(
+            f"가장 길게 이어진 감정: **{emotion_icon} {streaks['longest_emotion']}** "
+            f"({streaks['longest_emotion_run']}번 연속)"
+        )
+    
+    # 감정 빈도
+    st.subheader("감정 빈도")
+    st.bar_chart(emotion_frequency(stats["counts"], EMOTIONS)["count"])
+    
+    # 주별 감정 추이
+    st.subheader("주별 감정 추이")
+    st.line_chart(analytics["weekly"])
+    
+    # 최근 30일 일별 감정 추이
+    st.subheader("최근 30일 감정 기록")
+    st.bar_chart(daily_counts(stats["daily"], EMOTIONS))
+    
+    # 감정별 마지막 기록
+    st.subheader("감정별 마지막 기록")
+    last_seen = [
+        {"감정": f"{EMOTION_ICONS.get(emotion, '')} {emotion}", "마지막 대화": stats["last_seen"][emotion][:16].replace("T", " ")}
+        for emotion in EMOTIONS if emotion in stats["last_seen"]
+    ]
+    st.dataframe(pd.DataFrame(last_seen), hide_index=True, use_container_width=True)
+    
+    # 감정 전이 행렬
+    st.subheader("감정 전이")
+    st.caption("이전 대화의 감정(행) 다음 대화에서 각 감정(열)이 나타난 비율")
+    st.dataframe(analytics["transitions"].style.format("{:.0%}"), use_container_width=True)
 
-# 인증 정보 설정
-credentials = setup_auth()
+# CSS 스타일 적용 (파일은 프로세스당 한 번만 읽음)
+st.markdown(get_css(), unsafe_allow_html=True)
 
-# 감정 아이콘 매핑
-EMOTION_ICONS = {
-    "기쁨": "😊",
-    "슬픔": "😢",
-    "분노": "😠",
-    "불안": "😰",
-    "스트레스": "😫",
-    "외로움": "😔",
-    "후회": "😞",
-    "좌절": "😩",
-    "혼란": "😕",
-    "감사": "🙏"
-}
+# 인증 정보 설정 (로그인 정보 저장소는 프로세스 단위로 공유)
+credentials = get_credentials()
 
 # 세션 상태 초기화
 if 'logged_in' not in st.session_state:
@@ -664,7 +290,7 @@ if 'active_tab' not in st.session_state:
 if 'active_page' not in st.session_state:
     st.session_state.active_page = "chat"
 if 'api_key' not in st.session_state:
-    st.session_state.api_key = os.getenv("OPENAI_API_KEY", "")
+    st.session_state.api_key = get_default_api_key()
 if 'selected_chat_id' not in st.session_state:
     st.session_state.selected_chat_id = None
 if 'theme' not in st.session_state:
@@ -672,63 +298,16 @@ if 'theme' not in st.session_state:
 if 'user_data' not in st.session_state:
     st.session_state.user_data = {"chat_history": [], "chat_sessions": []}
 
-# 자동 저장 함수 정의
-def auto_save():
-    """
-    현재 채팅을 자동으로 저장하는 함수
-    """
-    if not st.session_state.logged_in or not st.session_state.selected_emotion:
-        return
-    
-    # 현재 채팅 ID가 없으면 생성
-    if 'current_chat_id' not in st.session_state:
-        timestamp = datetime.datetime.now().isoformat()
-        st.session_state.current_chat_id = f"chat_{timestamp}"
-    
-    # 채팅 세션 업데이트
-    if 'user_data' not in st.session_state:
-        st.session_state.user_data = {"chat_history": [], "chat_sessions": []}
-    
-    chat_sessions = st.session_state.user_data.get('chat_sessions', [])
-    current_chat_id = st.session_state.current_chat_id
-    
-    # 현재 채팅 찾기 또는 새로 생성
-    current_chat = None
-    for chat in chat_sessions:
-        if chat['id'] == current_chat_id:
-            current_chat = chat
-            break
-    
-    if not current_chat:
-        current_chat = {
-            "id": current_chat_id,
-            "date": datetime.datetime.now().isoformat(),
-            "emotion": st.session_state.selected_emotion,
-            "messages": []
-        }
-        chat_sessions.append(current_chat)
-    
-    # 메시지 업데이트
-    if 'messages' in st.session_state:
-        current_chat['messages'] = st.session_state.messages
-        # 미리보기 업데이트 (마지막 사용자 메시지)
-        user_messages = [msg for msg in st.session_state.messages if msg['role'] == 'user']
-        if user_messages:
-            current_chat['preview'] = user_messages[-1]['content'][:100]
-    
-    # 사용자 데이터 업데이트
-    st.session_state.user_data['chat_sessions'] = chat_sessions
-    save_user_data(st.session_state.username, st.session_state.user_data)
-
+# 현재 채팅 저장 함수
 def save_current_chat():
     """
-    현재 채팅을 저장하는 함수
+    현재 채팅을 저장 대상으로 표시하는 함수 (실제 저장은 저장 서비스가 모아서 처리)
     """
     if not st.session_state.logged_in or not st.session_state.selected_emotion:
         return
     
     # 현재 채팅 ID가 없으면 생성
-    if 'current_chat_id' not in st.session_state:
+    if not st.session_state.get('current_chat_id'):
         timestamp = datetime.datetime.now().isoformat()
         st.session_state.current_chat_id = f"chat_{timestamp}"
     
@@ -736,16 +315,11 @@ def save_current_chat():
     if 'user_data' not in st.session_state:
         st.session_state.user_data = {"chat_history": [], "chat_sessions": []}
     
-    chat_sessions = st.session_state.user_data.get('chat_sessions', [])
+    session_index = get_session_index(st.session_state)
     current_chat_id = st.session_state.current_chat_id
     
     # 현재 채팅 찾기 또는 새로 생성
-    current_chat = None
-    for chat in chat_sessions:
-        if chat['id'] == current_chat_id:
-            current_chat = chat
-            break
-    
+    current_chat = session_index.get(current_chat_id)
     if not current_chat:
         current_chat = {
             "id": current_chat_id,
@@ -753,40 +327,55 @@ def save_current_chat():
             "emotion": st.session_state.selected_emotion,
             "messages": []
         }
-        chat_sessions.append(current_chat)
+        session_index.add(current_chat)
+        update_emotion_stats(current_chat["id"], current_chat["date"], None, current_chat["emotion"])
     
     # 메시지 업데이트
     if 'messages' in st.session_state:
         current_chat['messages'] = st.session_state.messages
-        # 미리보기 업데이트 (마지막 사용자 메시지)
-        user_messages = [msg for msg in st.session_state.messages if msg['role'] == 'user']
-        if user_messages:
-            current_chat['preview'] = user_messages[-1]['content'][:100]
+        # 미리보기 업데이트 (뒤에서부터 마지막 사용자 메시지를 찾음)
+        for msg in reversed(st.session_state.messages):
+            if msg['role'] == 'user':
+                current_chat['preview'] = msg['content'][:100]
+                break
     
-    # 사용자 데이터 업데이트
-    st.session_state.user_data['chat_sessions'] = chat_sessions
-    save_user_data(st.session_state.username, st.session_state.user_data)
+    # 변경된 세션으로 표시
+    persistence.mark_dirty(st.session_state.username, current_chat)
 
 # 사이드바 - 로그인/로그아웃
 with st.sidebar:
     if st.button("로그아웃"):
+        # 저장 대기 중인 변경을 모두 저장한 후 로그아웃
+        if st.session_state.get('username'):
+            persistence.flush(st.session_state.username)
         logout()
         st.session_state.logged_in = False
         st.session_state.selected_emotion = None
         st.session_state.chat_started = False
         st.session_state.active_page = "chat"
         st.session_state.selected_chat_id = None
+        st.session_state.current_chat_id = None
         st.session_state.confirm_delete_dialog = False
         st.success("로그아웃되었습니다.")
         st.rerun()
 
+    # 감정 통계 / 대화 기록 화면 전환
+    if st.session_state.active_page == "dashboard":
+        if st.button("대화 기록"):
+            st.session_state.active_page = "chat"
+            st.rerun()
+    elif st.button("감정 통계"):
+        st.session_state.active_page = "dashboard"
+        st.session_state.selected_chat_id = None
+        st.rerun()
+
+# 감정 통계 화면
+if st.session_state.active_page == "dashboard":
+    display_emotion_dashboard()
 # 채팅 세션 정보 표시
-if st.session_state.selected_chat_id:
-    selected_chat = None
-    for chat in st.session_state.user_data['chat_sessions']:
-        if chat['id'] == st.session_state.selected_chat_id:
-            selected_chat = chat
-            break
+elif st.session_state.selected_chat_id:
+    session_index = get_session_index(st.session_state)
+    selected_chat = session_index.get(st.session_state.selected_chat_id)
 
     if selected_chat:
         with st.container():
@@ -795,8 +384,10 @@ if st.session_state.selected_chat_id:
                 if st.button("채팅 삭제", key="confirm_delete_yes"):
                     st.session_state.selected_chat_id = None
                     st.session_state.confirm_delete_dialog = False
-                    st.session_state.user_data['chat_sessions'].remove(selected_chat)
-                    save_user_data(st.session_state.username, st.session_state.user_data)
+                    session_index.remove(selected_chat['id'])
+                    update_emotion_stats(selected_chat['id'], selected_chat['date'], selected_chat.get('emotion'), None)
+                    persistence.discard(st.session_state.username, selected_chat['id'])
+                    delete_chat_session(st.session_state.username, selected_chat['id'])
                     st.session_state.selected_chat_id = None
                     st.session_state.confirm_delete_dialog = False
                     st.success("대화가 삭제되었습니다.")
@@ -816,8 +407,9 @@ if st.session_state.selected_chat_id:
     st.markdown(f"**감정:** {emotion_icon} {emotion}")
     st.markdown("---")
 
-    # 채팅 내용 표시
-    for msg in selected_chat['messages']:
+    # 채팅 내용 표시 (메시지는 세션을 열 때 불러옴)
+    selected_messages = load_chat_messages(st.session_state.username, selected_chat)
+    for msg in selected_messages:
         role = msg.get('role', '')
         content = msg.get('content', '')
         
@@ -826,6 +418,29 @@ if st.session_state.selected_chat_id:
         elif role == 'assistant':
             st.chat_message("assistant").write(content)
 
+    # 비슷한 지난 대화 (TF-IDF 코사인 유사도 순)
+    if st.session_state.get('username'):
+        similar_sessions = find_similar_sessions(
+            st.session_state.username, selected_chat['id'], limit=SIMILAR_SESSION_LIMIT, wait=False
+        )
+        if similar_sessions is None:
+            st.caption("비슷한 대화를 찾을 준비를 하고 있습니다. 잠시 후 다시 확인해주세요.")
+        elif similar_sessions:
+            st.markdown("---")
+            st.subheader("비슷한 대화")
+            for chat_id, similarity in similar_sessions:
+                similar_chat = session_index.get(chat_id)
+                if similar_chat is None:
+                    continue
+                similar_date = datetime.datetime.fromisoformat(similar_chat['date']).strftime("%Y년 %m월 %d일")
+                label = (
+                    f"{EMOTION_ICONS.get(similar_chat.get('emotion', ''), '')} {similar_date} · "
+                    f"{similar_chat.get('preview', '대화 내용 없음')[:40]} ({similarity:.0%})"
+                )
+                if st.button(label, key=f"similar_{chat_id}"):
+                    st.session_state.selected_chat_id = chat_id
+                    st.rerun()
+
     # 채팅 계속하기 버튼
     if st.button("이 대화 계속하기"):
         st.session_state.active_page = "chat"
@@ -835,23 +450,29 @@ if st.session_state.selected_chat_id:
         # 기존 채팅 ID 사용
         st.session_state.current_chat_id = selected_chat['id']
         
-        # displayed_messages 초기화
-        if 'displayed_messages' in st.session_state:
-            del st.session_state.displayed_messages
-        
-        # 채팅 메시지 복원
-        st.session_state.messages = []
+        # 채팅 표시 위치 초기화
+        reset_render_cursor()
         
-        # 시스템 메시지 추가
-        system_prompt = get_system_prompt(selected_chat.get('emotion', None))
-        st.session_state.messages.append({"role": "system", "content": system_prompt})
+        # 시스템 메시지가 없으면 맨 앞에 추가하고 저장된 메시지도 다시 기록
+        if not selected_messages or selected_messages[0].get('role') != 'system':
+            system_prompt = get_system_prompt(selected_chat.get('emotion', None))
+            selected_messages = ensure_system_message(
+                st.session_state.username, selected_chat, {"role": "system", "content": system_prompt}
+            )
         
-        # 대화 메시지 추가
-        for msg in selected_chat['messages']:
-            st.session_state.messages.append(msg)
+        # 채팅 메시지 복원 (저장된 목록을 그대로 이어서 사용, seq는 여기서 한 번만 부여)
+        st.session_state.messages = selected_messages
+        assign_message_seq(selected_messages)
         
         st.rerun()
 else:
+    # 대화 내용 검색 (검색 색인으로 모든 대화에서 찾기)
+    if st.session_state.get('username'):
+        search_query = st.text_input("대화 검색", key="search_query", placeholder="대화 내용에서 찾을 말을 입력하세요")
+        if search_query.strip():
+            display_search_results(search_query.strip())
+            st.markdown("---")
+    
     # 필터링 옵션 초기화
     if 'filter_emotion' not in st.session_state:
         st.session_state.filter_emotion = []
@@ -918,33 +539,12 @@ else:
         
         st.markdown("</div>", unsafe_allow_html=True)
     
-    # 채팅 기록 목록 표시
-    chat_sessions = st.session_state.user_data['chat_sessions']
-    
-    # 필터링 적용
-    filtered_sessions = []
-    for chat in chat_sessions:
-        # 감정 필터링
-        emotion_match = True
-        if st.session_state.filter_emotion:
-            chat_emotion = chat.get('emotion', '')
-            if chat_emotion not in st.session_state.filter_emotion:
-                emotion_match = False
-        
-        # 날짜 필터링
-        date_match = True
-        if st.session_state.filter_date_start or st.session_state.filter_date_end:
-            chat_date = datetime.datetime.fromisoformat(chat.get('date', ''))
-            
-            if st.session_state.filter_date_start and chat_date < st.session_state.filter_date_start:
-                date_match = False
-            
-            if st.session_state.filter_date_end and chat_date > st.session_state.filter_date_end:
-                date_match = False
-        
-        # 필터 조건에 맞는 경우만 추가
-        if emotion_match and date_match:
-            filtered_sessions.append(chat)
+    # 채팅 기록 목록 표시 (감정 / 날짜 보조 인덱스로 필터링, 최신 순)
+    filtered_sessions = get_session_index(st.session_state).filter(
+        emotions=st.session_state.filter_emotion,
+        date_start=st.session_state.filter_date_start,
+        date_end=st.session_state.filter_date_end,
+    )
     
     # 필터링 결과 안내
     if st.session_state.filter_emotion or st.session_state.filter_date_start or st.session_state.filter_date_end:
@@ -976,15 +576,26 @@ else:
         if not filtered_sessions:
             st.warning("필터 조건에 맞는 채팅 기록이 없습니다.")
     
-    # 최신 순으로 정렬
-    filtered_sessions.sort(key=lambda x: x.get('date', ''), reverse=True)
-    
     # 결과 갯수 표시
     if filtered_sessions:
         st.markdown(f"<div style='margin-bottom: 10px;'><strong>{len(filtered_sessions)}개</strong>의 대화 기록이 있습니다.</div>", unsafe_allow_html=True)
     
-    # 필터링된 채팅 기록 표시
-    for chat in filtered_sessions:
+    # 필터가 바뀌면 첫 페이지로 이동
+    filter_key = (
+        tuple(st.session_state.filter_emotion),
+        st.session_state.filter_date_start,
+        st.session_state.filter_date_end,
+    )
+    if st.session_state.get('history_filter_key') != filter_key:
+        st.session_state.history_filter_key = filter_key
+        st.session_state.history_page = 0
+    
+    # 현재 페이지의 채팅 기록만 표시
+    page_start, page_end = 0, 0
+    if filtered_sessions:
+        page_start, page_end = pagination_controls(len(filtered_sessions), page_size=HISTORY_PAGE_SIZE, key="history")
+    
+    for chat in filtered_sessions[page_start:page_end]:
         # 카드 컨테이너 (상대 위치로 설정)
         card_container = st.container()
         
@@ -1023,7 +634,7 @@ if (st.session_state.logged_in and
     st.session_state.selected_emotion and
     'auto_save' not in st.session_state):
     st.session_state.auto_save = True
-    auto_save()
+    save_current_chat()
 
 # 푸터
 st.markdown("---")
@@ -0,0 +1,101 @@
+import asyncio
+import threading
+
+import aiohttp
+import openai
+
+from resilience import acall_with_retry
+
+# 비동기 OpenAI 클라이언트
+#
+# 전용 이벤트 루프 스레드 하나에서 모든 비동기 호출을 실행하고,
+# aiohttp 세션(커넥션 풀)을 프로세스 전체에서 공유합니다.
+# Streamlit 스크립트는 동기 코드이므로 run()으로 결과를 기다립니다.
+
+# 호출별 기본 제한 시간(초)
+REPLY_TIMEOUT = 60
+EMOTION_TIMEOUT = 15
+
+# 커넥션 풀 크기
+POOL_SIZE = 20
+
+
+class AsyncOpenAIClient:
+    """
+    공유 커넥션 풀을 사용하는 비동기 ChatCompletion 클라이언트
+    """
+
+    def __init__(self, pool_size=POOL_SIZE):
+        self.pool_size = pool_size
+        self._session = None
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name="openai-async-loop", daemon=True)
+        self._thread.start()
+
+    async def _get_session(self):
+        # 세션은 이벤트 루프 안에서 만들어야 하므로 처음 호출할 때 생성
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(limit=self.pool_size)
+            self._session = aiohttp.ClientSession(connector=connector)
+        return self._session
+
+    async def chat(self, api_key, messages, temperature=0.7, max_tokens=1000, timeout=REPLY_TIMEOUT,
+                   model="gpt-3.5-turbo"):
+        """ChatCompletion을 호출하고 응답 텍스트를 반환합니다. 제한 시간을 넘기면 asyncio.TimeoutError"""
+        openai.aiosession.set(await self._get_session())
+        response = await asyncio.wait_for(
+            openai.ChatCompletion.acreate(
+                api_key=api_key,
+                model=model,
+                messages=messages,
+                temperature=temperature,
+                max_tokens=max_tokens,
+            ),
+            timeout,
+        )
+        return response.choices[0].message.content
+
+    async def chat_with_retry(self, api_key, deadline=None, **request):
+        """재시도 / 서킷 브레이커 정책을 적용해서 chat()을 호출합니다."""
+        call_timeout = request.pop("timeout", REPLY_TIMEOUT)
+
+        def attempt(remaining):
+            timeout = call_timeout if remaining is None else min(call_timeout, remaining)
+            return self.chat(api_key, timeout=timeout, **request)
+
+        return await acall_with_retry(attempt, deadline=deadline)
+
+    async def chat_many(self, api_key, requests, deadline=None):
+        """
+        여러 ChatCompletion 요청을 동시에 실행합니다.
+        requests: chat()의 키워드 인자 dict 목록
+        deadline: 모든 요청(재시도 포함)이 공유하는 전체 제한 시간
+        반환값: 요청 순서대로 응답 텍스트 또는 발생한 예외
+        """
+        return await asyncio.gather(
+            *(self.chat_with_retry(api_key, deadline=deadline, **request) for request in requests),
+            return_exceptions=True,
+        )
+
+    def run(self, coro, timeout=None):
+        """코루틴을 이벤트 루프 스레드에서 실행하고 결과를 기다립니다. (동기 코드용)"""
+        return asyncio.run_coroutine_threadsafe(coro, self._loop).result(timeout)
+
+    def close(self):
+        """커넥션 풀과 이벤트 루프를 정리합니다."""
+        if self._session is not None:
+            self.run(self._session.close())
+        self._loop.call_soon_threadsafe(self._loop.stop)
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_client():
+    """프로세스 전체에서 공유하는 클라이언트를 반환합니다."""
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = AsyncOpenAIClient()
+        return _client
@@ -1,32 +1,80 @@
+import atexit
+import threading
 import streamlit as st
 import yaml
-from yaml.loader import SafeLoader
 import os
-import pickle
 from pathlib import Path
-import hashlib
-import uuid
-import datetime
+import password_hashing
+from user_schema import SCHEMA_VERSION, upgrade_user_data
+from emotion_goals import empty_goals
+from emotion_stats import empty_stats
+from user_store import LogUserStore, VersionConflict
+from sqlite_store import SQLiteUserStore, import_file_user
+from credential_store import CredentialStore
+from search_index import REC_REMOVE, SearchIndexStore
+from session_vectors import SessionVectorStore
 
 # 절대 경로 설정
 DATA_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "data"))
 CONFIG_PATH = os.path.join(DATA_DIR, "config.yaml")
 USER_DATA_DIR = os.path.join(DATA_DIR, "user_data")
+USER_DB_PATH = os.path.join(DATA_DIR, "user_data.db")
+CREDENTIALS_DB_PATH = os.path.join(DATA_DIR, "credentials.db")
+
+# 사용자 데이터 저장 방식: "sqlite"(기본) 또는 "file"(스냅샷 + 로그 파일, 이전 이름 "pickle")
+USER_STORE_BACKEND = os.getenv("USER_STORE", "sqlite")
 
 # 데이터 디렉토리 생성
 os.makedirs(DATA_DIR, exist_ok=True)
 os.makedirs(USER_DATA_DIR, exist_ok=True)
 
+# 사용자 데이터 저장소
+if USER_STORE_BACKEND in ("file", "pickle"):
+    user_store = LogUserStore(USER_DATA_DIR)
+    # 종료 전에 백그라운드 쓰기 큐를 비움
+    atexit.register(user_store.writer.flush)
+else:
+    user_store = SQLiteUserStore(USER_DB_PATH)
+
+# 대화 검색 색인 저장소 (사용자 데이터 디렉토리에 색인 파일을 둠)
+search_store = SearchIndexStore(USER_DATA_DIR)
+atexit.register(search_store.writer.flush)
+
+# 백그라운드에서 검색 색인/세션 벡터를 준비 중인 사용자
+_index_builds = set()
+_index_builds_lock = threading.Lock()
+
+# 비슷한 대화 찾기용 세션 벡터 (검색 색인에서 만들어 메모리에만 유지)
+vector_store = SessionVectorStore()
+
+# 로그인 정보 저장소 (config.yaml은 가져오기 원본)
+credential_store = CredentialStore(CREDENTIALS_DB_PATH, CONFIG_PATH)
+
+# SQLite로 아직 옮기지 않은 사용자 파일을 읽는 저장소 (처음 필요할 때 생성)
+_file_store = None
+
+def _get_file_store():
+    global _file_store
+    if _file_store is None:
+        _file_store = LogUserStore(USER_DATA_DIR)
+    return _file_store
+
 # 비밀번호 해싱 함수
 def hash_password(password):
-    """비밀번호를 안전하게 해싱합니다."""
-    salt = uuid.uuid4().hex
-    return hashlib.sha256(salt.encode() + password.encode()).hexdigest() + ':' + salt
+    """비밀번호를 안전하게 해싱합니다. (알고리즘과 비용은 password_hashing 설정을 따름)"""
+    return password_hashing.hash_password(password)
 
 def check_password(hashed_password, user_password):
-    """해시된 비밀번호와 사용자 입력 비밀번호를 비교합니다."""
-    password, salt = hashed_password.split(':')
-    return password == hashlib.sha256(salt.encode() + user_password.encode()).hexdigest()
+    """
+    해시된 비밀번호와 사용자 입력 비밀번호를 비교합니다.
+    계산은 비밀번호 확인용 작업 스레드 풀에서 실행합니다.
+    """
+    return password_hashing.verify_pool.submit(
+        password_hashing.verify_password, hashed_password, user_password
+    ).result()
+
+def _rehash_password(username, password):
+    credential_store.update_password(username, password_hashing.hash_password(password))
 
 # 사용자 인증 설정
 def setup_auth():
@@ -52,19 +100,21 @@ def setup_auth():
         with open(config_file, 'w') as file:
             yaml.dump(config, file, default_flow_style=False)
 
-    # 설정 파일 로드
-    with open(config_file) as file:
-        config = yaml.load(file, Loader=SafeLoader)
+    # 설정 파일이 바뀐 경우에만 다시 읽어서 로그인 정보 저장소에 반영
+    credential_store.sync_config()
     
-    # 인증 클래스 대신 딕셔너리 반환
-    return config['credentials']
+    # 인증 클래스 대신 딕셔너리 반환 (usernames는 사용자 이름으로 조회하는 저장소)
+    return {'usernames': credential_store}
 
 # 로그인 함수
 def login(credentials, username, password):
     """사용자 로그인을 처리합니다."""
-    if username in credentials['usernames']:
-        if check_password(credentials['usernames'][username]['password'], password):
-            return True, credentials['usernames'][username]['name']
+    user = credentials['usernames'].get(username)
+    if user is not None and check_password(user['password'], password):
+        # 이전 형식이나 예전 비용 설정의 해시는 현재 설정으로 다시 해싱 (응답을 기다리지 않음)
+        if password_hashing.needs_rehash(user['password']):
+            password_hashing.verify_pool.submit(_rehash_password, username, password)
+        return True, user['name']
     return False, None
 
 # 로그아웃 함수
@@ -101,31 +151,17 @@ def register_user(credentials):
                 st.error("비밀번호가 일치하지 않습니다.")
                 return
                 
-            # 설정 파일 로드
-            config_file = Path(CONFIG_PATH)
             try:
                 # 사용자 이름 중복 확인
                 if username in credentials['usernames']:
                     st.error("이미 존재하는 사용자 이름입니다.")
                     return
                     
-                # 새 사용자 추가
+                # 새 사용자 추가 (동시에 같은 이름으로 가입한 경우도 여기서 걸러짐)
                 hashed_password = hash_password(password)
-                credentials['usernames'][username] = {
-                    'name': name,
-                    'password': hashed_password,
-                    'email': email
-                }
-                
-                # 설정 파일 저장
-                with open(config_file, 'w') as file:
-                    config = {
-                        'credentials': credentials,
-                        'cookie': {
-                            'expiry_days': 30
-                        }
-                    }
-                    yaml.dump(config, file, default_flow_style=False)
+                if not credentials['usernames'].add_user(username, name, email, hashed_password):
+                    st.error("이미 존재하는 사용자 이름입니다.")
+                    return
                     
                 # 사용자 데이터 초기화 및 저장
                 if create_new_user(username, name, email, hashed_password):
@@ -162,10 +198,7 @@ def create_new_user(username, name, email, password_hash):
                 "bio": "",
                 "theme": "light"
             },
-            "emotion_goals": {
-                "active_goal": None,
-                "history": []
-            }
+            "emotion_goals": empty_goals()
         }
         
         # 저장
@@ -178,47 +211,168 @@ def create_new_user(username, name, email, password_hash):
 
 # 사용자 데이터 관리
 def save_user_data(username, data):
-    """사용자 데이터를 저장합니다."""
-    user_data_path = os.path.join(USER_DATA_DIR, f"{username}.pkl")
-    with open(user_data_path, "wb") as f:
-        pickle.dump(data, f)
+    """사용자 데이터 전체를 스냅샷으로 저장합니다."""
+    user_store.save(username, data)
 
-def load_user_data(username):
-    """사용자 데이터를 로드합니다."""
-    user_data_path = os.path.join(USER_DATA_DIR, f"{username}.pkl")
+def save_chat_session(username, chat_session, rewrite_messages=False):
+    """
+    채팅 세션 하나의 변경분만 저장하고 새 버전을 반환합니다.
+    앞쪽 메시지가 바뀐 경우(예: 시스템 메시지 삽입) rewrite_messages=True로 전체를 다시 기록합니다.
+    다른 탭/프로세스가 먼저 이어 쓴 경우 합친 메시지가 chat_session["messages"]에 들어갑니다.
+    """
+    return user_store.save_chat_session(username, chat_session, rewrite_messages=rewrite_messages)
+
+def ensure_system_message(username, chat_session, system_message):
+    """
+    채팅 세션 맨 앞에 시스템 메시지가 없으면 넣고 메시지 전체를 다시 기록합니다.
+    다른 탭/프로세스가 먼저 세션을 바꿨으면 저장된 메시지를 다시 불러와서 적용합니다.
+    반환값: 세션의 메시지 목록
+    """
+    while True:
+        messages = load_chat_messages(username, chat_session)
+        if messages and messages[0].get("role") == "system":
+            return messages
+        messages.insert(0, system_message)
+        try:
+            user_store.save_chat_session(username, chat_session, rewrite_messages=True)
+            return messages
+        except VersionConflict as e:
+            del chat_session["messages"]
+            chat_session["version"] = e.current
+
+def delete_chat_session(username, chat_id):
+    """채팅 세션을 삭제합니다."""
+    user_store.delete_chat_session(username, chat_id)
+    search_store.remove_session(username, chat_id)
+    vector_store.apply(username, [(REC_REMOVE, chat_id)])
+
+def index_chat_messages(username, chat_id, messages):
+    """채팅 세션의 새 메시지를 검색 색인과 세션 벡터에 추가합니다."""
+    records = search_store.index_messages(username, chat_id, messages)
+    vector_store.apply(username, records)
+
+def _get_search_index(username):
+    """
+    사용자의 검색 색인을 반환합니다.
+    아직 만들지 않았으면 저장된 대화 전체로 처음 한 번 만듭니다.
+    """
+    index = search_store.get(username)
+    if not index.complete:
+        data = user_store.load(username) or {}
+        index = search_store.rebuild(username, data.get("chat_sessions", []))
+        vector_store.invalidate(username)
+    return index
+
+def search_chat_sessions(username, query, limit=20):
+    """
+    사용자의 모든 대화에서 질의를 검색해 점수 순으로 반환합니다.
+    반환값: [{"chat_id", "score", "matched", "offsets"}] (offsets: 시스템 메시지를 뺀 메시지 위치)
+    """
+    _get_search_index(username)
+    return search_store.search(username, query, limit)
+
+def prepare_search_index(username):
+    """
+    검색 색인과 세션 벡터를 백그라운드 스레드에서 준비합니다. (로그인 시 호출)
+    처음 만들 때는 저장된 대화 전체를 읽으므로 요청 처리 중에는 기다리지 않도록 합니다.
+    이미 준비되었거나 준비 중이면 아무것도 하지 않습니다.
+    """
+    with _index_builds_lock:
+        if username in _index_builds or vector_store.peek(username) is not None:
+            return
+        _index_builds.add(username)
+    threading.Thread(target=_build_search_index, args=(username,), name="search-index-builder", daemon=True).start()
+
+def _build_search_index(username):
     try:
-        with open(user_data_path, "rb") as f:
-            data = pickle.load(f)
-            
-            # 이전 버전 데이터 구조 마이그레이션
-            if 'chat_sessions' not in data:
-                data['chat_sessions'] = []
-                
-                # 기존 채팅 기록이 있으면 새 형식으로 변환
-                if 'chat_history' in data and data['chat_history']:
-                    timestamp = datetime.datetime.now().isoformat()
-                    chat_id = f"chat_legacy_{timestamp}"
-                    
-                    emotion = None
-                    if 'emotions' in data and data['emotions']:
-                        emotion = data['emotions'][-1]
-                        
-                    chat_preview = data['chat_history'][0]['content'] if data['chat_history'] else "이전 대화"
-                    
-                    # 레거시 채팅 세션 생성
-                    chat_session = {
-                        "id": chat_id,
-                        "date": timestamp,
-                        "emotion": emotion,
-                        "preview": chat_preview,
-                        "messages": data['chat_history']
-                    }
-                    
-                    data['chat_sessions'].append(chat_session)
-            
-            return data
-    except FileNotFoundError:
+        vector_store.get(username, lambda: _get_search_index(username))
+    except Exception as e:
+        print(f"검색 색인 준비 오류 ({username}): {e}")
+    finally:
+        with _index_builds_lock:
+            _index_builds.discard(username)
+
+def find_similar_sessions(username, chat_id, limit=5, wait=True):
+    """
+    채팅 세션과 비슷한 지난 대화를 유사도 순으로 반환합니다. [(chat_id, 유사도)]
+    wait=False이면 세션 벡터가 아직 준비되지 않았을 때 백그라운드 준비를 시작하고 None을 반환합니다.
+    """
+    vectors = vector_store.peek(username)
+    if vectors is None:
+        if not wait:
+            prepare_search_index(username)
+            return None
+        vectors = vector_store.get(username, lambda: _get_search_index(username))
+    return vectors.similar(chat_id, limit)
+
+def save_user_field(username, key, value):
+    """사용자 데이터의 최상위 필드 하나만 저장합니다."""
+    user_store.set_field(username, key, value)
+
+def apply_emotion_stats_change(username, chat_id, date, previous_emotion, emotion):
+    """대화 하나의 감정 변경을 저장된 감정 누적 통계에 반영합니다."""
+    user_store.apply_emotion_stats_change(username, chat_id, date, previous_emotion, emotion)
+
+def append_goal_events(username, events, completed=()):
+    """감정 목표 이벤트만 기록하고, 달성한 목표는 목표 보관함으로 옮깁니다."""
+    user_store.append_goal_events(username, events, completed)
+
+def load_goal_archive(username):
+    """달성한 감정 목표 목록을 반환합니다."""
+    return user_store.load_goal_archive(username)
+
+def query_chat_sessions(username, emotions=None, date_start=None, date_end=None):
+    """
+    조건에 맞는 채팅 세션 메타데이터(메시지 제외)를 최신 순으로 조회합니다.
+    date_start / date_end: datetime 객체
+    """
+    return user_store.query_sessions(
+        username,
+        emotions=emotions,
+        date_start=date_start.isoformat() if date_start else None,
+        date_end=date_end.isoformat() if date_end else None,
+    )
+
+def load_chat_messages(username, chat_session):
+    """
+    채팅 세션의 메시지를 필요할 때 불러옵니다.
+    이미 불러온 세션은 저장소를 다시 읽지 않습니다.
+    """
+    if "messages" not in chat_session:
+        chat_session["messages"] = user_store.load_messages(username, chat_session["id"])
+    return chat_session["messages"]
+
+def load_user_data(username):
+    """
+    사용자 데이터를 로드합니다.
+    채팅 세션은 메타데이터(id, date, emotion, preview)만 불러오고,
+    메시지는 load_chat_messages로 세션을 열 때 불러옵니다.
+    """
+    data = user_store.load(username, include_messages=False)
+
+    # 아직 SQLite로 옮기지 않은 사용자 파일이 있으면 가져오기
+    if data is None and isinstance(user_store, SQLiteUserStore):
+        if import_file_user(user_store, _get_file_store(), username) is not None:
+            data = user_store.load(username, include_messages=False)
+
+    if data is None:
         # 새 사용자 데이터 초기화
-        initial_data = {"chat_history": [], "emotions": [], "chat_sessions": []}
+        initial_data = {
+            "schema_version": SCHEMA_VERSION,
+            "emotions": [],
+            "chat_sessions": [],
+            "emotion_stats": empty_stats(),
+            "emotion_goals": empty_goals(),
+        }
         save_user_data(username, initial_data)
-        return initial_data 
\ No newline at end of file
+        return initial_data
+
+    # 이전 스키마 버전 데이터 변환 (변환 결과를 저장해 세션 ID를 고정)
+    if upgrade_user_data(data):
+        save_user_data(username, data)
+        # 달성한 목표는 저장할 때 목표 보관함으로 옮겨짐
+        data.pop("goal_archive", None)
+
+    # 비슷한 대화 찾기 / 검색에 쓸 색인을 미리 준비
+    prepare_search_index(username)
+    return data
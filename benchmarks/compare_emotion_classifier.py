@@ -0,0 +1,131 @@
+"""
+로컬 감정 분류기와 LLM 감정 분석의 정확도 / 지연 시간 비교
+
+사용법:
+    python benchmarks/compare_emotion_classifier.py            # 로컬 분류기만 평가
+    python benchmarks/compare_emotion_classifier.py --llm      # LLM 경로도 함께 평가 (OPENAI_API_KEY 필요)
+
+emotion_calibration.json의 라벨 데이터로 확신도 기준값별 정확도, LLM 호출 비율,
+예상 평균 지연 시간을 출력합니다. 결과를 보고 EMOTION_LOCAL_THRESHOLD를 정합니다.
+
+emotion_negation.json은 기준값 조정에 쓰지 않는 부정 표현 샘플("안 슬퍼", "걱정 마세요" 등)입니다.
+emotion이 null인 샘플은 로컬 분류기가 감정을 확정하면 안 되는(LLM에 넘겨야 하는) 샘플입니다.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from emotion_classifier import classify_emotion  # noqa: E402
+
+CALIBRATION_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "emotion_calibration.json")
+NEGATION_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "emotion_negation.json")
+THRESHOLDS = [0.0, 0.4, 0.5, 0.6, 0.7, 0.8, 0.9, 1.01]
+
+
+def load_samples(path=CALIBRATION_PATH):
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def run_local(samples):
+    """로컬 분류 결과와 샘플당 지연 시간(초)을 반환합니다."""
+    results = []
+    start = time.perf_counter()
+    for sample in samples:
+        results.append(classify_emotion(sample["text"]))
+    elapsed = (time.perf_counter() - start) / len(samples)
+    return results, elapsed
+
+
+def run_llm(samples):
+    """LLM 분석 결과와 샘플당 평균 지연 시간(초)을 반환합니다."""
+    import openai
+    from dotenv import load_dotenv
+    from chatbot import get_emotion_analysis_messages, match_emotion
+
+    load_dotenv()
+    api_key = os.getenv("OPENAI_API_KEY")
+    results = []
+    start = time.perf_counter()
+    for sample in samples:
+        response = openai.ChatCompletion.create(
+            api_key=api_key,
+            model="gpt-3.5-turbo",
+            messages=get_emotion_analysis_messages(sample["text"]),
+            temperature=0.3,
+            max_tokens=50
+        )
+        results.append(match_emotion(response.choices[0].message.content))
+    elapsed = (time.perf_counter() - start) / len(samples)
+    return results, elapsed
+
+
+def accuracy(predictions, samples):
+    correct = sum(1 for pred, sample in zip(predictions, samples) if pred == sample["emotion"])
+    return correct / len(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="로컬 감정 분류기와 LLM 경로를 비교합니다.")
+    parser.add_argument("--llm", action="store_true", help="LLM 경로도 호출해서 비교합니다")
+    args = parser.parse_args()
+
+    samples = load_samples()
+    local_results, local_latency = run_local(samples)
+    local_predictions = [emotion for emotion, _ in local_results]
+
+    print(f"샘플 수: {len(samples)}")
+    print(f"로컬 분류기: 정확도 {accuracy(local_predictions, samples):.1%}, "
+          f"평균 {local_latency * 1000:.3f}ms")
+
+    llm_predictions, llm_latency = None, None
+    if args.llm:
+        llm_predictions, llm_latency = run_llm(samples)
+        print(f"LLM: 정확도 {accuracy(llm_predictions, samples):.1%}, 평균 {llm_latency * 1000:.0f}ms")
+
+    # 기준값별 결과: 확신도가 기준 이상이면 로컬 결과, 아니면 LLM 결과 사용
+    print()
+    print("기준값  로컬 처리 비율  로컬 처리분 정확도  혼합 정확도  예상 평균 지연")
+    for threshold in THRESHOLDS:
+        local_mask = [emotion is not None and confidence >= threshold for emotion, confidence in local_results]
+        local_count = sum(local_mask)
+        local_correct = sum(
+            1 for use_local, pred, sample in zip(local_mask, local_predictions, samples)
+            if use_local and pred == sample["emotion"]
+        )
+        local_acc = f"{local_correct / local_count:.1%}" if local_count else "-"
+
+        combined, expected_latency = "-", "-"
+        if llm_predictions is not None:
+            mixed = [
+                local if use_local else llm
+                for use_local, local, llm in zip(local_mask, local_predictions, llm_predictions)
+            ]
+            combined = f"{accuracy(mixed, samples):.1%}"
+            llm_share = 1 - local_count / len(samples)
+            expected_latency = f"{(local_latency + llm_share * llm_latency) * 1000:.0f}ms"
+
+        print(f"{threshold:>6.2f}  {local_count / len(samples):>13.1%}  {local_acc:>17}  "
+              f"{combined:>10}  {expected_latency:>13}")
+
+    # 부정 표현 샘플: 기준값 이상으로 로컬 처리했는데 틀린 수 (null 샘플은 로컬 처리하면 틀림)
+    negation_samples = load_samples(NEGATION_PATH)
+    negation_results, _ = run_local(negation_samples)
+    print()
+    print(f"부정 표현 샘플 수: {len(negation_samples)}")
+    print("기준값  로컬 처리 비율  로컬 오분류 수")
+    for threshold in THRESHOLDS:
+        local = [
+            (emotion, sample) for (emotion, confidence), sample in zip(negation_results, negation_samples)
+            if emotion is not None and confidence >= threshold
+        ]
+        wrong = sum(1 for emotion, sample in local if emotion != sample["emotion"])
+        print(f"{threshold:>6.2f}  {len(local) / len(negation_samples):>13.1%}  {wrong:>13}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,157 @@
+"""
+사용자 데이터 파일 형식 비교: 피클 vs user_codec 스냅샷/로그
+
+사용법:
+    python benchmarks/compare_user_data_format.py                     # 합성 데이터로 비교
+    python benchmarks/compare_user_data_format.py --sessions 200 --messages 40
+    python benchmarks/compare_user_data_format.py --pickle-dir data/user_data   # 기존 피클 파일로 비교
+
+스냅샷 저장/로드 시간과 파일 크기(pickle 대비 배수), 메시지 하나를 로그에 추가할 때의
+레코드 크기를 출력합니다. user_codec은 zlib 압축 수준별로 측정합니다.
+
+합성 데이터는 문장 조각을 무작위로 조합하지만 어휘가 한정되어 있어 실제 대화보다 잘 압축됩니다.
+실제 크기/시간은 --pickle-dir로 기존 사용자 데이터에서 측정하세요.
+"""
+import argparse
+import datetime
+import os
+import pickle
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from user_codec import COMPRESS_LEVEL, encode_snapshot, decode_snapshot, encode_record  # noqa: E402
+from user_store import REC_MESSAGES  # noqa: E402
+
+# 합성 대화 문장 재료. 같은 문장이 반복되면 zlib가 비현실적으로 잘 압축되므로
+# 조각을 무작위로 조합하고 숫자/이름을 섞어서 매번 다른 문장을 만듭니다.
+SUBJECTS = ["저는", "제가", "우리 팀장님이", "엄마가", "동생이", "친구 {name}이", "남자친구가", "여자친구가",
+            "같은 반 친구들이", "회사 동료가", "룸메이트가", "담당 교수님이", "아빠가", "옆자리 {name} 선배가"]
+TIMES = ["오늘", "어제", "지난주에", "{n}일 전에", "아침부터", "퇴근길에", "점심시간에", "새벽 {n}시까지",
+         "주말 내내", "요즘 들어", "몇 달째", "시험 기간 동안", "회의 중에", "집에 오는 길에"]
+EVENTS = ["발표를 망쳤어요", "갑자기 연락을 끊었어요", "제 실수를 모두 앞에서 지적했어요", "이사를 가게 됐어요",
+          "면접에서 떨어졌어요", "승진 소식을 들었어요", "사소한 일로 크게 다퉜어요", "프로젝트 마감이 {n}일 남았어요",
+          "병원에서 검사 결과를 기다리고 있어요", "오랜만에 고향 친구를 만났어요", "야근을 {n}일 연속으로 했어요",
+          "제 생일을 잊어버렸어요", "카페에서 혼자 {n}시간 동안 공부했어요", "월세가 {n}만 원 올랐어요",
+          "운동을 다시 시작했어요", "강아지가 아파서 동물병원에 다녀왔어요", "팀 회식에 빠졌어요"]
+FEELINGS = ["그래서 너무 속상해요", "마음이 계속 불안해요", "괜히 눈물이 났어요", "화가 나서 잠이 안 와요",
+            "생각보다 담담했어요", "뿌듯하면서도 조금 허전해요", "아무것도 하기 싫어요", "다행이라는 생각이 들었어요",
+            "제가 뭘 잘못했는지 모르겠어요", "앞으로 어떻게 해야 할지 막막해요", "오랜만에 웃었어요",
+            "머리가 복잡해요", "그 말이 자꾸 떠올라요", "고맙다는 말을 못 해서 아쉬워요"]
+REPLIES = ["그런 일이 있으셨군요.", "많이 힘드셨겠어요.", "그 마음이 충분히 이해돼요.", "이야기해 주셔서 고마워요.",
+           "그때 어떤 생각이 드셨나요?", "지금은 몸 상태가 좀 어떠세요?", "스스로를 너무 탓하지 않으셨으면 해요.",
+           "비슷한 일이 전에도 있었나요?", "{name} 님과는 어떤 관계인지 조금 더 들려주실 수 있을까요?",
+           "오늘 하루 중 가장 편안했던 순간은 언제였나요?", "잠은 하루에 {n}시간 정도 주무시나요?",
+           "그 상황에서 가장 바랐던 건 무엇이었을까요?", "작은 것부터 하나씩 해 보면 어떨까요?"]
+NAMES = ["민지", "서준", "지우", "하은", "도윤", "예린", "현우", "수아", "태민", "유나", "재원", "소연"]
+
+
+def _fill(rng, template):
+    return template.format(name=rng.choice(NAMES), n=rng.randint(1, 30))
+
+
+def make_sentence(rng, role):
+    """역할에 맞는 합성 문장 하나를 만듭니다."""
+    if role == "user":
+        parts = [rng.choice(TIMES), rng.choice(SUBJECTS), rng.choice(EVENTS)]
+        if rng.random() < 0.7:
+            parts.append(rng.choice(FEELINGS) + rng.choice([".", "..", "!", ""]))
+        return " ".join(_fill(rng, part) for part in parts)
+    return " ".join(_fill(rng, rng.choice(REPLIES)) for _ in range(rng.randint(1, 3)))
+
+
+def make_user_data(sessions, messages, seed=0):
+    """세션 수 x 메시지 수 크기의 합성 사용자 데이터를 만듭니다."""
+    rng = random.Random(seed)
+    start = datetime.datetime(2024, 1, 1)
+    data = {"schema_version": 1, "emotion_goals": {"active_goal": None, "history": []}, "chat_sessions": []}
+    for i in range(sessions):
+        chat_messages = [{"role": "system", "content": "당신은 공감 능력이 뛰어난 심리 상담 챗봇입니다."}]
+        for j in range(messages):
+            role = "user" if j % 2 == 0 else "assistant"
+            text = " ".join(make_sentence(rng, role) for _ in range(rng.randint(1, 4)))
+            chat_messages.append({"role": role, "content": text, "seq": j})
+        date = (start + datetime.timedelta(hours=i)).isoformat()
+        data["chat_sessions"].append({
+            "id": f"chat_{date}",
+            "date": date,
+            "emotion": rng.choice(["기쁨", "슬픔", "분노", "불안", "평온"]),
+            "preview": chat_messages[1]["content"][:30],
+            "messages": chat_messages,
+        })
+    return data
+
+
+def load_pickle_dir(directory):
+    """디렉토리의 피클 스냅샷(*.pkl)을 모두 읽습니다."""
+    datasets = []
+    for filename in sorted(os.listdir(directory)):
+        if filename.endswith(".pkl"):
+            with open(os.path.join(directory, filename), "rb") as f:
+                datasets.append(pickle.load(f))
+    return datasets
+
+
+def measure(func, repeat):
+    """repeat번 실행한 평균 시간(초)과 마지막 결과를 반환합니다."""
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = func()
+    return (time.perf_counter() - start) / repeat, result
+
+
+def compare(datasets, repeat):
+    formats = {"pickle": (lambda data: pickle.dumps(data), pickle.loads)}
+    for level in sorted({1, 6, COMPRESS_LEVEL}):
+        name = f"user_codec-{level}" + (" *" if level == COMPRESS_LEVEL else "")
+        formats[name] = (lambda data, level=level: encode_snapshot(data, level), decode_snapshot)
+
+    results = {}
+    for name, (encode, decode) in formats.items():
+        save_time = load_time = size = 0
+        for data in datasets:
+            elapsed, payload = measure(lambda: encode(data), repeat)
+            save_time += elapsed
+            size += len(payload)
+            elapsed, _ = measure(lambda: decode(payload), repeat)
+            load_time += elapsed
+        results[name] = (save_time, load_time, size)
+
+    # pickle 대비 배수 (시간은 클수록 느림, 크기는 클수록 큼)
+    base_save, base_load, base_size = results["pickle"]
+    print("형식(* 현재 설정)   저장(ms)        로드(ms)        크기(KB)")
+    for name, (save_time, load_time, size) in results.items():
+        print(f"{name:<16}  {save_time * 1000:>7.2f} ({save_time / base_save:>4.1f}x)  "
+              f"{load_time * 1000:>7.2f} ({load_time / base_load:>4.1f}x)  "
+              f"{size / 1024:>7.1f} ({size / base_size:>4.2f}x)")
+
+    # 메시지 하나를 로그에 추가할 때의 레코드 크기
+    message = {"role": "user", "content": make_sentence(random.Random(0), "user")}
+    record = (REC_MESSAGES, "chat_2024-01-01T00:00:00", 10, [message])
+    print()
+    print(f"로그 레코드(메시지 1개): pickle {len(pickle.dumps(record))}B, user_codec {len(encode_record(record))}B")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="피클과 user_codec 형식의 저장/로드 성능을 비교합니다.")
+    parser.add_argument("--sessions", type=int, default=100, help="합성 데이터의 세션 수")
+    parser.add_argument("--messages", type=int, default=30, help="세션당 메시지 수")
+    parser.add_argument("--repeat", type=int, default=5, help="측정 반복 횟수")
+    parser.add_argument("--pickle-dir", help="합성 데이터 대신 이 디렉토리의 피클 파일로 비교")
+    args = parser.parse_args()
+
+    if args.pickle_dir:
+        datasets = load_pickle_dir(args.pickle_dir)
+        print(f"피클 파일 {len(datasets)}개")
+    else:
+        datasets = [make_user_data(args.sessions, args.messages)]
+        print(f"합성 데이터: 세션 {args.sessions}개 x 메시지 {args.messages}개")
+    if not datasets:
+        return
+    compare(datasets, args.repeat)
+
+
+if __name__ == "__main__":
+    main()
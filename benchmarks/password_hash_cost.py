@@ -0,0 +1,80 @@
+"""
+비밀번호 해싱 비용 설정별 로그인 처리량 측정
+
+사용법:
+    python benchmarks/password_hash_cost.py                    # 기본 비용 설정 목록 측정
+    python benchmarks/password_hash_cost.py --budget-ms 100    # 확인 1회 100ms에 맞는 PBKDF2 반복 횟수 계산
+    python benchmarks/password_hash_cost.py --threads 4        # 작업 스레드 4개로 동시 확인 처리량도 측정
+
+설정마다 비밀번호 확인 1회 시간과 코어당 초당 로그인 수를 출력합니다.
+결과를 보고 PBKDF2_ITERATIONS 또는 SCRYPT_N 환경 변수를 정합니다.
+"""
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from password_hashing import hash_password, verify_password, calibrate_pbkdf2_iterations  # noqa: E402
+
+SETTINGS = [
+    ("pbkdf2_sha256", {"iterations": 100000}),
+    ("pbkdf2_sha256", {"iterations": 310000}),
+    ("pbkdf2_sha256", {"iterations": 600000}),
+    ("scrypt", {"n": 2 ** 14, "r": 8, "p": 1}),
+    ("scrypt", {"n": 2 ** 15, "r": 8, "p": 1}),
+    ("scrypt", {"n": 2 ** 16, "r": 8, "p": 1}),
+]
+
+PASSWORD = "correct horse battery staple"
+
+
+def measure(hashed, repeat):
+    """확인 1회 평균 시간(초)을 반환합니다."""
+    start = time.perf_counter()
+    for _ in range(repeat):
+        verify_password(hashed, PASSWORD)
+    return (time.perf_counter() - start) / repeat
+
+
+def measure_parallel(hashed, repeat, threads):
+    """작업 스레드 threads개로 repeat번 확인했을 때 초당 처리 수를 반환합니다."""
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        start = time.perf_counter()
+        list(pool.map(lambda _: verify_password(hashed, PASSWORD), range(repeat)))
+        return repeat / (time.perf_counter() - start)
+
+
+def describe(hasher, params):
+    return hasher + " " + ", ".join(f"{k}={v}" for k, v in params.items())
+
+
+def main():
+    parser = argparse.ArgumentParser(description="비밀번호 해싱 비용별 로그인 처리량을 측정합니다.")
+    parser.add_argument("--repeat", type=int, default=5, help="설정마다 확인 반복 횟수")
+    parser.add_argument("--threads", type=int, default=0, help="동시 확인 처리량을 측정할 작업 스레드 수")
+    parser.add_argument("--budget-ms", type=float, help="확인 1회 목표 시간(ms)에 맞는 PBKDF2 반복 횟수 계산")
+    args = parser.parse_args()
+
+    if args.budget_ms:
+        iterations = calibrate_pbkdf2_iterations(args.budget_ms)
+        print(f"확인 1회 {args.budget_ms:.0f}ms 기준 PBKDF2_ITERATIONS={iterations}")
+        print()
+
+    header = "설정                                  확인 1회(ms)  코어당 로그인/초"
+    if args.threads:
+        header += f"  {args.threads}스레드 로그인/초"
+    print(header)
+    for hasher, params in SETTINGS:
+        hashed = hash_password(PASSWORD, hasher=hasher, **params)
+        elapsed = measure(hashed, args.repeat)
+        line = f"{describe(hasher, params):<36}  {elapsed * 1000:>12.1f}  {1 / elapsed:>16.1f}"
+        if args.threads:
+            line += f"  {measure_parallel(hashed, args.repeat * args.threads, args.threads):>17.1f}"
+        print(line)
+
+
+if __name__ == "__main__":
+    main()
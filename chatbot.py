@@ -1,10 +1,17 @@
 import os
 import openai
 import streamlit as st
-from dotenv import load_dotenv
+from async_client import get_client as get_async_client, REPLY_TIMEOUT, EMOTION_TIMEOUT
+from resilience import call_with_retry, Deadline, CircuitOpenError
+from emotion_classifier import classify_emotion, CONFIDENCE_THRESHOLD
+from response_cache import emotion_cache, make_cache_key
+from context_window import fit_messages
+from session_index import get_session_index
+from auth import index_chat_messages, find_similar_sessions
+from resources import resource, load_environment
 
 # 환경 변수 로드
-load_dotenv()
+load_environment()
 
 # 감정 목록
 EMOTIONS = {
@@ -20,6 +27,27 @@ EMOTIONS = {
     "감사": "고마움을 느끼는 상태"
 }
 
+# 감정 아이콘 매핑
+EMOTION_ICONS = {
+    "기쁨": "😊",
+    "슬픔": "😢",
+    "분노": "😠",
+    "불안": "😰",
+    "스트레스": "😫",
+    "외로움": "😔",
+    "후회": "😞",
+    "좌절": "😩",
+    "혼란": "😕",
+    "감사": "🙏"
+}
+
+# 시스템 프롬프트에 참고로 넣을 비슷한 지난 대화 수 / 대화당 글자 수
+RELATED_CONTEXT_SESSIONS = 3
+RELATED_CONTEXT_CHARS = 200
+
+# AI 서비스 장애로 서킷이 열려 있을 때의 안내 메시지
+UNAVAILABLE_MESSAGE = "죄송합니다. 지금은 AI 서비스가 일시적으로 불안정합니다. 잠시 후 다시 시도해주세요."
+
 # AI 원칙 (시스템 프롬프트에서는 직접 사용하지 않지만 참조용으로 보존)
 _AI_PRINCIPLES = """
 1. 항상 공감하고 경청하는 태도를 보여주세요.
@@ -29,12 +57,7 @@ _AI_PRINCIPLES = """
 5. 필요한 경우 전문적인 도움을 권유하세요.
 """
 
-def get_system_prompt(emotion=None):
-    """
-    시스템 프롬프트를 생성합니다.
-    emotion: 사용자가 선택한 감정
-    """
-    base_prompt = """
+_BASE_PROMPT = """
     당신은 감정 치유를 도와주는 공감적이고 따뜻한 상담사입니다. 
     사용자의 감정과 상황에 공감하고, 이해하며, 적절한 위로와 조언을 제공해주세요.
     대화는 한국어로 진행합니다.
@@ -42,33 +65,200 @@ def get_system_prompt(emotion=None):
     항상 공감하는 태도로 경청하며, 사용자의 감정을 인정하고 존중해주세요.
     판단하지 말고 이해하려 노력하며, 필요시 전문적 도움을 권유하세요.
     """
-    
+
+def _build_system_prompt(emotion):
     if emotion:
         emotion_context = f"사용자는 현재 '{emotion}' 감정을 느끼고 있습니다. {EMOTIONS.get(emotion, '')}에 대한 이해와 공감이 필요합니다."
-        return base_prompt + "\n\n" + emotion_context
+        return _BASE_PROMPT + "\n\n" + emotion_context
+    return _BASE_PROMPT
+
+@resource("system_prompts")
+def get_system_prompts():
+    """
+    감정별 시스템 프롬프트를 미리 만들어 둡니다. (감정 없음은 None 키)
+    """
+    prompts = {emotion: _build_system_prompt(emotion) for emotion in EMOTIONS}
+    prompts[None] = _build_system_prompt(None)
+    return prompts
+
+def get_system_prompt(emotion=None, related_context=None):
+    """
+    시스템 프롬프트를 반환합니다.
+    emotion: 사용자가 선택한 감정
+    related_context: 비슷한 지난 대화의 요약 (있으면 프롬프트 끝에 참고 자료로 추가)
+    """
+    prompt = get_system_prompts().get(emotion or None)
+    if prompt is None:
+        prompt = _build_system_prompt(emotion)
+    if related_context:
+        prompt += "\n\n사용자의 비슷한 지난 대화 요약입니다. 도움이 될 때만 자연스럽게 참고하세요.\n" + related_context
+    return prompt
+
+def summarize_conversation(previous_summary, messages, deadline=None):
+    """
+    오래된 대화를 이전 요약에 이어서 요약합니다.
+    deadline: 대화 턴의 제한 시간 (없으면 REPLY_TIMEOUT)
+    """
+    conversation = "\n".join(
+        f"{'사용자' if msg['role'] == 'user' else '상담사'}: {msg['content']}"
+        for msg in messages if msg["role"] in ("user", "assistant")
+    )
+    prompt = (
+        "다음은 감정 상담 대화의 앞부분입니다. 이후 상담에 필요한 사용자의 상황, 감정의 변화, "
+        "중요한 사실을 5문장 이내의 한국어로 요약하세요."
+    )
+    content = f"기존 요약:\n{previous_summary or '(없음)'}\n\n이어지는 대화:\n{conversation}"
     
-    return base_prompt
+    response = call_with_retry(lambda timeout: openai.ChatCompletion.create(
+        api_key=st.session_state.api_key,
+        model="gpt-3.5-turbo",
+        messages=[{"role": "system", "content": prompt}, {"role": "user", "content": content}],
+        temperature=0.3,
+        max_tokens=300,
+        request_timeout=timeout
+    ), deadline=deadline or Deadline(REPLY_TIMEOUT))
+    return response.choices[0].message.content.strip()
 
-def get_ai_response(messages):
+def _get_context_state():
+    """
+    대화 요약을 저장할 현재 채팅 세션을 반환합니다. 세션이 없으면 세션 상태의 임시 dict
+    """
+    chat = get_session_index(st.session_state).get(st.session_state.get("current_chat_id"))
+    if chat is not None:
+        return chat
+    return st.session_state.setdefault("context_state", {})
+
+def _get_related_context(chat, messages):
+    """
+    현재 대화와 비슷한 지난 대화의 요약(없으면 미리보기)을 만듭니다.
+    대화 전문 대신 짧은 요약만 보내며, 사용자가 말을 시작한 뒤 세션마다 한 번만 계산합니다.
+    검색 색인이 아직 준비되지 않았으면 응답을 기다리게 하지 않도록 이번 턴은 건너뜁니다.
+    """
+    cache = st.session_state.setdefault("related_context", {})
+    if chat["id"] in cache:
+        return cache[chat["id"]]
+    if not st.session_state.get("username") or not any(msg["role"] == "user" for msg in messages):
+        return None
+    
+    similar_sessions = find_similar_sessions(
+        st.session_state.username, chat["id"], limit=RELATED_CONTEXT_SESSIONS, wait=False
+    )
+    if similar_sessions is None:
+        return None
+    
+    session_index = get_session_index(st.session_state)
+    lines = []
+    for chat_id, _ in similar_sessions:
+        related = session_index.get(chat_id)
+        if related is None:
+            continue
+        summary = (related.get("context_summary") or {}).get("text") or related.get("preview", "")
+        lines.append(f"- {related.get('date', '')[:10]} ({related.get('emotion') or '감정 없음'}): {summary[:RELATED_CONTEXT_CHARS]}")
+    cache[chat["id"]] = "\n".join(lines)
+    return cache[chat["id"]]
+
+def prepare_messages(messages, deadline=None):
+    """
+    API에 보낼 메시지를 토큰 예산에 맞게 줄입니다. (오래된 대화는 요약으로 대체)
+    API가 받지 않는 seq 등의 필드는 제외합니다.
+    비슷한 지난 대화가 있으면 시스템 프롬프트에 그 요약을 덧붙입니다.
+    deadline: 대화 턴의 제한 시간 (요약 요청도 이 안에서 처리)
+    """
+    fitted = fit_messages(
+        messages, _get_context_state(),
+        lambda previous_summary, old_messages: summarize_conversation(previous_summary, old_messages, deadline)
+    )
+    prepared = [{"role": msg["role"], "content": msg["content"]} for msg in fitted]
+    
+    chat = get_session_index(st.session_state).get(st.session_state.get("current_chat_id"))
+    if chat is not None and prepared and prepared[0]["role"] == "system":
+        related_context = _get_related_context(chat, messages)
+        if related_context:
+            prepared[0]["content"] = get_system_prompt(chat.get("emotion"), related_context)
+    return prepared
+
+def get_ai_response(messages, stream=False):
     """
     OpenAI API를 사용하여 AI 응답을 생성합니다.
+    stream=True이면 응답 조각을 차례로 반환하는 제너레이터를 반환합니다.
     """
+    if stream:
+        return stream_ai_response(messages)
+    
     try:
-        # API 키 사용
-        openai.api_key = st.session_state.api_key
+        # 보낼 메시지는 재시도마다 다시 만들지 않도록 한 번만 준비
+        deadline = Deadline()
+        prepared = prepare_messages(messages, deadline)
         
-        # openai 0.28.0 버전용 API 호출 방식
-        response = openai.ChatCompletion.create(
+        # openai 0.28.0 버전용 API 호출 방식 (일시적 오류는 재시도)
+        # API 키는 전역 openai.api_key 대신 요청마다 전달 (세션마다 키가 다를 수 있음)
+        response = call_with_retry(lambda timeout: openai.ChatCompletion.create(
+            api_key=st.session_state.api_key,
             model="gpt-3.5-turbo",
-            messages=messages,
+            messages=prepared,
             temperature=0.7,
-            max_tokens=1000
-        )
+            max_tokens=1000,
+            request_timeout=timeout
+        ), deadline=deadline)
         return response.choices[0].message.content
+    except CircuitOpenError:
+        return UNAVAILABLE_MESSAGE
     except Exception as e:
         st.error(f"AI 응답 생성 중 오류가 발생했습니다: {e}")
         return "죄송합니다. 응답을 생성하는 중에 문제가 발생했습니다. 잠시 후 다시 시도해주세요."
 
+def stream_ai_response(messages):
+    """
+    OpenAI API 응답을 토큰 단위로 받아 텍스트 조각(delta)을 차례로 반환하는 제너레이터입니다.
+    오류가 발생하면 안내 메시지를 마지막 조각으로 반환합니다.
+    """
+    try:
+        deadline = Deadline()
+        prepared = prepare_messages(messages, deadline)
+        
+        # openai 0.28.0 버전용 스트리밍 API 호출 방식 (첫 응답 전까지만 재시도)
+        response = call_with_retry(lambda timeout: openai.ChatCompletion.create(
+            api_key=st.session_state.api_key,
+            model="gpt-3.5-turbo",
+            messages=prepared,
+            temperature=0.7,
+            max_tokens=1000,
+            stream=True,
+            request_timeout=timeout
+        ), deadline=deadline)
+        for chunk in response:
+            delta = chunk.choices[0].delta.get("content")
+            if delta:
+                yield delta
+    except CircuitOpenError:
+        yield UNAVAILABLE_MESSAGE
+    except Exception as e:
+        st.error(f"AI 응답 생성 중 오류가 발생했습니다: {e}")
+        yield "죄송합니다. 응답을 생성하는 중에 문제가 발생했습니다. 잠시 후 다시 시도해주세요."
+
+def display_streaming_response(messages, on_complete=None):
+    """
+    AI 응답을 스트리밍으로 받아 어시스턴트 말풍선에 점진적으로 표시합니다.
+    응답이 끝나면 전체 텍스트를 채팅 기록에 추가하고 on_complete(전체 텍스트)를 호출합니다.
+    """
+    chunks = []
+    with st.chat_message("assistant"):
+        placeholder = st.empty()
+        for delta in stream_ai_response(messages):
+            chunks.append(delta)
+            placeholder.markdown("".join(chunks) + "▌")
+        full_response = "".join(chunks)
+        placeholder.markdown(full_response)
+    
+    # 채팅 기록에 추가하고 표시 위치를 이동 (중복 표시 방지)
+    add_message("assistant", full_response)
+    st.session_state.rendered_seq = st.session_state.messages[-1]["seq"]
+    
+    # 최종 텍스트 저장
+    if on_complete:
+        on_complete(full_response)
+    return full_response
+
 def initialize_chat_history():
     """
     채팅 기록을 초기화합니다.
@@ -76,53 +266,78 @@ def initialize_chat_history():
     if "messages" not in st.session_state:
         st.session_state.messages = []
         
-    # 채팅 페이지에 처음 접속할 때만 displayed_messages 초기화
-    if st.session_state.get('active_page') == "chat" and "displayed_messages" not in st.session_state:
-        st.session_state.displayed_messages = []
+    # 채팅 페이지에 처음 접속할 때만 표시 위치 초기화
+    if st.session_state.get('active_page') == "chat" and "rendered_seq" not in st.session_state:
+        reset_render_cursor()
+
+def assign_message_seq(messages):
+    """
+    seq가 없거나 앞 메시지의 seq보다 크지 않은 메시지에 앞 메시지 다음 seq를 부여해서
+    seq가 순서대로 증가하도록 하고 다음 seq 값을 반환합니다.
+    (저장소에서 불러온 메시지, 다른 탭의 메시지와 합친 목록 등)
+    """
+    next_seq = 0
+    for message in messages:
+        if message.get("seq", -1) < next_seq:
+            message["seq"] = next_seq
+        next_seq = message["seq"] + 1
+    return next_seq
 
 def add_message(role, content):
     """
-    메시지를 채팅 기록에 추가합니다.
+    메시지를 채팅 기록에 추가합니다. 각 메시지에는 대화 안에서 고유한 seq가 붙습니다.
+    """
+    messages = st.session_state.messages
+    if messages and "seq" in messages[-1]:
+        seq = messages[-1]["seq"] + 1
+    else:
+        seq = assign_message_seq(messages)
+    messages.append({"role": role, "content": content, "seq": seq})
+    
+    # 현재 채팅 세션의 검색 색인에 새 메시지 추가 (시스템 메시지 제외)
+    # 사용자 데이터에 그 id로 세션이 만들어진 뒤에만 색인합니다.
+    chat_id = st.session_state.get("current_chat_id")
+    if role != "system" and chat_id and st.session_state.get("username") \
+            and get_session_index(st.session_state).get(chat_id) is not None:
+        index_chat_messages(st.session_state.username, chat_id, messages)
+
+def reset_render_cursor():
+    """
+    채팅 표시 위치를 처음으로 되돌립니다. (새 채팅 시작 / 대화 이어가기)
     """
-    st.session_state.messages.append({"role": role, "content": content})
+    st.session_state.rendered_seq = -1
 
 def display_chat_history():
     """
-    채팅 기록을 표시합니다.
+    채팅 기록을 표시합니다. 마지막으로 표시한 seq 이후의 새 메시지만 그립니다.
+    seq는 대화를 불러올 때(assign_message_seq)와 add_message에서 붙으므로 여기서는 읽기만 합니다.
     """
-    # 표시할 메시지들
-    messages_to_display = []
-    
-    # 세션 상태에서 메시지 가져오기
-    for message in st.session_state.messages:
-        if message["role"] in ["user", "assistant"]:
-            messages_to_display.append(message)
+    messages = st.session_state.messages
+    if "rendered_seq" not in st.session_state:
+        reset_render_cursor()
     
-    # 첫 로드 시에만 메시지 표시 (중복 표시 방지)
-    if "displayed_messages" not in st.session_state:
-        st.session_state.displayed_messages = []
+    # 뒤에서부터 아직 표시하지 않은 메시지 위치 찾기 (새 메시지 수만큼만 확인)
+    start = len(messages)
+    while start > 0 and messages[start - 1]["seq"] > st.session_state.rendered_seq:
+        start -= 1
     
-    # 아직 표시되지 않은 메시지만 표시
-    for message in messages_to_display:
-        # 메시지 ID 생성 (내용과 역할 기반)
-        msg_id = f"{message['role']}_{hash(message['content'])}"
-        
-        if msg_id not in st.session_state.displayed_messages:
-            if message["role"] == "user":
-                st.chat_message("user").write(message["content"])
-            else:  # assistant
-                st.chat_message("assistant").write(message["content"])
-                
-            # 표시된 메시지 기록
-            st.session_state.displayed_messages.append(msg_id)
+    for message in messages[start:]:
+        if message["role"] == "user":
+            st.chat_message("user").write(message["content"])
+        elif message["role"] == "assistant":
+            st.chat_message("assistant").write(message["content"])
+        st.session_state.rendered_seq = message["seq"]
 
-def start_new_chat(emotion=None):
+def start_new_chat(emotion=None, chat_id=None):
     """
-    새 채팅을 시작합니다.
+    새 채팅을 시작합니다. chat_id: 새 채팅 세션 id (이후 색인과 대화 요약은 이 세션 기준)
     """
+    st.session_state.current_chat_id = chat_id
+    st.session_state.pop("context_state", None)
     st.session_state.messages = []
+    reset_render_cursor()
     system_prompt = get_system_prompt(emotion)
-    st.session_state.messages.append({"role": "system", "content": system_prompt})
+    add_message("system", system_prompt)
     
     # 감정에 따른 인사말 설정
     if emotion:
@@ -136,32 +351,123 @@ def start_new_chat(emotion=None):
 def analyze_emotion(text):
     """
     텍스트에서 감정을 분석합니다.
+    로컬 분류기의 확신도가 충분하면 API를 호출하지 않습니다.
+    """
+    emotion, confidence = classify_emotion(text)
+    if emotion and confidence >= CONFIDENCE_THRESHOLD:
+        return emotion
+    
+    return analyze_emotion_with_llm(text)
+
+def analyze_emotion_with_llm(text):
+    """
+    OpenAI API를 사용하여 텍스트에서 감정을 분석합니다.
     """
     try:
-        # API 키 사용
-        openai.api_key = st.session_state.api_key
+        messages = get_emotion_analysis_messages(text)
         
-        messages = [
-            {"role": "system", "content": "당신은 텍스트에서 감정을 분석하는 전문가입니다. 주어진 텍스트에서 주요 감정을 파악하여 '기쁨', '슬픔', '분노', '불안', '스트레스', '외로움', '후회', '좌절', '혼란', '감사' 중 하나만 선택하여 응답하세요. 다른 말은 덧붙이지 말고 감정 단어 하나만 응답하세요."},
-            {"role": "user", "content": text}
-        ]
+        # 같은 텍스트를 이미 분석했으면 캐시된 응답 사용
+        cache_key = make_cache_key(messages, "gpt-3.5-turbo", 0.3)
+        cached = emotion_cache.get(cache_key)
+        if cached is not None:
+            return match_emotion(cached)
         
-        # openai 0.28.0 버전용 API 호출 방식
-        response = openai.ChatCompletion.create(
+        # openai 0.28.0 버전용 API 호출 방식 (일시적 오류는 재시도)
+        response = call_with_retry(lambda timeout: openai.ChatCompletion.create(
+            api_key=st.session_state.api_key,
             model="gpt-3.5-turbo",
             messages=messages,
             temperature=0.3,
-            max_tokens=50
-        )
-        
-        detected_emotion = response.choices[0].message.content.strip()
-        
-        # 감정 목록에 있는지 확인
-        for emotion in EMOTIONS.keys():
-            if emotion in detected_emotion:
-                return emotion
+            max_tokens=50,
+            request_timeout=timeout
+        ), deadline=Deadline(EMOTION_TIMEOUT))
         
+        content = response.choices[0].message.content
+        emotion_cache.set(cache_key, content)
+        return match_emotion(content)
+    except CircuitOpenError:
         return None
     except Exception as e:
         st.error(f"감정 분석 중 오류가 발생했습니다: {e}")
-        return None 
\ No newline at end of file
+        return None
+
+def get_emotion_analysis_messages(text):
+    """
+    감정 분석 요청 메시지를 생성합니다.
+    """
+    return [
+        {"role": "system", "content": "당신은 텍스트에서 감정을 분석하는 전문가입니다. 주어진 텍스트에서 주요 감정을 파악하여 '기쁨', '슬픔', '분노', '불안', '스트레스', '외로움', '후회', '좌절', '혼란', '감사' 중 하나만 선택하여 응답하세요. 다른 말은 덧붙이지 말고 감정 단어 하나만 응답하세요."},
+        {"role": "user", "content": text}
+    ]
+
+def match_emotion(detected_emotion):
+    """
+    모델 응답에서 감정 목록에 있는 감정을 찾습니다.
+    """
+    detected_emotion = detected_emotion.strip()
+    
+    # 감정 목록에 있는지 확인
+    for emotion in EMOTIONS.keys():
+        if emotion in detected_emotion:
+            return emotion
+    
+    return None
+
+def get_ai_response_and_emotion(messages, text):
+    """
+    AI 응답 생성과 감정 분석을 동시에 실행합니다. (비동기 클라이언트의 동기 인터페이스)
+    반환값: (AI 응답, 감정 또는 None)
+    """
+    deadline = Deadline()
+    requests = [
+        {"messages": prepare_messages(messages, deadline), "temperature": 0.7, "max_tokens": 1000, "timeout": REPLY_TIMEOUT},
+    ]
+    
+    # 로컬 분류기의 확신도가 낮고 캐시에도 없을 때만 감정 분석 요청 추가
+    local_emotion, confidence = classify_emotion(text)
+    emotion_messages = get_emotion_analysis_messages(text)
+    cache_key = make_cache_key(emotion_messages, "gpt-3.5-turbo", 0.3)
+    if not local_emotion or confidence < CONFIDENCE_THRESHOLD:
+        cached = emotion_cache.get(cache_key)
+        if cached is not None:
+            local_emotion = match_emotion(cached)
+        else:
+            requests.append({"messages": emotion_messages, "temperature": 0.3,
+                             "max_tokens": 50, "timeout": EMOTION_TIMEOUT})
+    
+    client = get_async_client()
+    results = client.run(client.chat_many(st.session_state.api_key, requests, deadline=deadline))
+    reply = results[0]
+    if isinstance(reply, BaseException):
+        reply = _reply_error(reply)
+    
+    # 로컬 분류 또는 캐시 결과를 사용한 경우
+    if len(results) == 1:
+        return reply, local_emotion
+    
+    detected_emotion = results[1]
+    if isinstance(detected_emotion, CircuitOpenError):
+        detected_emotion = None
+    elif isinstance(detected_emotion, BaseException):
+        st.error(f"감정 분석 중 오류가 발생했습니다: {detected_emotion}")
+        detected_emotion = None
+    else:
+        emotion_cache.set(cache_key, detected_emotion)
+        detected_emotion = match_emotion(detected_emotion)
+    
+    return reply, detected_emotion
+
+def get_cache_stats():
+    """
+    감정 분석 캐시의 적중/실패 횟수를 반환합니다.
+    """
+    return emotion_cache.stats()
+
+def _reply_error(error):
+    """
+    AI 응답 생성 오류를 표시하고 사용자에게 보여줄 안내 메시지를 반환합니다.
+    """
+    if isinstance(error, CircuitOpenError):
+        return UNAVAILABLE_MESSAGE
+    st.error(f"AI 응답 생성 중 오류가 발생했습니다: {error}")
+    return "죄송합니다. 응답을 생성하는 중에 문제가 발생했습니다. 잠시 후 다시 시도해주세요."
@@ -0,0 +1,108 @@
+import math
+import os
+import re
+
+# 대화 컨텍스트 창 관리
+#
+# API에 보내는 메시지를 토큰 예산 안으로 줄입니다.
+# 시스템 프롬프트와 최근 대화는 그대로 보내고, 예산을 넘는 앞부분 대화는
+# 누적 요약 하나로 접어서 보냅니다. 요약은 채팅 세션의 "context_summary"에 저장해
+# 다음 턴과 대화를 이어갈 때 다시 사용합니다.
+
+# 요청 메시지 전체의 토큰 예산 (응답 max_tokens는 별도)
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "3000"))
+
+# 요약을 새로 만들 때 최근 대화에 남겨 둘 예산 비율.
+# 여유를 남겨 두어 매 턴마다 요약을 다시 만들지 않도록 합니다.
+RECENT_BUDGET_RATIO = 0.6
+
+# 메시지 하나당 역할/구분자 오버헤드
+MESSAGE_OVERHEAD = 4
+
+SUMMARY_PREFIX = "이전 대화 요약:\n"
+
+_HANGUL = re.compile(r"[가-힣ㄱ-ㆎ]")
+
+try:
+    import tiktoken
+    _encoding = tiktoken.encoding_for_model("gpt-3.5-turbo")
+except Exception:
+    _encoding = None
+
+
+def count_tokens(text):
+    """
+    텍스트의 토큰 수를 계산합니다.
+    tiktoken이 설치되어 있지 않으면 한글은 글자당 1토큰, 나머지는 4글자당 1토큰으로 추정합니다.
+    """
+    if _encoding is not None:
+        return len(_encoding.encode(text))
+    hangul = len(_HANGUL.findall(text))
+    others = len(text) - hangul
+    return hangul + math.ceil(others / 4)
+
+
+def count_message_tokens(messages):
+    """메시지 목록 전체의 토큰 수를 계산합니다."""
+    return sum(count_tokens(msg.get("content", "")) + MESSAGE_OVERHEAD for msg in messages)
+
+
+def _split_recent(body, budget):
+    """예산 안에 들어가는 가장 긴 최근 메시지 구간의 시작 위치를 반환합니다. (마지막 메시지는 항상 포함)"""
+    used = 0
+    start = len(body)
+    while start > 0:
+        tokens = count_message_tokens([body[start - 1]])
+        if used + tokens > budget and start < len(body):
+            break
+        used += tokens
+        start -= 1
+    return start
+
+
+def fit_messages(messages, state, summarize, budget=CONTEXT_TOKEN_BUDGET):
+    """
+    메시지 목록을 토큰 예산에 맞춥니다.
+    state: 요약을 저장할 dict (채팅 세션)
+    summarize(이전 요약, 새로 접을 메시지 목록) -> 요약 텍스트
+    반환값: API에 보낼 메시지 목록
+    """
+    if count_message_tokens(messages) <= budget:
+        return messages
+
+    system = [messages[0]] if messages and messages[0].get("role") == "system" else []
+    body = messages[len(system):]
+    available = budget - count_message_tokens(system)
+
+    summary = state.get("context_summary")
+    if summary and summary["covered"] <= len(body):
+        # 기존 요약 + 그 이후 메시지로 충분하면 요약을 다시 만들지 않음
+        summary_message = {"role": "system", "content": SUMMARY_PREFIX + summary["text"]}
+        recent = body[summary["covered"]:]
+        if count_message_tokens([summary_message] + recent) <= available:
+            return system + [summary_message] + recent
+    else:
+        summary = None
+
+    # 최근 대화에 여유 예산만 남기고 나머지를 요약에 접기
+    covered = max(_split_recent(body, int(available * RECENT_BUDGET_RATIO)), summary["covered"] if summary else 0)
+    start = summary["covered"] if summary else 0
+    if covered > start:
+        try:
+            text = summarize(summary["text"] if summary else "", body[start:covered])
+        except Exception as e:
+            # 요약에 실패하면 앞부분을 잘라내기만 함
+            print(f"대화 요약 오류: {e}")
+            return system + body[_split_recent(body, available):]
+        state["context_summary"] = {"text": text, "covered": covered}
+    elif summary:
+        # 새로 접을 메시지가 없으면 기존 요약을 그대로 사용
+        text = summary["text"]
+    else:
+        return system + body[_split_recent(body, available):]
+
+    summary_message = {"role": "system", "content": SUMMARY_PREFIX + text}
+    recent = body[covered:]
+    if count_message_tokens([summary_message] + recent) > available:
+        recent = recent[_split_recent(recent, available - count_message_tokens([summary_message])):]
+    return system + [summary_message] + recent
@@ -0,0 +1,132 @@
+import os
+import sqlite3
+import threading
+
+import yaml
+from yaml.loader import SafeLoader
+
+# 로그인 정보 저장소
+#
+# 사용자 이름으로 색인된 SQLite 테이블에 로그인 정보(이름, 이메일, 비밀번호 해시)를 저장합니다.
+# 가입은 행 하나를 추가하고 로그인은 사용자 한 명만 조회하므로, 사용자 수와 관계없이
+# 비용이 일정합니다. (이전에는 가입할 때마다 YAML 전체를 다시 썼습니다.)
+#
+# 기존 config.yaml은 가져오기 원본으로만 사용합니다. 파일의 수정 시각(mtime)이 바뀐 경우에만
+# 다시 파싱해서 없는 사용자를 추가하므로, 페이지를 다시 실행할 때마다 YAML을 읽지 않습니다.
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS credentials (
+    username TEXT PRIMARY KEY,
+    name TEXT NOT NULL,
+    email TEXT,
+    password TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS credential_sources (
+    path TEXT PRIMARY KEY,
+    mtime_ns INTEGER NOT NULL
+);
+"""
+
+
+class CredentialStore:
+    """
+    SQLite 기반 로그인 정보 저장소
+    credentials['usernames']처럼 사용자 이름으로 조회할 수 있습니다.
+    """
+
+    def __init__(self, db_path, config_path=None):
+        self.db_path = db_path
+        self.config_path = config_path
+        self._local = threading.local()
+        self._config_mtime = None
+        self._connect().executescript(SCHEMA)
+
+    def _connect(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def sync_config(self):
+        """
+        config.yaml이 마지막으로 가져온 뒤 바뀌었으면 다시 읽어서 없는 사용자를 추가합니다.
+        이미 있는 사용자는 바꾸지 않습니다.
+        """
+        if not self.config_path or not os.path.exists(self.config_path):
+            return
+        mtime = os.stat(self.config_path).st_mtime_ns
+        if mtime == self._config_mtime:
+            return
+
+        conn = self._connect()
+        row = conn.execute(
+            "SELECT mtime_ns FROM credential_sources WHERE path = ?", (self.config_path,)
+        ).fetchone()
+        if row is None or row["mtime_ns"] != mtime:
+            with open(self.config_path, encoding="utf-8") as file:
+                config = yaml.load(file, Loader=SafeLoader) or {}
+            users = (config.get("credentials") or {}).get("usernames") or {}
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                conn.executemany(
+                    "INSERT OR IGNORE INTO credentials (username, name, email, password) VALUES (?, ?, ?, ?)",
+                    [
+                        (str(username), info.get("name", username), info.get("email"), info["password"])
+                        for username, info in users.items()
+                    ],
+                )
+                conn.execute(
+                    "INSERT OR REPLACE INTO credential_sources (path, mtime_ns) VALUES (?, ?)",
+                    (self.config_path, mtime),
+                )
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        self._config_mtime = mtime
+
+    def get(self, username, default=None):
+        """사용자의 로그인 정보(name, email, password)를 반환합니다. 없으면 default"""
+        row = self._connect().execute(
+            "SELECT name, email, password FROM credentials WHERE username = ?", (username,)
+        ).fetchone()
+        if row is None:
+            return default
+        return {"name": row["name"], "email": row["email"], "password": row["password"]}
+
+    def __getitem__(self, username):
+        info = self.get(username)
+        if info is None:
+            raise KeyError(username)
+        return info
+
+    def __contains__(self, username):
+        return self.get(username) is not None
+
+    def __len__(self):
+        return self._connect().execute("SELECT COUNT(*) FROM credentials").fetchone()[0]
+
+    def usernames(self):
+        """등록된 사용자 이름 목록을 반환합니다."""
+        rows = self._connect().execute("SELECT username FROM credentials ORDER BY username").fetchall()
+        return [row["username"] for row in rows]
+
+    def add_user(self, username, name, email, password_hash):
+        """
+        새 사용자를 추가합니다. 이미 있는 사용자 이름이면 False를 반환합니다.
+        """
+        cursor = self._connect().execute(
+            "INSERT OR IGNORE INTO credentials (username, name, email, password) VALUES (?, ?, ?, ?)",
+            (username, name, email, password_hash),
+        )
+        return cursor.rowcount == 1
+
+    def update_password(self, username, password_hash):
+        """사용자의 비밀번호 해시를 바꿉니다."""
+        self._connect().execute(
+            "UPDATE credentials SET password = ? WHERE username = ?", (password_hash, username)
+        )
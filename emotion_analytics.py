@@ -0,0 +1,161 @@
+import datetime
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+# 감정 통계
+#
+# 사용자의 chat_sessions를 한 번 열(column) 단위 DataFrame으로 바꾼 뒤
+# 주 단위 추이, 연속 기록(streak), 감정 전이 행렬을 벡터 연산으로 계산합니다.
+# 감정 빈도와 일별 기록은 세션을 다시 세지 않고 누적 통계(emotion_stats)에서 표로 만듭니다.
+# 결과는 (사용자, 데이터 버전, 날짜) 키로 캐시하므로 세션 목록이 바뀌지 않으면 다시 계산하지 않습니다.
+# 데이터 버전은 SessionIndex.data_version을 사용합니다.
+
+# 캐시할 통계 결과 수
+ANALYTICS_CACHE_SIZE = 64
+
+
+def sessions_frame(sessions, emotions):
+    """
+    채팅 세션 목록을 date / emotion 열의 DataFrame으로 변환합니다. (날짜 순 정렬)
+    emotion은 감정 목록 순서의 범주형이며, 목록에 없는 감정은 NaN입니다.
+    날짜가 없거나 잘못된 세션은 제외합니다.
+    """
+    frame = pd.DataFrame.from_records(sessions, columns=["id", "date", "emotion"])
+    frame["date"] = pd.to_datetime(frame["date"], errors="coerce", format="ISO8601")
+    frame["emotion"] = pd.Categorical(frame["emotion"], categories=list(emotions))
+    return frame.dropna(subset=["date"]).sort_values("date", kind="stable").reset_index(drop=True)
+
+
+def emotion_frequency(counts, emotions):
+    """누적 통계의 감정별 대화 수(counts)로 감정별 대화 수와 비율 표를 만듭니다."""
+    count = pd.Series([counts.get(emotion, 0) for emotion in emotions], index=list(emotions), dtype="int64")
+    total = count.sum()
+    return pd.DataFrame({"count": count, "ratio": count / total if total else 0.0})
+
+
+def daily_counts(daily, emotions, days=30):
+    """
+    누적 통계의 날짜별 감정 수(daily)로 마지막 기록일까지 days일 동안의 표를 만듭니다.
+    (행: 날짜, 열: 감정. 대화가 없는 날은 0)
+    """
+    if not daily:
+        return pd.DataFrame(columns=list(emotions), dtype="int64")
+    index = pd.date_range(end=pd.Timestamp(max(daily)), periods=days, freq="D")
+    rows = [daily.get(day.strftime("%Y-%m-%d"), {}) for day in index]
+    return pd.DataFrame(
+        [[row.get(emotion, 0) for emotion in emotions] for row in rows], index=index, columns=list(emotions)
+    )
+
+
+def emotion_trend(frame, freq="D"):
+    """
+    기간별 감정 빈도 표를 반환합니다. (행: 기간 시작일, 열: 감정)
+    freq: "D"(일) 또는 "W"(월요일 시작 주). 대화가 없는 기간도 0으로 채웁니다.
+    """
+    categories = frame["emotion"].cat.categories
+    k = len(categories)
+    codes = frame["emotion"].cat.codes.to_numpy()
+    tagged = codes >= 0
+    if not tagged.any():
+        return pd.DataFrame(columns=categories, dtype="int64")
+
+    # 기간 번호(첫 기간부터 0, 1, 2, ...)와 감정 번호로 (기간, 감정) 칸을 만들어 한 번에 집계
+    days = frame["date"].to_numpy()[tagged].astype("datetime64[D]").astype(np.int64)
+    if freq == "W":
+        # 1970-01-01은 목요일이므로 3일을 더해 월요일 시작 주로 맞춤
+        days = days - (days + 3) % 7
+        step = 7
+    else:
+        step = 1
+    periods = (days - days.min()) // step
+    n = int(periods.max()) + 1
+    counts = np.bincount(periods * k + codes[tagged], minlength=n * k).reshape(n, k)
+
+    start = np.datetime64(int(days.min()), "D")
+    index = pd.DatetimeIndex(start + np.arange(n) * step)
+    return pd.DataFrame(counts, index=index, columns=categories)
+
+
+def streaks(frame, today=None):
+    """
+    연속 기록을 계산합니다.
+    longest_days / current_days: 대화한 날이 며칠 연속되었는지 (최장 / 오늘 또는 어제까지 이어진 기록)
+    longest_emotion / longest_emotion_run: 같은 감정이 가장 길게 이어진 대화 수
+    """
+    result = {"longest_days": 0, "current_days": 0, "longest_emotion": None, "longest_emotion_run": 0}
+    if frame.empty:
+        return result
+
+    # 날짜별 연속 구간: 하루 넘게 벌어진 곳에서 구간을 나눔
+    days = np.unique(frame["date"].to_numpy().astype("datetime64[D]").astype(np.int64))
+    group = np.concatenate(([0], np.cumsum(np.diff(days) != 1)))
+    lengths = np.bincount(group)
+    today_number = np.datetime64(today or datetime.date.today(), "D").astype(np.int64)
+    result["longest_days"] = int(lengths.max())
+    result["current_days"] = int(lengths[-1]) if today_number - days[-1] <= 1 else 0
+
+    # 같은 감정이 이어진 구간 (감정이 없는 대화는 건너뜀)
+    codes = frame["emotion"].cat.codes.to_numpy()
+    codes = codes[codes >= 0]
+    if len(codes):
+        starts = np.concatenate(([True], codes[1:] != codes[:-1]))
+        run_lengths = np.bincount(np.cumsum(starts) - 1)
+        longest = int(run_lengths.argmax())
+        result["longest_emotion"] = frame["emotion"].cat.categories[codes[starts][longest]]
+        result["longest_emotion_run"] = int(run_lengths[longest])
+    return result
+
+
+def transition_matrix(frame, normalize=True):
+    """
+    연속된 두 대화의 감정 전이 행렬을 반환합니다. (행: 이전 감정, 열: 다음 감정)
+    normalize가 True이면 행마다 비율로 바꿉니다.
+    """
+    categories = frame["emotion"].cat.categories
+    k = len(categories)
+    codes = frame["emotion"].cat.codes.to_numpy()
+    codes = codes[codes >= 0].astype(np.int64)
+
+    counts = np.bincount(codes[:-1] * k + codes[1:], minlength=k * k).reshape(k, k) if len(codes) > 1 \
+        else np.zeros((k, k), dtype=np.int64)
+    if normalize:
+        totals = counts.sum(axis=1, keepdims=True)
+        counts = np.divide(counts, totals, out=np.zeros((k, k)), where=totals > 0)
+    return pd.DataFrame(counts, index=categories, columns=categories)
+
+
+def compute_emotion_analytics(sessions, emotions, today=None):
+    """세션 목록의 감정 통계 전체를 계산합니다."""
+    frame = sessions_frame(sessions, emotions)
+    return {
+        "total_sessions": len(frame),
+        "weekly": emotion_trend(frame, "W"),
+        "streaks": streaks(frame, today),
+        "transitions": transition_matrix(frame),
+    }
+
+
+_cache = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def get_emotion_analytics(username, data_version, sessions, emotions):
+    """
+    감정 통계를 반환합니다. 같은 사용자 / 데이터 버전 / 날짜이면 캐시된 결과를 사용합니다.
+    """
+    today = datetime.date.today()
+    key = (username, data_version, today)
+    with _cache_lock:
+        if key in _cache:
+            _cache.move_to_end(key)
+            return _cache[key]
+
+    analytics = compute_emotion_analytics(sessions, emotions, today)
+    with _cache_lock:
+        _cache[key] = analytics
+        while len(_cache) > ANALYTICS_CACHE_SIZE:
+            _cache.popitem(last=False)
+    return analytics
@@ -0,0 +1,99 @@
+import os
+import re
+
+# 로컬 감정 분류기
+#
+# 한국어 감정 어휘 사전으로 텍스트의 감정을 즉시 분류합니다.
+# 어휘는 활용형을 함께 잡을 수 있도록 어간 위주로 적었습니다. (예: "슬프" → 슬프다, 슬퍼서는 "슬퍼")
+# 확신도가 기준보다 낮으면 chatbot.analyze_emotion이 LLM으로 다시 분석합니다.
+
+# 이 확신도 이상이면 LLM을 호출하지 않음 (benchmarks/compare_emotion_classifier.py로 조정)
+CONFIDENCE_THRESHOLD = float(os.getenv("EMOTION_LOCAL_THRESHOLD", "0.6"))
+
+# 확신도 계산 시 더하는 사전값. 단서가 하나뿐이면(가중치 1.0이어도 0.5) 기준값을 넘지 못하고
+# 같은 감정의 단서가 둘 이상 있어야 로컬 결과를 사용합니다.
+SCORE_PRIOR = 1.0
+
+# 감정별 어휘와 가중치
+EMOTION_LEXICON = {
+    "기쁨": {
+        "기쁘": 1.0, "기뻐": 1.0, "기쁨": 1.0, "행복": 1.0, "즐거": 1.0, "즐겁": 1.0, "신나": 1.0,
+        "신난": 1.0, "좋아": 0.6, "좋은 일": 0.8, "설레": 0.8, "뿌듯": 0.9, "최고": 0.6, "웃": 0.4,
+    },
+    "슬픔": {
+        "슬프": 1.0, "슬퍼": 1.0, "슬픔": 1.0, "우울": 1.0, "눈물": 0.9, "울고": 0.8, "울었": 0.8,
+        "울음": 0.8, "서글": 1.0, "마음이 아프": 1.0, "상실": 0.7, "그리워": 0.5, "허전": 0.6,
+    },
+    "분노": {
+        "화가": 1.0, "화나": 1.0, "화났": 1.0, "짜증": 1.0, "열받": 1.0, "분노": 1.0, "분하": 0.9,
+        "억울": 0.8, "빡치": 1.0, "어이없": 0.7, "괘씸": 1.0, "미워": 0.6, "싫어": 0.4,
+    },
+    "불안": {
+        "불안": 1.0, "걱정": 1.0, "초조": 1.0, "두려": 1.0, "두렵": 1.0, "무서": 0.9, "무섭": 0.9,
+        "긴장": 0.8, "떨려": 0.7, "조마조마": 1.0, "겁나": 0.9, "어떡하": 0.6, "어떻게 하지": 0.6,
+    },
+    "스트레스": {
+        "스트레스": 1.0, "힘들": 0.7, "힘든": 0.7, "지치": 0.8, "지쳐": 0.8, "피곤": 0.6, "압박": 1.0,
+        "부담": 0.9, "벅차": 0.9, "과로": 0.9, "야근": 0.8, "마감": 0.6, "번아웃": 1.0, "버거": 0.9,
+    },
+    "외로움": {
+        "외로": 1.0, "외롭": 1.0, "쓸쓸": 1.0, "혼자": 0.7, "고독": 1.0, "아무도 없": 0.9,
+        "친구가 없": 0.9, "소외": 0.9, "연락이 없": 0.6, "나 혼자": 0.8,
+    },
+    "후회": {
+        "후회": 1.0, "그때": 0.4, "했어야": 0.9, "했더라면": 1.0, "안 했으면": 0.8, "잘못했": 0.7,
+        "아쉬": 0.7, "돌이킬": 0.9, "되돌리": 0.9, "괜히": 0.7,
+    },
+    "좌절": {
+        "좌절": 1.0, "실패": 0.9, "떨어졌": 0.7, "포기": 0.8, "안 돼": 0.5, "안돼": 0.5, "절망": 1.0,
+        "무기력": 0.9, "의욕이 없": 0.9, "망했": 0.8, "소용없": 0.9, "낙담": 1.0, "실망": 0.8,
+    },
+    "혼란": {
+        "혼란": 1.0, "모르겠": 0.8, "헷갈": 1.0, "복잡": 0.7, "갈피": 1.0, "어떻게 해야": 0.7,
+        "뭐가 뭔지": 1.0, "막막": 0.7, "갈등": 0.6, "결정을 못": 0.8,
+    },
+    "감사": {
+        "감사": 1.0, "고마": 1.0, "고맙": 1.0, "덕분": 0.9, "다행": 0.6, "은혜": 0.8, "감동": 0.6,
+    },
+}
+
+# 부정 표현이 붙은 단서는 무시
+# 뒤: "슬프지 않", "화가 나진 않", "걱정하지는 마", "걱정 마세요"
+_NEGATION_PATTERN = re.compile(r"^\s?(?:[가-힣]{0,2}(?:지|진|지는|지도)\s*(?:않|마|못)|마(?:세|십|라|요|\s|$))")
+# 앞: "안 슬퍼", "못 즐거웠어"
+_PRECEDING_NEGATION_PATTERN = re.compile(r"(?:^|\s)(?:안|못)\s?$")
+
+
+def score_emotions(text):
+    """
+    감정별 점수를 계산합니다.
+    반환값: {감정: 점수} (단서가 없는 감정은 제외)
+    """
+    scores = {}
+    for emotion, keywords in EMOTION_LEXICON.items():
+        score = 0.0
+        for keyword, weight in keywords.items():
+            start = text.find(keyword)
+            while start != -1:
+                end = start + len(keyword)
+                if not _NEGATION_PATTERN.match(text[end:end + 8]) \
+                        and not _PRECEDING_NEGATION_PATTERN.search(text[max(0, start - 3):start]):
+                    score += weight
+                start = text.find(keyword, end)
+        if score > 0:
+            scores[emotion] = score
+    return scores
+
+
+def classify_emotion(text):
+    """
+    텍스트의 감정을 분류합니다.
+    반환값: (감정 또는 None, 확신도 0~1)
+    """
+    scores = score_emotions(text)
+    if not scores:
+        return None, 0.0
+
+    emotion, top_score = max(scores.items(), key=lambda item: item[1])
+    confidence = top_score / (sum(scores.values()) + SCORE_PRIOR)
+    return emotion, confidence
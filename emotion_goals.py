@@ -0,0 +1,103 @@
+import datetime
+
+# 감정 목표
+#
+# 목표 진행은 작은 이벤트의 흐름으로 기록합니다.
+#   (GOAL_START, 목표 dict)              새 목표 시작 (id, target_emotion, start_date, hits)
+#   (GOAL_HIT, goal_id, 날짜, 그날 횟수)   목표 감정을 경험함 (날짜별 횟수를 덮어씀)
+#   (GOAL_COMPLETE, goal_id, 날짜)        목표 달성
+# 이벤트는 모두 "값을 덮어쓰는" 연산이라 같은 이벤트를 두 번 적용해도 결과가 같습니다.
+#
+# 사용자 데이터의 emotion_goals에는 진행 중인 목표만 두고, 성과는 날짜별 횟수(hits)로 모읍니다.
+# 진행도와 성과 목록은 hits에서 계산합니다. 달성한 목표는 저장소의 목표 보관함에 따로 보관합니다.
+
+GOAL_START = "start"
+GOAL_HIT = "hit"
+GOAL_COMPLETE = "complete"
+
+# 목표 감정을 한 번 경험할 때마다 오르는 진행도(%)
+PROGRESS_STEP = 5
+
+
+def empty_goals():
+    """진행 중인 목표가 없는 목표 상태를 반환합니다."""
+    return {"active_goal": None}
+
+
+def new_goal(target_emotion, today):
+    """새 목표를 만듭니다. today: "YYYY-MM-DD" """
+    return {
+        "id": f"goal_{datetime.datetime.now().isoformat()}",
+        "target_emotion": target_emotion,
+        "start_date": today,
+        "hits": {},
+    }
+
+
+def goal_progress(goal):
+    """목표 진행도(0~100)를 반환합니다."""
+    return min(sum(goal.get("hits", {}).values()) * PROGRESS_STEP, 100)
+
+
+def goal_achievements(goal):
+    """날짜 순 성과 목록을 반환합니다. [{"date", "count", "description"}]"""
+    target = goal.get("target_emotion")
+    return [
+        {"date": day, "count": count, "description": f"목표 감정 '{target}'을(를) {count}번 경험했습니다."}
+        for day, count in sorted(goal.get("hits", {}).items())
+    ]
+
+
+def apply_goal_event(goals, event):
+    """
+    이벤트 하나를 목표 상태에 적용합니다.
+    반환값: 목표 달성 이벤트이면 보관함에 옮길 목표, 아니면 None
+    """
+    kind = event[0]
+    active = goals.get("active_goal")
+    if kind == GOAL_START:
+        goal = dict(event[1])
+        goal["hits"] = dict(goal.get("hits", {}))
+        goals["active_goal"] = goal
+    elif active is None or active.get("id") != event[1]:
+        # 이미 끝났거나 다른 목표의 이벤트
+        return None
+    elif kind == GOAL_HIT:
+        _, _, day, count = event
+        active.setdefault("hits", {})[day] = count
+    elif kind == GOAL_COMPLETE:
+        goals["active_goal"] = None
+        return dict(active, completed=True, completion_date=event[2])
+    return None
+
+
+def emotion_goal_events(goals, emotion, today):
+    """
+    감정 선택 하나로 생기는 목표 이벤트 목록을 반환합니다. (상태에는 아직 적용하지 않음)
+    today: "YYYY-MM-DD"
+    """
+    active = goals.get("active_goal")
+    if not active or emotion != active.get("target_emotion"):
+        return []
+
+    hits = active.get("hits", {})
+    events = [(GOAL_HIT, active["id"], today, hits.get(today, 0) + 1)]
+    if (sum(hits.values()) + 1) * PROGRESS_STEP >= 100:
+        events.append((GOAL_COMPLETE, active["id"], today))
+    return events
+
+
+def compact_goal(goal, goal_id):
+    """
+    이전 형식의 목표(achievements 목록 + progress)를 날짜별 hits 형식으로 바꿉니다.
+    goal_id: 목표에 id가 없을 때 사용할 값
+    """
+    hits = {}
+    for achievement in goal.get("achievements", []):
+        day = achievement.get("date")
+        if day:
+            hits[day] = hits.get(day, 0) + 1
+    compacted = {k: v for k, v in goal.items() if k not in ("achievements", "progress")}
+    compacted.setdefault("id", goal_id)
+    compacted["hits"] = hits
+    return compacted
@@ -0,0 +1,123 @@
+# 감정 누적 통계
+#
+# 감정 선택 / 대화 생성 / 대화 삭제 때마다 갱신하는 사용자별 누적 통계입니다.
+# 통계 화면의 감정 빈도 / 일별 기록 / 감정별 마지막 기록은 채팅 세션을 다시 세지 않고
+# user_data["emotion_stats"]를 읽습니다.
+# 저장소에는 통계 전체가 아니라 대화 하나의 감정 변경을 넘기고, 저장소가 잠금(트랜잭션) 안에서
+# 저장된 통계에 반영합니다(apply_stored_change). 여러 탭이 동시에 바꿔도 서로 덮어쓰지 않습니다.
+#   counts:    감정별 대화 수
+#   daily:     날짜("YYYY-MM-DD")별 감정별 대화 수
+#   last_seen: 감정별 가장 최근 대화 시각 (ISO 형식)
+# rebuild_stats는 채팅 세션 목록에서 같은 값을 다시 계산합니다. (검증 / 복구용)
+
+
+def empty_stats():
+    """빈 누적 통계를 반환합니다."""
+    return {"counts": {}, "daily": {}, "last_seen": {}}
+
+
+def _day(date):
+    return date[:10]
+
+
+def record_session(stats, emotion, date):
+    """감정이 정해진 대화 하나를 통계에 더합니다."""
+    if not emotion or not date:
+        return
+    stats["counts"][emotion] = stats["counts"].get(emotion, 0) + 1
+    day = stats["daily"].setdefault(_day(date), {})
+    day[emotion] = day.get(emotion, 0) + 1
+    if date > stats["last_seen"].get(emotion, ""):
+        stats["last_seen"][emotion] = date
+
+
+def discard_session(stats, emotion, date, find_latest=None):
+    """
+    대화 하나를 통계에서 뺍니다.
+    find_latest(emotion): 남은 대화 중 이 감정의 가장 최근 시각 (가장 최근 대화를 뺄 때만 호출)
+    """
+    if not emotion or not date:
+        return
+    count = stats["counts"].get(emotion, 0) - 1
+    if count > 0:
+        stats["counts"][emotion] = count
+    else:
+        stats["counts"].pop(emotion, None)
+
+    day = stats["daily"].get(_day(date))
+    if day is not None:
+        if day.get(emotion, 0) > 1:
+            day[emotion] -= 1
+        else:
+            day.pop(emotion, None)
+            if not day:
+                del stats["daily"][_day(date)]
+
+    if stats["last_seen"].get(emotion) == date:
+        latest = find_latest(emotion) if find_latest and count > 0 else None
+        if latest:
+            stats["last_seen"][emotion] = latest
+        else:
+            stats["last_seen"].pop(emotion, None)
+
+
+def apply_change(stats, date, previous_emotion, emotion, find_latest=None):
+    """
+    대화 하나의 감정이 previous_emotion에서 emotion으로 바뀐 것을 반영합니다.
+    새 대화는 previous_emotion=None, 삭제한 대화는 emotion=None으로 호출합니다.
+    반환값: 통계가 바뀌었으면 True
+    """
+    if previous_emotion == emotion:
+        return False
+    discard_session(stats, previous_emotion, date, find_latest)
+    record_session(stats, emotion, date)
+    return True
+
+
+def apply_stored_change(stats, sessions, chat_id, date, previous_emotion, emotion):
+    """
+    (저장소에서 잠금 안에서 호출) 저장된 통계에 대화 하나의 감정 변경을 반영한 통계를 반환합니다.
+    stats: 저장된 통계 (없으면 None - 저장된 세션에서 다시 계산)
+    sessions: 저장된 세션 메타데이터 목록 (chat_id 세션은 무시)
+    """
+    others = [chat for chat in sessions if chat["id"] != chat_id]
+    if stats is None:
+        stats = rebuild_stats(others)
+        record_session(stats, emotion, date)
+        return stats
+
+    def find_latest(target):
+        return max((chat["date"] for chat in others if chat.get("emotion") == target and chat.get("date")), default=None)
+
+    apply_change(stats, date, previous_emotion, emotion, find_latest)
+    return stats
+
+
+def rebuild_stats(sessions):
+    """채팅 세션 목록에서 누적 통계를 다시 계산합니다."""
+    stats = empty_stats()
+    for chat in sessions:
+        record_session(stats, chat.get("emotion"), chat.get("date"))
+    return stats
+
+
+def get_emotion_stats(user_data):
+    """사용자 데이터의 누적 통계를 반환합니다. 없으면 채팅 세션에서 만듭니다."""
+    if "emotion_stats" not in user_data:
+        user_data["emotion_stats"] = rebuild_stats(user_data.get("chat_sessions", []))
+    return user_data["emotion_stats"]
+
+
+def diff_stats(stored, rebuilt):
+    """
+    저장된 통계와 다시 계산한 통계의 차이를 반환합니다.
+    반환값: [(항목, 키, 저장된 값, 다시 계산한 값)] (같으면 빈 목록)
+    """
+    differences = []
+    for field in ("counts", "daily", "last_seen"):
+        left = stored.get(field, {})
+        right = rebuilt.get(field, {})
+        for key in sorted(set(left) | set(right)):
+            if left.get(key) != right.get(key):
+                differences.append((field, key, left.get(key), right.get(key)))
+    return differences
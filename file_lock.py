@@ -0,0 +1,60 @@
+import contextlib
+import os
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+try:
+    import msvcrt
+except ImportError:
+    msvcrt = None
+
+# 프로세스 간 파일 잠금
+#
+# 여러 Streamlit 워커 프로세스가 같은 사용자 파일을 쓸 때 사용하는 advisory 잠금입니다.
+# POSIX에서는 flock, Windows에서는 msvcrt.locking을 사용합니다.
+# flock은 열린 파일마다 잡히므로 같은 프로세스의 다른 스레드끼리도 서로 기다립니다.
+
+
+def read_counter(f):
+    """잠금 파일 앞 8바이트에 기록된 변경 카운터를 읽습니다."""
+    f.seek(0)
+    raw = f.read(8)
+    return int.from_bytes(raw, "little") if len(raw) == 8 else 0
+
+
+def write_counter(f, value):
+    """잠금 파일 앞 8바이트에 변경 카운터를 기록합니다."""
+    f.seek(0)
+    f.write(value.to_bytes(8, "little"))
+    f.flush()
+
+
+@contextlib.contextmanager
+def file_lock(path):
+    """
+    잠금 파일에 배타적 잠금을 잡습니다. 다른 프로세스가 잡고 있으면 풀릴 때까지 기다립니다.
+    잠금 파일 객체("r+b")를 돌려주므로 잠금 안에서 작은 값(예: 변경 카운터)을 읽고 쓸 수 있습니다.
+    """
+    with os.fdopen(os.open(path, os.O_RDWR | os.O_CREAT, 0o644), "r+b") as f:
+        if fcntl is not None:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        elif msvcrt is not None:
+            f.seek(0)
+            while True:
+                try:
+                    # LK_LOCK은 10번 재시도 후 OSError를 냄
+                    msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+                    break
+                except OSError:
+                    continue
+        try:
+            yield f
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+            elif msvcrt is not None:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
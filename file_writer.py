@@ -0,0 +1,122 @@
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+# 파일 쓰기 도구
+#
+# atomic_write_bytes: 임시 파일에 쓰고 fsync한 뒤 os.replace로 교체합니다.
+#   쓰는 도중 프로세스가 죽어도 기존 파일은 그대로 남습니다.
+# BackgroundWriter: 쓰기 작업을 크기가 정해진 큐에 넣고 워커 스레드 하나가 순서대로 실행합니다.
+#   큐가 가득 차면 요청 스레드가 기다리며(backpressure), 대기 횟수와 시간을 기록합니다.
+
+# 쓰기 큐 크기
+WRITE_QUEUE_SIZE = 256
+
+
+def fsync_directory(path):
+    """디렉토리 항목 변경(파일 교체/생성)을 디스크에 반영합니다."""
+    if not hasattr(os, "O_DIRECTORY"):
+        return
+    fd = os.open(path, os.O_RDONLY | os.O_DIRECTORY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def atomic_write_bytes(path, data):
+    """임시 파일 + fsync + os.replace로 파일 내용을 원자적으로 교체합니다."""
+    directory = os.path.dirname(path) or "."
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    fsync_directory(directory)
+
+
+def append_bytes(path, data):
+    """파일 끝에 데이터를 덧붙이고 fsync합니다. 반환값: 덧붙인 뒤 파일 크기"""
+    with open(path, "ab") as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+        return f.tell()
+
+
+class BackgroundWriter:
+    """
+    쓰기 작업을 순서대로 실행하는 write-behind 워커
+    """
+
+    def __init__(self, maxsize=WRITE_QUEUE_SIZE, name="user-data-writer"):
+        self._queue = queue.Queue(maxsize=maxsize)
+        self._stats_lock = threading.Lock()
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.max_depth = 0
+        self.blocked_submits = 0
+        self.blocked_seconds = 0.0
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+
+    def submit(self, func, *args):
+        """
+        쓰기 작업을 큐에 넣습니다. 큐가 가득 차 있으면 자리가 날 때까지 기다립니다.
+        반환값: 작업 결과를 기다릴 수 있는 Future
+        """
+        future = Future()
+        try:
+            self._queue.put_nowait((func, args, future))
+        except queue.Full:
+            started = time.monotonic()
+            self._queue.put((func, args, future))
+            with self._stats_lock:
+                self.blocked_submits += 1
+                self.blocked_seconds += time.monotonic() - started
+        with self._stats_lock:
+            self.submitted += 1
+            self.max_depth = max(self.max_depth, self._queue.qsize())
+        return future
+
+    def flush(self):
+        """지금까지 넣은 작업이 모두 끝날 때까지 기다립니다."""
+        if threading.current_thread() is not self._thread:
+            self._queue.join()
+
+    def _run(self):
+        while True:
+            func, args, future = self._queue.get()
+            try:
+                future.set_result(func(*args))
+                with self._stats_lock:
+                    self.completed += 1
+            except Exception as e:
+                print(f"백그라운드 쓰기 오류: {e}")
+                future.set_exception(e)
+                with self._stats_lock:
+                    self.failed += 1
+            finally:
+                self._queue.task_done()
+
+    def stats(self):
+        """큐 깊이와 backpressure 지표를 반환합니다."""
+        with self._stats_lock:
+            return {
+                "depth": self._queue.qsize(),
+                "max_depth": self.max_depth,
+                "submitted": self.submitted,
+                "completed": self.completed,
+                "failed": self.failed,
+                "blocked_submits": self.blocked_submits,
+                "blocked_seconds": self.blocked_seconds,
+            }
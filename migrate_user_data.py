@@ -0,0 +1,38 @@
+"""
+파일 저장소(data/user_data/)의 사용자 데이터를 SQLite 저장소로 옮기는 일회성 스크립트
+
+사용법:
+    python migrate_user_data.py [--overwrite]
+
+--overwrite를 주면 이미 SQLite에 있는 사용자도 파일 내용으로 덮어씁니다.
+스냅샷 파일(*.snapshot)과 이전 버전 피클 파일(*.pkl)을 모두 읽으며,
+이전 스키마 버전의 데이터는 현재 버전으로 변환해서 가져옵니다.
+"""
+import argparse
+import os
+
+from sqlite_store import SQLiteUserStore, import_file_users
+
+DATA_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "data"))
+USER_DATA_DIR = os.path.join(DATA_DIR, "user_data")
+USER_DB_PATH = os.path.join(DATA_DIR, "user_data.db")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="파일 사용자 데이터를 SQLite로 마이그레이션합니다.")
+    parser.add_argument("--overwrite", action="store_true", help="이미 가져온 사용자도 덮어씁니다")
+    args = parser.parse_args()
+
+    if not os.path.isdir(USER_DATA_DIR):
+        print(f"사용자 데이터 디렉토리가 없습니다: {USER_DATA_DIR}")
+        return
+
+    store = SQLiteUserStore(USER_DB_PATH)
+    imported = import_file_users(store, USER_DATA_DIR, overwrite=args.overwrite)
+    print(f"{len(imported)}명의 사용자 데이터를 가져왔습니다.")
+    for username in imported:
+        print(f"  - {username}")
+
+
+if __name__ == "__main__":
+    main()
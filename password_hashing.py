@@ -0,0 +1,110 @@
+import base64
+import hashlib
+import hmac
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# 비밀번호 해싱
+#
+# 해시 문자열에 알고리즘과 비용 값을 함께 기록합니다. (self-describing)
+#   pbkdf2_sha256$<반복 횟수>$<salt>$<해시>
+#   scrypt$<n>$<r>$<p>$<salt>$<해시>
+# 이전 형식(<sha256 hex>:<salt>)도 확인할 수 있으며, needs_rehash가 True를 반환하므로
+# 로그인에 성공했을 때 현재 설정으로 다시 해싱해서 저장합니다.
+#
+# 해싱 알고리즘과 비용은 환경 변수로 조절합니다. 비용을 올리면 공격에 강해지지만
+# 로그인 한 번에 드는 CPU 시간도 늘어납니다. (benchmarks/password_hash_cost.py 참고)
+# hashlib의 pbkdf2_hmac / scrypt는 계산 중 GIL을 풀기 때문에, 확인 작업을 작업 스레드 풀에서
+# 실행하면 다른 세션의 화면 갱신을 막지 않습니다. 풀 크기가 동시에 실행되는 확인 수의 상한입니다.
+
+PASSWORD_HASHER = os.getenv("PASSWORD_HASHER", "pbkdf2_sha256")
+PBKDF2_ITERATIONS = int(os.getenv("PBKDF2_ITERATIONS", "600000"))
+SCRYPT_N = int(os.getenv("SCRYPT_N", str(2 ** 14)))
+SCRYPT_R = int(os.getenv("SCRYPT_R", "8"))
+SCRYPT_P = int(os.getenv("SCRYPT_P", "1"))
+
+# 동시에 실행할 비밀번호 확인 수 (기본: CPU 수)
+VERIFY_WORKERS = int(os.getenv("PASSWORD_VERIFY_WORKERS", str(os.cpu_count() or 1)))
+
+SALT_BYTES = 16
+HASH_BYTES = 32
+
+
+def _b64encode(raw):
+    return base64.b64encode(raw).decode("ascii").rstrip("=")
+
+
+def _b64decode(text):
+    return base64.b64decode(text + "=" * (-len(text) % 4))
+
+
+def _scrypt(password, salt, n, r, p):
+    # scrypt 메모리 사용량은 약 128 * n * r 바이트
+    return hashlib.scrypt(password, salt=salt, n=n, r=r, p=p, maxmem=256 * n * r + 1024 * 1024, dklen=HASH_BYTES)
+
+
+def hash_password(password, hasher=None, iterations=None, n=None, r=None, p=None):
+    """
+    비밀번호를 해싱합니다. 인자를 생략하면 환경 변수 설정을 사용합니다.
+    """
+    hasher = hasher or PASSWORD_HASHER
+    salt = os.urandom(SALT_BYTES)
+    secret = password.encode("utf-8")
+    if hasher == "pbkdf2_sha256":
+        iterations = iterations or PBKDF2_ITERATIONS
+        digest = hashlib.pbkdf2_hmac("sha256", secret, salt, iterations, HASH_BYTES)
+        return f"pbkdf2_sha256${iterations}${_b64encode(salt)}${_b64encode(digest)}"
+    if hasher == "scrypt":
+        n, r, p = n or SCRYPT_N, r or SCRYPT_R, p or SCRYPT_P
+        digest = _scrypt(secret, salt, n, r, p)
+        return f"scrypt${n}${r}${p}${_b64encode(salt)}${_b64encode(digest)}"
+    raise ValueError(f"지원하지 않는 해싱 알고리즘입니다: {hasher}")
+
+
+def verify_password(hashed_password, password):
+    """해시된 비밀번호와 입력한 비밀번호가 일치하는지 확인합니다."""
+    secret = password.encode("utf-8")
+    parts = hashed_password.split("$")
+    try:
+        if parts[0] == "pbkdf2_sha256" and len(parts) == 4:
+            _, iterations, salt, expected = parts
+            digest = hashlib.pbkdf2_hmac("sha256", secret, _b64decode(salt), int(iterations), HASH_BYTES)
+        elif parts[0] == "scrypt" and len(parts) == 6:
+            _, n, r, p, salt, expected = parts
+            digest = _scrypt(secret, _b64decode(salt), int(n), int(r), int(p))
+        elif len(parts) == 1 and ":" in hashed_password:
+            # 이전 형식: sha256(salt + password) hex + ':' + salt
+            expected, salt = hashed_password.split(":", 1)
+            digest = hashlib.sha256(salt.encode() + secret).hexdigest()
+            return hmac.compare_digest(digest, expected)
+        else:
+            return False
+        return hmac.compare_digest(digest, _b64decode(expected))
+    except (ValueError, TypeError):
+        # 손상된 해시 문자열
+        return False
+
+
+def needs_rehash(hashed_password):
+    """해시가 현재 알고리즘 / 비용 설정과 다르면 True를 반환합니다."""
+    parts = hashed_password.split("$")
+    if PASSWORD_HASHER == "pbkdf2_sha256":
+        return not (parts[0] == "pbkdf2_sha256" and len(parts) == 4 and parts[1] == str(PBKDF2_ITERATIONS))
+    if PASSWORD_HASHER == "scrypt":
+        return not (parts[0] == "scrypt" and len(parts) == 6 and parts[1:4] == [str(SCRYPT_N), str(SCRYPT_R), str(SCRYPT_P)])
+    return True
+
+
+def calibrate_pbkdf2_iterations(budget_ms, sample_iterations=100000):
+    """
+    비밀번호 확인 한 번이 budget_ms 안에 끝나는 PBKDF2 반복 횟수를 측정해서 반환합니다.
+    """
+    start = time.perf_counter()
+    hashlib.pbkdf2_hmac("sha256", b"calibration", os.urandom(SALT_BYTES), sample_iterations, HASH_BYTES)
+    elapsed_ms = (time.perf_counter() - start) * 1000
+    return max(1000, int(sample_iterations * budget_ms / elapsed_ms) // 1000 * 1000)
+
+
+# 비밀번호 확인 / 재해싱을 실행하는 작업 스레드 풀
+verify_pool = ThreadPoolExecutor(max_workers=VERIFY_WORKERS, thread_name_prefix="password")
@@ -0,0 +1,111 @@
+import atexit
+import threading
+
+from auth import save_chat_session
+from chatbot import assign_message_seq
+
+# 채팅 세션 저장 서비스
+#
+# 변경된 채팅 세션을 dirty로 표시해 두었다가 debounce 시간 동안 모인 변경을
+# 백그라운드 스레드에서 한 번에 저장합니다. 같은 세션이 여러 번 바뀌어도 한 번만 씁니다.
+# 로그아웃이나 프로세스 종료 시에는 flush()로 남은 변경을 반드시 저장합니다.
+# 저장에 실패한 세션은 다음 변경을 기다리지 않고, 실패할 때마다 두 배씩 늘어나는
+# 간격(최대 RETRY_MAX_SECONDS)으로 다시 저장을 예약합니다.
+
+# 변경을 모으는 시간(초)
+DEBOUNCE_SECONDS = 2.0
+
+# 저장 실패 후 다시 시도하기까지의 최대 대기 시간(초)
+RETRY_MAX_SECONDS = 60.0
+
+
+class PersistenceService:
+    """
+    dirty 추적 + debounce 방식의 채팅 세션 저장 서비스
+    """
+
+    def __init__(self, save_session=save_chat_session, debounce=DEBOUNCE_SECONDS):
+        self.save_session = save_session
+        self.debounce = debounce
+        self._dirty = {}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._timer = None
+        # 연속으로 실패한 저장 횟수 (다시 시도 간격 계산용)
+        self._failures = 0
+
+    def mark_dirty(self, username, chat_session):
+        """세션을 저장 대상으로 표시하고, 예약된 저장이 없으면 debounce 후 저장을 예약합니다."""
+        with self._lock:
+            self._dirty[(username, chat_session["id"])] = chat_session
+            self._schedule(self.debounce)
+
+    def _schedule(self, delay):
+        # self._lock을 잡은 상태에서 호출
+        if self._timer is None:
+            self._timer = threading.Timer(delay, self._flush_from_timer)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def retry_delay(self):
+        """저장 실패 후 다시 시도하기까지의 대기 시간(초)"""
+        return min(self.debounce * (2 ** self._failures), RETRY_MAX_SECONDS)
+
+    def discard(self, username, chat_id):
+        """
+        저장 대기 중인 세션을 취소합니다. (세션 삭제 시)
+        진행 중인 저장이 끝날 때까지 기다리므로, 반환 후에는 이 세션이 다시 저장되지 않습니다.
+        """
+        with self._flush_lock, self._lock:
+            self._dirty.pop((username, chat_id), None)
+
+    def pending_count(self):
+        with self._lock:
+            return len(self._dirty)
+
+    def _flush_from_timer(self):
+        with self._lock:
+            self._timer = None
+        self.flush()
+
+    def flush(self, username=None):
+        """저장 대기 중인 세션을 지금 저장합니다. username을 주면 해당 사용자만 저장합니다."""
+        with self._flush_lock:
+            with self._lock:
+                keys = [key for key in self._dirty if username is None or key[0] == username]
+                batch = [(key, self._dirty.pop(key)) for key in keys]
+            failed = False
+
+            for (owner, _), chat_session in batch:
+                # 요청 스레드가 계속 메시지를 추가할 수 있으므로 얕은 복사본을 저장
+                snapshot = dict(chat_session)
+                copied = None
+                if "messages" in snapshot:
+                    copied = snapshot["messages"] = list(snapshot["messages"])
+                try:
+                    self.save_session(owner, snapshot)
+                    # 저장소가 정한 버전과 (다른 탭의 변경을 합쳤으면) 합친 메시지를 원래 세션에 반영
+                    chat_session["version"] = snapshot.get("version", chat_session.get("version", 0))
+                    if copied is not None and snapshot["messages"] is not copied:
+                        chat_session["messages"][:len(copied)] = snapshot["messages"]
+                        # 저장소에서 합쳐 온 메시지에는 seq가 없으므로 화면 표시 전에 부여
+                        assign_message_seq(chat_session["messages"])
+                except Exception as e:
+                    print(f"채팅 세션 저장 오류 ({owner}): {e}")
+                    failed = True
+                    # 다시 저장 대상으로 표시 (그 사이 새로 표시된 변경이 있으면 그것을 유지)
+                    with self._lock:
+                        self._dirty.setdefault((owner, chat_session["id"]), chat_session)
+
+            # 실패한 세션은 간격을 늘려 가며 다시 저장 예약
+            with self._lock:
+                if failed:
+                    self._failures += 1
+                    self._schedule(self.retry_delay())
+                elif batch:
+                    self._failures = 0
+
+
+# 프로세스 전체에서 공유하는 저장 서비스
+persistence = PersistenceService()
+atexit.register(persistence.flush)
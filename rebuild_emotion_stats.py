@@ -0,0 +1,74 @@
+"""
+사용자별 감정 누적 통계(emotion_stats)를 채팅 세션 기록에서 다시 계산하는 스크립트
+
+사용법:
+    python rebuild_emotion_stats.py [사용자 이름 ...] [--check]
+
+사용자 이름을 주지 않으면 등록된 모든 사용자를 처리합니다.
+--check를 주면 저장하지 않고, 저장된 통계와 다시 계산한 통계의 차이만 출력합니다.
+저장소는 앱과 같이 USER_STORE 환경 변수("sqlite" 또는 "file")로 정합니다.
+"""
+import argparse
+import os
+
+from credential_store import CredentialStore
+from emotion_stats import diff_stats, rebuild_stats
+from sqlite_store import SQLiteUserStore
+from user_store import LogUserStore
+
+DATA_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "data"))
+CONFIG_PATH = os.path.join(DATA_DIR, "config.yaml")
+USER_DATA_DIR = os.path.join(DATA_DIR, "user_data")
+USER_DB_PATH = os.path.join(DATA_DIR, "user_data.db")
+CREDENTIALS_DB_PATH = os.path.join(DATA_DIR, "credentials.db")
+
+
+def open_user_store():
+    """앱과 같은 사용자 데이터 저장소를 엽니다."""
+    if os.getenv("USER_STORE", "sqlite") in ("file", "pickle"):
+        return LogUserStore(USER_DATA_DIR)
+    return SQLiteUserStore(USER_DB_PATH)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="감정 누적 통계를 채팅 기록에서 다시 계산합니다.")
+    parser.add_argument("usernames", nargs="*", help="처리할 사용자 (생략하면 전체)")
+    parser.add_argument("--check", action="store_true", help="저장하지 않고 차이만 출력합니다")
+    args = parser.parse_args()
+
+    usernames = args.usernames
+    if not usernames:
+        credential_store = CredentialStore(CREDENTIALS_DB_PATH, CONFIG_PATH)
+        credential_store.sync_config()
+        usernames = credential_store.usernames()
+
+    store = open_user_store()
+    mismatched = 0
+    for username in usernames:
+        data = store.load(username, include_messages=False)
+        if data is None:
+            print(f"  - {username}: 사용자 데이터 없음")
+            continue
+
+        rebuilt = rebuild_stats(data.get("chat_sessions", []))
+        differences = diff_stats(data.get("emotion_stats", {}), rebuilt)
+        if not differences:
+            print(f"  - {username}: 일치")
+            continue
+
+        mismatched += 1
+        print(f"  - {username}: {len(differences)}개 항목 불일치")
+        for field, key, stored, expected in differences:
+            print(f"      {field}[{key}]: 저장됨 {stored!r}, 다시 계산 {expected!r}")
+        if not args.check:
+            store.set_field(username, "emotion_stats", rebuilt)
+
+    if isinstance(store, LogUserStore):
+        store.writer.flush()
+
+    action = "확인" if args.check else "다시 계산"
+    print(f"{len(usernames)}명 {action}, 불일치 {mismatched}명")
+
+
+if __name__ == "__main__":
+    main()
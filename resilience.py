@@ -0,0 +1,193 @@
+import asyncio
+import os
+import random
+import threading
+import time
+
+import openai
+
+# OpenAI 호출 재시도 / 서킷 브레이커
+#
+# 429, 5xx, 연결 오류는 지터가 있는 지수 백오프로 재시도하고(Retry-After 헤더 우선),
+# 연속 실패가 쌓이면 서킷을 열어 일정 시간 동안 호출하지 않고 바로 실패합니다.
+# 한 번의 대화 턴에는 전체 제한 시간(deadline)을 두어 재시도가 길어지지 않게 합니다.
+
+# 환경 변수로 조정 가능한 기본값
+MAX_ATTEMPTS = int(os.getenv("OPENAI_MAX_ATTEMPTS", "3"))
+BACKOFF_BASE = float(os.getenv("OPENAI_BACKOFF_BASE", "0.5"))
+BACKOFF_MAX = float(os.getenv("OPENAI_BACKOFF_MAX", "8"))
+TURN_DEADLINE = float(os.getenv("OPENAI_TURN_DEADLINE", "60"))
+BREAKER_FAILURE_THRESHOLD = int(os.getenv("OPENAI_BREAKER_THRESHOLD", "5"))
+BREAKER_RESET_TIMEOUT = float(os.getenv("OPENAI_BREAKER_RESET", "30"))
+
+
+class CircuitOpenError(Exception):
+    """서킷이 열려 있어 호출하지 않고 실패함"""
+
+
+class DeadlineExceeded(Exception):
+    """대화 턴의 전체 제한 시간을 넘김"""
+
+
+# 재시도할 오류
+RETRYABLE_ERRORS = (
+    openai.error.RateLimitError,
+    openai.error.ServiceUnavailableError,
+    openai.error.APIConnectionError,
+    openai.error.Timeout,
+    openai.error.TryAgain,
+    asyncio.TimeoutError,
+)
+
+
+def is_retryable(exc):
+    """재시도할 가치가 있는 오류인지 판단합니다."""
+    if isinstance(exc, RETRYABLE_ERRORS):
+        return True
+    if isinstance(exc, openai.error.APIError):
+        status = getattr(exc, "http_status", None)
+        return status is None or status >= 500
+    return False
+
+
+def get_retry_after(exc):
+    """오류 응답의 Retry-After 헤더(초)를 반환합니다. 없으면 None"""
+    headers = getattr(exc, "headers", None) or {}
+    value = headers.get("retry-after") or headers.get("Retry-After")
+    try:
+        return float(value) if value is not None else None
+    except (TypeError, ValueError):
+        return None
+
+
+def backoff_delay(attempt, base=BACKOFF_BASE, cap=BACKOFF_MAX):
+    """attempt번째 재시도 전 대기 시간 (full jitter)"""
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+
+class Deadline:
+    """
+    대화 턴 하나의 전체 제한 시간
+    """
+
+    def __init__(self, seconds=TURN_DEADLINE):
+        self.expires_at = time.monotonic() + seconds
+
+    def remaining(self):
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def expired(self):
+        return self.remaining() <= 0
+
+
+class CircuitBreaker:
+    """
+    연속 실패 횟수가 기준을 넘으면 열리고, reset_timeout 후 시험 호출 하나를 허용합니다.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold=BREAKER_FAILURE_THRESHOLD, reset_timeout=BREAKER_RESET_TIMEOUT):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._lock = threading.Lock()
+
+    def allow(self):
+        """호출해도 되는지 반환합니다. 열린 상태에서 시간이 지나면 시험 호출 하나를 허용합니다."""
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN and time.monotonic() - self.opened_at >= self.reset_timeout:
+                self.state = self.HALF_OPEN
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.state = self.CLOSED
+            self.failures = 0
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                self.state = self.OPEN
+                self.opened_at = time.monotonic()
+
+
+# 프로세스 전체에서 공유하는 OpenAI 서킷 브레이커
+openai_breaker = CircuitBreaker()
+
+
+def _next_delay(exc, attempt, max_attempts, deadline):
+    """다음 재시도까지 기다릴 시간을 반환합니다. 재시도하지 않을 경우 None"""
+    if not is_retryable(exc) or attempt + 1 >= max_attempts:
+        return None
+    delay = get_retry_after(exc)
+    if delay is None:
+        delay = backoff_delay(attempt)
+    if deadline is not None and delay >= deadline.remaining():
+        return None
+    return delay
+
+
+def call_with_retry(func, deadline=None, max_attempts=MAX_ATTEMPTS, breaker=openai_breaker):
+    """
+    func(timeout)을 재시도 정책에 따라 호출합니다.
+    timeout은 남은 제한 시간(초)이며 deadline이 없으면 None입니다.
+    """
+    attempt = 0
+    while True:
+        if not breaker.allow():
+            raise CircuitOpenError("AI 서비스 호출이 일시적으로 중단되었습니다.")
+        if deadline is not None and deadline.expired():
+            raise DeadlineExceeded("응답 제한 시간을 초과했습니다.")
+        try:
+            result = func(deadline.remaining() if deadline is not None else None)
+        except Exception as e:
+            if is_retryable(e):
+                breaker.record_failure()
+            else:
+                # 요청 자체의 오류(400 등)는 서비스가 응답한 것이므로 서킷을 닫음
+                breaker.record_success()
+            delay = _next_delay(e, attempt, max_attempts, deadline)
+            if delay is None:
+                raise
+            time.sleep(delay)
+            attempt += 1
+            continue
+        breaker.record_success()
+        return result
+
+
+async def acall_with_retry(func, deadline=None, max_attempts=MAX_ATTEMPTS, breaker=openai_breaker):
+    """
+    call_with_retry의 비동기 버전입니다. func(timeout)은 코루틴을 반환해야 합니다.
+    """
+    attempt = 0
+    while True:
+        if not breaker.allow():
+            raise CircuitOpenError("AI 서비스 호출이 일시적으로 중단되었습니다.")
+        if deadline is not None and deadline.expired():
+            raise DeadlineExceeded("응답 제한 시간을 초과했습니다.")
+        try:
+            result = await func(deadline.remaining() if deadline is not None else None)
+        except Exception as e:
+            if is_retryable(e):
+                breaker.record_failure()
+            else:
+                # 요청 자체의 오류(400 등)는 서비스가 응답한 것이므로 서킷을 닫음
+                breaker.record_success()
+            delay = _next_delay(e, attempt, max_attempts, deadline)
+            if delay is None:
+                raise
+            await asyncio.sleep(delay)
+            attempt += 1
+            continue
+        breaker.record_success()
+        return result
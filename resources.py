@@ -0,0 +1,76 @@
+import os
+
+import streamlit as st
+from dotenv import load_dotenv
+
+# 프로세스 단위 공유 리소스
+#
+# 페이지를 다시 실행(rerun)할 때마다 새로 만들 필요가 없는 값(환경 변수, 로그인 정보,
+# 시스템 프롬프트, CSS 등)을 st.cache_resource로 프로세스당 한 번만 만듭니다.
+# @resource("이름")으로 등록한 리소스는 invalidate("이름")으로 다시 만들게 할 수 있습니다.
+
+ASSETS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "assets")
+CSS_PATH = os.path.join(ASSETS_DIR, "style.css")
+
+# 이름 → 캐시된 함수
+_RESOURCES = {}
+
+
+def resource(name):
+    """
+    함수 결과를 프로세스 단위로 캐시하고 이름으로 등록하는 데코레이터
+    """
+    def decorator(func):
+        cached = st.cache_resource(show_spinner=False)(func)
+        _RESOURCES[name] = cached
+        return cached
+    return decorator
+
+
+def invalidate(name=None):
+    """
+    등록된 리소스의 캐시를 비웁니다. 다음 호출 때 다시 만듭니다.
+    name을 생략하면 모든 리소스를 비웁니다.
+    """
+    targets = _RESOURCES.values() if name is None else [_RESOURCES[name]]
+    for cached in targets:
+        cached.clear()
+
+
+@resource("environment")
+def load_environment():
+    """.env 파일의 환경 변수를 불러옵니다."""
+    load_dotenv()
+    return True
+
+
+@resource("api_key")
+def get_default_api_key():
+    """환경 변수에 설정된 OpenAI API 키를 반환합니다."""
+    load_environment()
+    return os.getenv("OPENAI_API_KEY", "")
+
+
+@resource("credentials")
+def _load_credentials():
+    """로그인 정보 저장소를 만듭니다. (config.yaml이 없으면 기본 설정 생성)"""
+    from auth import setup_auth
+    return setup_auth()
+
+
+def get_credentials():
+    """
+    로그인 정보 저장소를 반환합니다.
+    저장소는 프로세스당 한 번만 만들고, config.yaml이 바뀌었는지는 호출할 때마다 확인해서 반영합니다.
+    (바뀌지 않았으면 파일 수정 시각만 비교)
+    """
+    credentials = _load_credentials()
+    credentials["usernames"].sync_config()
+    return credentials
+
+
+@resource("css")
+def get_css():
+    """앱 CSS를 <style> 태그로 감싸서 반환합니다."""
+    with open(CSS_PATH, encoding="utf-8") as f:
+        return f"<style>\n{f.read()}\n</style>"
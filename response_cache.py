@@ -0,0 +1,145 @@
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+# API 응답 캐시
+#
+# 정규화한 메시지, 모델, temperature의 해시를 키로 하는 LRU + TTL 메모리 캐시입니다.
+# disk_path를 주면 SQLite 파일을 2차 캐시로 사용해서 재시작 후에도 재사용합니다.
+
+DATA_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "data"))
+DEFAULT_DISK_PATH = os.path.join(DATA_DIR, "response_cache.db")
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_text(text):
+    """앞뒤 공백을 없애고 연속된 공백을 하나로 줄입니다."""
+    return _WHITESPACE.sub(" ", text).strip()
+
+
+def make_cache_key(messages, model, temperature):
+    """정규화한 요청 내용의 SHA-256 해시를 반환합니다."""
+    payload = {
+        "model": model,
+        "temperature": temperature,
+        "messages": [
+            {"role": msg["role"], "content": normalize_text(msg["content"])}
+            for msg in messages
+        ],
+    }
+    encoded = json.dumps(payload, ensure_ascii=False, sort_keys=True).encode("utf-8")
+    return hashlib.sha256(encoded).hexdigest()
+
+
+class ResponseCache:
+    """
+    LRU + TTL 응답 캐시 (선택적 디스크 계층 포함)
+    """
+
+    def __init__(self, maxsize=1024, ttl=24 * 60 * 60, disk_path=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.disk_path = disk_path
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+        if disk_path:
+            os.makedirs(os.path.dirname(disk_path), exist_ok=True)
+            self._disk().execute(
+                "CREATE TABLE IF NOT EXISTS responses (key TEXT PRIMARY KEY, value TEXT, expires_at REAL)"
+            )
+            # 시작할 때 만료된 항목 정리
+            self.purge_expired()
+
+    def _disk(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.disk_path, timeout=10, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, key):
+        """캐시된 값을 반환합니다. 없거나 만료되었으면 None"""
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                value, expires_at = entry
+                if expires_at > now:
+                    self._entries.move_to_end(key)
+                    self.memory_hits += 1
+                    return value
+                del self._entries[key]
+
+        if self.disk_path:
+            row = self._disk().execute(
+                "SELECT value, expires_at FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is not None:
+                if row[1] > now:
+                    value = json.loads(row[0])
+                    self._put_memory(key, value, row[1])
+                    with self._lock:
+                        self.disk_hits += 1
+                    return value
+                # 만료된 항목은 읽을 때 삭제
+                self._disk().execute("DELETE FROM responses WHERE key = ? AND expires_at <= ?", (key, now))
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def set(self, key, value):
+        """값을 캐시에 저장합니다."""
+        expires_at = time.time() + self.ttl
+        self._put_memory(key, value, expires_at)
+        if self.disk_path:
+            self._disk().execute(
+                "INSERT OR REPLACE INTO responses (key, value, expires_at) VALUES (?, ?, ?)",
+                (key, json.dumps(value, ensure_ascii=False), expires_at),
+            )
+
+    def _put_memory(self, key, value, expires_at):
+        with self._lock:
+            self._entries[key] = (value, expires_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def purge_expired(self):
+        """디스크 계층의 만료된 항목을 삭제합니다."""
+        if self.disk_path:
+            self._disk().execute("DELETE FROM responses WHERE expires_at <= ?", (time.time(),))
+
+    def stats(self):
+        """적중/실패 횟수와 절약한 API 호출 수를 반환합니다."""
+        with self._lock:
+            hits = self.memory_hits + self.disk_hits
+            total = hits + self.misses
+            return {
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "saved_api_calls": hits,
+                "hit_rate": hits / total if total else 0.0,
+                "size": len(self._entries),
+            }
+
+
+# 감정 분석 결과 캐시 (환경 변수 RESPONSE_CACHE_DISK=0이면 메모리만 사용)
+emotion_cache = ResponseCache(
+    maxsize=int(os.getenv("RESPONSE_CACHE_SIZE", "4096")),
+    ttl=float(os.getenv("RESPONSE_CACHE_TTL", str(7 * 24 * 60 * 60))),
+    disk_path=DEFAULT_DISK_PATH if os.getenv("RESPONSE_CACHE_DISK", "1") != "0" else None,
+)
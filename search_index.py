@@ -0,0 +1,349 @@
+import math
+import os
+import re
+import threading
+from collections import OrderedDict
+
+from file_lock import file_lock, read_counter, write_counter
+from file_writer import BackgroundWriter, atomic_write_bytes, append_bytes
+from user_codec import CorruptDataError, encode_snapshot, decode_snapshot, encode_record, decode_records
+
+# 대화 전문 검색 색인
+#
+# 사용자마다 메시지 본문(content)의 역색인을 둡니다. n-gram → {chat_id: [메시지 위치, ...]}
+# 한국어는 조사와 어미가 단어에 붙어 있어 단어 단위 색인이 잘 맞지 않으므로,
+# 글자/숫자 토큰을 글자 2-gram으로 나누어 색인합니다. ("스트레스를" → 스트, 트레, 레스, 스를)
+# 메시지 위치는 시스템 메시지를 뺀 대화 메시지의 순서입니다.
+#
+# 검색은 질의도 같은 방식으로 나눈 뒤, 질의 n-gram을 많이 포함한 세션부터
+# (같으면 TF-IDF 점수 순으로) 정렬해서 세션과 일치한 메시지 위치를 반환합니다.
+#
+# 색인은 add_message에서 새 메시지만 덧붙이는 방식으로 갱신하고,
+# 사용자 데이터 옆에 스냅샷(<username>.search) + 추가 전용 로그(<username>.search.journal)로 저장합니다.
+# 로그 레코드는 이미 색인한 위치면 무시하므로 두 번 재생해도 결과가 같습니다.
+# 색인은 언제든 저장된 대화에서 다시 만들 수 있으므로 다른 프로세스의 변경은 다시 불러올 때 반영됩니다.
+#
+# 여러 프로세스가 같은 파일을 쓰므로 파일 쓰기는 사용자별 잠금 파일(<username>.search.lock)을 잡고 실행합니다.
+# 잠금 파일에는 정상적으로 기록된 로그 크기를 적어 두어, 로그를 추가할 때 그 뒤(잘린 꼬리)만 확인합니다.
+# 스냅샷을 쓸 때는 저장된 스냅샷과 로그(다른 프로세스가 색인한 메시지)를 먼저 합칩니다.
+# 저장된 대화 전체로 한 번 만든(rebuild) 색인만 complete로 표시해서, 새 메시지만 색인된
+# 상태에서 검색하면 먼저 전체 색인을 만들도록 합니다.
+
+NGRAM = 2
+
+# 메모리에 유지할 사용자 색인 수
+SEARCH_INDEX_CACHE_SIZE = 16
+
+# 로그를 스냅샷으로 압축하는 기준 레코드 수
+COMPACT_MAX_RECORDS = 2000
+
+# 로그 레코드 종류
+REC_ADD = "add"        # (REC_ADD, chat_id, 위치, n-gram 목록) - 메시지 하나 색인
+REC_REMOVE = "remove"  # (REC_REMOVE, chat_id) - 세션 색인 삭제
+
+_TOKEN = re.compile(r"[0-9A-Za-z가-힣ㄱ-ㆎ]+")
+
+
+def ngrams(text):
+    """텍스트를 n-gram 집합으로 나눕니다. n보다 짧은 토큰은 그대로 사용합니다."""
+    grams = set()
+    for token in _TOKEN.findall(text.lower()):
+        if len(token) <= NGRAM:
+            grams.add(token)
+        else:
+            grams.update(token[i:i + NGRAM] for i in range(len(token) - NGRAM + 1))
+    return grams
+
+
+def _system_offset(messages):
+    return 1 if messages and messages[0].get("role") == "system" else 0
+
+
+def conversation_messages(messages):
+    """색인 대상 메시지 목록을 반환합니다. (맨 앞 시스템 메시지 제외)"""
+    return messages[_system_offset(messages):]
+
+
+class SearchIndex:
+    """
+    사용자 한 명의 n-gram 역색인
+    """
+
+    def __init__(self, postings=None, counts=None, complete=False):
+        # n-gram → {chat_id: 메시지 위치 목록(오름차순)}
+        self.postings = postings or {}
+        # chat_id → 색인한 메시지 수
+        self.counts = counts or {}
+        # 저장된 대화 전체를 색인했는지 여부
+        self.complete = complete
+        self.lock = threading.RLock()
+
+    def apply(self, record):
+        """로그 레코드 하나를 적용합니다."""
+        if record[0] == REC_ADD:
+            _, chat_id, position, grams = record
+            if position < self.counts.get(chat_id, 0):
+                return
+            for gram in grams:
+                self.postings.setdefault(gram, {}).setdefault(chat_id, []).append(position)
+            self.counts[chat_id] = position + 1
+        elif record[0] == REC_REMOVE:
+            chat_id = record[1]
+            if self.counts.pop(chat_id, None) is None:
+                return
+            for gram in [gram for gram, sessions in self.postings.items() if chat_id in sessions]:
+                sessions = self.postings[gram]
+                del sessions[chat_id]
+                if not sessions:
+                    del self.postings[gram]
+
+    def sync(self, chat_id, messages):
+        """
+        세션의 아직 색인하지 않은 메시지를 색인하고 적용한 로그 레코드 목록을 반환합니다.
+        메시지가 색인한 수보다 줄었으면(다시 기록된 세션) 세션을 다시 색인합니다.
+        """
+        skip = _system_offset(messages)
+        length = len(messages) - skip
+        records = []
+        start = self.counts.get(chat_id, 0)
+        if start > length:
+            records.append((REC_REMOVE, chat_id))
+            start = 0
+        for position in range(start, length):
+            content = messages[skip + position].get("content", "")
+            records.append((REC_ADD, chat_id, position, sorted(ngrams(content))))
+        for record in records:
+            self.apply(record)
+        return records
+
+    def merge(self, other):
+        """
+        다른 색인(다른 프로세스가 저장한 색인)에서 이 색인보다 많이 색인된 세션을 가져옵니다.
+        """
+        newer = {chat_id for chat_id, count in other.counts.items() if count > self.counts.get(chat_id, 0)}
+        if newer:
+            for gram in list(self.postings):
+                sessions = self.postings[gram]
+                for chat_id in newer.intersection(sessions):
+                    del sessions[chat_id]
+                if not sessions:
+                    del self.postings[gram]
+            for gram, sessions in other.postings.items():
+                for chat_id in newer.intersection(sessions):
+                    self.postings.setdefault(gram, {})[chat_id] = list(sessions[chat_id])
+            for chat_id in newer:
+                self.counts[chat_id] = other.counts[chat_id]
+        self.complete = self.complete or other.complete
+
+    def to_dict(self):
+        return {"postings": self.postings, "counts": self.counts, "complete": self.complete}
+
+    def search(self, query, limit=20):
+        """
+        질의와 일치하는 세션을 점수 순으로 반환합니다.
+        반환값: [{"chat_id", "score", "matched", "offsets"}]
+          matched: 세션에 들어 있는 질의 n-gram 수 / offsets: 일치한 메시지 위치 (가장 많이 일치한 메시지)
+        """
+        query_grams = []
+        for gram in ngrams(query):
+            if len(gram) < NGRAM:
+                # 한 글자 질의는 그 글자로 시작하는 n-gram으로 확장
+                expanded = [g for g in self.postings if g.startswith(gram)]
+                if expanded:
+                    query_grams.append(expanded)
+            elif gram in self.postings:
+                query_grams.append([gram])
+        if not query_grams:
+            return []
+
+        total_sessions = max(len(self.counts), 1)
+        scores = {}
+        matched = {}
+        hits = {}
+        for grams in query_grams:
+            # 질의 n-gram 하나(확장된 경우 그중 하나라도)를 포함한 세션과 메시지 위치
+            positions_by_chat = {}
+            for gram in grams:
+                for chat_id, positions in self.postings[gram].items():
+                    positions_by_chat.setdefault(chat_id, set()).update(positions)
+            idf = math.log(1 + total_sessions / len(positions_by_chat))
+            for chat_id, positions in positions_by_chat.items():
+                scores[chat_id] = scores.get(chat_id, 0.0) + idf * (1 + math.log(len(positions)))
+                matched[chat_id] = matched.get(chat_id, 0) + 1
+                counter = hits.setdefault(chat_id, {})
+                for position in positions:
+                    counter[position] = counter.get(position, 0) + 1
+
+        ranked = sorted(scores, key=lambda chat_id: (matched[chat_id], scores[chat_id]), reverse=True)
+        results = []
+        for chat_id in ranked[:limit]:
+            best = max(hits[chat_id].values())
+            results.append({
+                "chat_id": chat_id,
+                "score": scores[chat_id],
+                "matched": matched[chat_id],
+                "offsets": sorted(p for p, count in hits[chat_id].items() if count == best),
+            })
+        return results
+
+
+class SearchIndexStore:
+    """
+    사용자별 검색 색인의 저장과 메모리 캐시 (최근 사용한 SEARCH_INDEX_CACHE_SIZE명만 유지)
+    """
+
+    def __init__(self, directory, writer=None, cache_size=SEARCH_INDEX_CACHE_SIZE):
+        self.directory = directory
+        self.writer = writer or BackgroundWriter(name="search-index-writer")
+        self.cache_size = cache_size
+        self._indexes = OrderedDict()
+        self._journal_records = {}
+        self._guard = threading.Lock()
+
+    def snapshot_path(self, username):
+        return os.path.join(self.directory, f"{username}.search")
+
+    def log_path(self, username):
+        return os.path.join(self.directory, f"{username}.search.journal")
+
+    def lock_path(self, username):
+        return os.path.join(self.directory, f"{username}.search.lock")
+
+    def get(self, username):
+        """사용자의 색인을 반환합니다. 메모리에 없으면 스냅샷과 로그에서 불러옵니다."""
+        with self._guard:
+            index = self._indexes.get(username)
+            if index is not None:
+                self._indexes.move_to_end(username)
+                return index
+
+        index, count = self._load(username)
+        with self._guard:
+            # 다른 스레드가 먼저 불러왔으면 그것을 사용
+            index = self._indexes.setdefault(username, index)
+            self._indexes.move_to_end(username)
+            self._journal_records.setdefault(username, count)
+            while len(self._indexes) > self.cache_size:
+                evicted, _ = self._indexes.popitem(last=False)
+                self._journal_records.pop(evicted, None)
+        return index
+
+    def _load(self, username):
+        self.writer.flush()
+        with file_lock(self.lock_path(username)) as lock_file:
+            index, records = self._read_stored(username, lock_file)
+        for record in records:
+            index.apply(record)
+        return index, len(records)
+
+    def _read_stored(self, username, lock_file):
+        """
+        (잠금 안에서 호출) 저장된 스냅샷과 로그 레코드를 읽습니다.
+        로그의 잘린 꼬리는 잘라내고, 정상적으로 기록된 로그 크기를 잠금 파일에 적습니다.
+        """
+        index = SearchIndex()
+        try:
+            with open(self.snapshot_path(username), "rb") as f:
+                data = decode_snapshot(f.read())
+            index = SearchIndex(data["postings"], data["counts"], data.get("complete", False))
+        except FileNotFoundError:
+            pass
+        except CorruptDataError as e:
+            print(f"검색 색인 손상 ({username}): {e}")
+
+        try:
+            with open(self.log_path(username), "r+b") as f:
+                payload = f.read()
+                records, size = decode_records(payload)
+                if size < len(payload):
+                    f.truncate(size)
+        except FileNotFoundError:
+            records, size = [], 0
+        write_counter(lock_file, size)
+        return index, records
+
+    def index_messages(self, username, chat_id, messages):
+        """세션의 새 메시지를 색인하고 로그에 기록합니다. 반환값: 적용한 로그 레코드 목록"""
+        index = self.get(username)
+        with index.lock:
+            records = index.sync(chat_id, messages)
+        self._append(username, records)
+        return records
+
+    def remove_session(self, username, chat_id):
+        """삭제한 세션을 색인에서 뺍니다."""
+        index = self.get(username)
+        with index.lock:
+            index.apply((REC_REMOVE, chat_id))
+        self._append(username, [(REC_REMOVE, chat_id)])
+
+    def rebuild(self, username, sessions):
+        """저장된 대화 전체(메시지 포함 세션 목록)로 색인을 새로 만들고 스냅샷으로 저장합니다."""
+        index = SearchIndex(complete=True)
+        for chat in sessions:
+            index.sync(chat["id"], chat.get("messages", []))
+        with self._guard:
+            self._indexes[username] = index
+            self._journal_records[username] = 0
+        self.writer.submit(self._write_snapshot, username, index)
+        return index
+
+    def search(self, username, query, limit=20):
+        """사용자의 대화에서 질의를 검색합니다. (SearchIndex.search 참고)"""
+        index = self.get(username)
+        with index.lock:
+            return index.search(query, limit)
+
+    def _append(self, username, records):
+        if not records:
+            return
+        with self._guard:
+            count = self._journal_records.get(username, 0) + len(records)
+            compact = count >= COMPACT_MAX_RECORDS
+            self._journal_records[username] = 0 if compact else count
+        self.writer.submit(self._write_records, username, records)
+        if compact:
+            self.writer.submit(self._write_snapshot, username, self.get(username))
+
+    def _write_records(self, username, records):
+        # 워커 스레드에서 실행
+        path = self.log_path(username)
+        payload = b"".join(encode_record(record) for record in records)
+        with file_lock(self.lock_path(username)) as lock_file:
+            _truncate_torn_tail(path, read_counter(lock_file))
+            write_counter(lock_file, append_bytes(path, payload))
+
+    def _write_snapshot(self, username, index):
+        # 워커 스레드에서 실행 (이후에 추가된 레코드가 로그에 다시 기록되어도 재생 시 무시됨)
+        with file_lock(self.lock_path(username)) as lock_file:
+            # 다른 프로세스가 저장한 스냅샷과 로그를 합친 뒤 저장 (로그를 지워도 잃지 않도록)
+            stored, records = self._read_stored(username, lock_file)
+            with index.lock:
+                index.merge(stored)
+                for record in records:
+                    index.apply(record)
+                payload = encode_snapshot(index.to_dict())
+            atomic_write_bytes(self.snapshot_path(username), payload)
+            if os.path.exists(self.log_path(username)):
+                os.remove(self.log_path(username))
+            write_counter(lock_file, 0)
+
+
+def _truncate_torn_tail(path, good_size):
+    """
+    (잠금 안에서 호출) 로그에서 정상적으로 기록된 크기(good_size) 뒤를 확인해서
+    기록 도중 잘린 꼬리가 있으면 잘라냅니다. 로그가 good_size보다 작으면 처음부터 확인합니다.
+    """
+    try:
+        with open(path, "r+b") as f:
+            end = f.seek(0, os.SEEK_END)
+            if end == good_size:
+                return
+            start = good_size if end > good_size else 0
+            f.seek(start)
+            tail = f.read()
+            _, size = decode_records(tail)
+            if size < len(tail):
+                f.truncate(start + size)
+    except FileNotFoundError:
+        pass
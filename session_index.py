@@ -0,0 +1,171 @@
+import itertools
+from bisect import bisect_left, insort
+from collections import OrderedDict
+
+# 채팅 세션 인덱스
+#
+# user_data['chat_sessions'] 목록과 함께 유지하는 id 인덱스입니다.
+# id → 세션 매핑(삽입 순서 유지), id → 목록 위치, (date, id) 정렬 목록을 관리해서
+# 조회/수정은 O(1)로 처리합니다. 추가/삭제 시 정렬 목록은 위치를 O(log n)으로 찾지만
+# 그 뒤 항목을 옮기므로 O(n)입니다. (파이썬 리스트의 메모리 이동이라 세션 수천 개에서도 수 µs)
+#
+# 기록 화면의 필터를 위해 감정 → 세션 id 집합(보조 인덱스)도 함께 유지합니다.
+# 감정 필터는 집합 연산, 날짜 범위 필터는 정렬 목록의 bisect 범위 탐색으로 처리합니다.
+#
+# data_version은 인덱스를 통해 목록이 바뀔 때마다 달라지는 값으로,
+# 세션 목록에서 계산한 결과(예: 감정 통계)를 캐시하는 키로 사용합니다.
+
+# 인덱스마다 다른 세대 번호 (인덱스를 다시 만들면 data_version도 달라지도록)
+_generations = itertools.count()
+
+
+class SessionIndex:
+    """
+    채팅 세션 목록의 id 인덱스 + 날짜 정렬 뷰
+    """
+
+    def __init__(self, sessions):
+        # 인덱스가 관리하는 목록 (user_data['chat_sessions']와 같은 객체)
+        self.sessions = sessions
+        self.generation = next(_generations)
+        self.revision = 0
+        self._by_id = OrderedDict()
+        self._positions = {}
+        self._by_emotion = {}
+        for position, chat in enumerate(sessions):
+            self._by_id[chat["id"]] = chat
+            self._positions[chat["id"]] = position
+            self._by_emotion.setdefault(chat.get("emotion"), set()).add(chat["id"])
+        self._dates = sorted((chat.get("date", ""), chat["id"]) for chat in sessions)
+
+    def matches(self, sessions):
+        """인덱스가 주어진 목록과 동기화된 상태인지 확인합니다."""
+        return self.sessions is sessions and len(self._by_id) == len(sessions)
+
+    def __len__(self):
+        return len(self._by_id)
+
+    @property
+    def data_version(self):
+        """목록이 바뀔 때마다 달라지는 (세대, 변경 횟수) 값"""
+        return self.generation, self.revision
+
+    def __contains__(self, chat_id):
+        return chat_id in self._by_id
+
+    def get(self, chat_id):
+        """id로 세션을 찾습니다. 없으면 None"""
+        return self._by_id.get(chat_id)
+
+    def add(self, chat):
+        """세션을 목록 끝에 추가하고 인덱스에 등록합니다."""
+        self._positions[chat["id"]] = len(self.sessions)
+        self.sessions.append(chat)
+        self._by_id[chat["id"]] = chat
+        self._by_emotion.setdefault(chat.get("emotion"), set()).add(chat["id"])
+        insort(self._dates, (chat.get("date", ""), chat["id"]))
+        self.revision += 1
+
+    def set_emotion(self, chat_id, emotion):
+        """세션의 감정을 바꾸고 감정 인덱스를 갱신합니다."""
+        chat = self._by_id.get(chat_id)
+        if chat is None:
+            return
+        self._discard_emotion(chat)
+        chat["emotion"] = emotion
+        self._by_emotion.setdefault(emotion, set()).add(chat_id)
+        self.revision += 1
+
+    def _discard_emotion(self, chat):
+        bucket = self._by_emotion.get(chat.get("emotion"))
+        if bucket is not None:
+            bucket.discard(chat["id"])
+            if not bucket:
+                del self._by_emotion[chat.get("emotion")]
+
+    def remove(self, chat_id):
+        """
+        세션을 목록과 인덱스에서 삭제하고 삭제한 세션을 반환합니다.
+        목록에서는 마지막 세션을 빈자리로 옮기는 방식으로 삭제합니다. (O(1), 목록 순서는 바뀜)
+        날짜 정렬 목록에서의 삭제는 뒤 항목을 옮기므로 O(n)입니다.
+        """
+        chat = self._by_id.pop(chat_id, None)
+        if chat is None:
+            return None
+
+        self._discard_emotion(chat)
+        position = self._positions.pop(chat_id)
+        last = self.sessions.pop()
+        if last is not chat:
+            self.sessions[position] = last
+            self._positions[last["id"]] = position
+
+        key = (chat.get("date", ""), chat_id)
+        i = bisect_left(self._dates, key)
+        if i < len(self._dates) and self._dates[i] == key:
+            del self._dates[i]
+        self.revision += 1
+        return chat
+
+    def by_date(self, reverse=True):
+        """날짜 순(기본: 최신 순)으로 세션을 반환합니다."""
+        keys = reversed(self._dates) if reverse else iter(self._dates)
+        return [self._by_id[chat_id] for _, chat_id in keys]
+
+    def latest_date(self, emotion):
+        """감정이 같은 세션 중 가장 최근 날짜를 반환합니다. 없으면 None"""
+        ids = self._by_emotion.get(emotion)
+        if not ids:
+            return None
+        return max(self._by_id[chat_id].get("date", "") for chat_id in ids)
+
+    def emotion_counts(self):
+        """감정별 세션 수를 반환합니다."""
+        return {emotion: len(ids) for emotion, ids in self._by_emotion.items()}
+
+    def filter(self, emotions=None, date_start=None, date_end=None):
+        """
+        감정 / 날짜 범위 조건에 맞는 세션을 최신 순으로 반환합니다.
+        emotions: 감정 목록 (비어 있으면 전체)
+        date_start / date_end: datetime 객체 (None이면 제한 없음)
+        """
+        # 날짜 범위: 정렬 목록에서 bisect로 구간 찾기 ((date,) 튜플은 같은 날짜의 어떤 키보다 작음)
+        start_key = (date_start.isoformat(),) if date_start else None
+        end_key = (date_end.isoformat() + "\uffff",) if date_end else None
+        lo = bisect_left(self._dates, start_key) if start_key else 0
+        hi = bisect_left(self._dates, end_key) if end_key else len(self._dates)
+        date_range = self._dates[lo:hi]
+
+        if not emotions:
+            return [self._by_id[chat_id] for _, chat_id in reversed(date_range)]
+
+        # 감정 조건: 감정별 id 집합의 합집합
+        emotion_ids = set()
+        for emotion in emotions:
+            emotion_ids |= self._by_emotion.get(emotion, set())
+
+        if len(emotion_ids) < len(date_range):
+            # 감정 조건에 맞는 세션이 적으면 그것만 날짜 순으로 정렬
+            keys = sorted(
+                (key for key in ((self._by_id[i].get("date", ""), i) for i in emotion_ids)
+                 if (start_key is None or key >= start_key) and (end_key is None or key < end_key)),
+                reverse=True,
+            )
+            return [self._by_id[chat_id] for _, chat_id in keys]
+        return [self._by_id[chat_id] for _, chat_id in reversed(date_range) if chat_id in emotion_ids]
+
+
+def get_session_index(state):
+    """
+    세션 상태(st.session_state)의 채팅 세션 인덱스를 반환합니다.
+    user_data가 바뀌었거나 인덱스 밖에서 목록이 변경되었으면 다시 만듭니다.
+    """
+    user_data = state.get("user_data")
+    if user_data is None:
+        return SessionIndex([])
+    sessions = user_data.setdefault("chat_sessions", [])
+    index = state.get("session_index")
+    if index is None or not index.matches(sessions):
+        index = SessionIndex(sessions)
+        state["session_index"] = index
+    return index
@@ -0,0 +1,214 @@
+import threading
+import zlib
+from collections import OrderedDict
+
+import numpy as np
+
+from search_index import REC_ADD, REC_REMOVE
+
+# 비슷한 대화 찾기 (TF-IDF)
+#
+# 세션마다 검색 색인과 같은 글자 2-gram의 TF-IDF 벡터를 두고 코사인 유사도로 비슷한 대화를 찾습니다.
+# n-gram은 해시로 VECTOR_DIM개 칸에 나누어 담고(feature hashing), 세션 벡터는
+# (칸 번호 int32 배열, 등장한 메시지 수 float32 배열)의 희소 형식으로 둡니다.
+# 세션당 칸 수(VECTOR_MAX_TERMS)와 사용자당 세션 수(VECTOR_MAX_SESSIONS)를 제한하므로
+# 사용자당 메모리 사용량의 상한이 정해집니다. (세션 수를 넘으면 가장 오래 바뀌지 않은 세션부터 제외)
+#
+# 유사도는 모든 세션 벡터를 이어 붙인 배열에서 한 번에 계산합니다. (np.add.reduceat)
+# 벡터는 검색 색인(search_index)의 로그 레코드로 갱신하고, 처음 필요할 때 검색 색인에서 만듭니다.
+# 검색 색인에서 언제든 다시 만들 수 있으므로 따로 저장하지 않습니다.
+
+VECTOR_DIM = 1 << 15
+VECTOR_MAX_TERMS = 256
+VECTOR_MAX_SESSIONS = 2000
+
+# 메모리에 유지할 사용자 벡터 수
+VECTOR_CACHE_SIZE = 16
+
+# 이보다 유사도가 낮은 대화는 결과에서 제외
+MIN_SIMILARITY = 0.1
+
+
+def _bucket(gram):
+    return zlib.crc32(gram.encode("utf-8")) & (VECTOR_DIM - 1)
+
+
+def _compact(buckets, counts):
+    """같은 칸의 값을 합치고, 칸이 너무 많으면 값이 큰 VECTOR_MAX_TERMS개만 남깁니다."""
+    unique, inverse = np.unique(buckets, return_inverse=True)
+    merged = np.zeros(len(unique), dtype=np.float32)
+    np.add.at(merged, inverse, counts)
+    if len(unique) > VECTOR_MAX_TERMS:
+        keep = np.sort(np.argpartition(-merged, VECTOR_MAX_TERMS)[:VECTOR_MAX_TERMS])
+        unique, merged = unique[keep], merged[keep]
+    return unique.astype(np.int32), merged
+
+
+class SessionVectors:
+    """
+    사용자 한 명의 세션별 TF-IDF 벡터
+    """
+
+    def __init__(self):
+        # chat_id → (칸 번호, 등장 횟수) (바뀐 순서)
+        self.vectors = OrderedDict()
+        # 칸별로 그 칸을 가진 세션 수 (IDF 계산용)
+        self.df = np.zeros(VECTOR_DIM, dtype=np.int32)
+        self.lock = threading.Lock()
+        self._matrix = None
+
+    @classmethod
+    def from_index(cls, index):
+        """검색 색인(SearchIndex)에서 세션 벡터를 만듭니다."""
+        per_chat = {}
+        for gram, sessions in index.postings.items():
+            bucket = _bucket(gram)
+            for chat_id, positions in sessions.items():
+                buckets, counts = per_chat.setdefault(chat_id, ([], []))
+                buckets.append(bucket)
+                counts.append(len(positions))
+
+        vectors = cls()
+        # 세션 id는 생성 시각을 포함하므로 정렬하면 대략 오래된 순서
+        for chat_id in sorted(per_chat)[-VECTOR_MAX_SESSIONS:]:
+            buckets, counts = per_chat[chat_id]
+            vectors._set(chat_id, *_compact(np.array(buckets, dtype=np.int32), np.array(counts, dtype=np.float32)))
+        return vectors
+
+    def _set(self, chat_id, buckets, counts):
+        old = self.vectors.pop(chat_id, None)
+        if old is not None:
+            self.df[old[0]] -= 1
+        self.df[buckets] += 1
+        self.vectors[chat_id] = (buckets, counts)
+        self._matrix = None
+        while len(self.vectors) > VECTOR_MAX_SESSIONS:
+            self._remove(next(iter(self.vectors)))
+
+    def _remove(self, chat_id):
+        old = self.vectors.pop(chat_id, None)
+        if old is not None:
+            self.df[old[0]] -= 1
+            self._matrix = None
+
+    def apply(self, record):
+        """검색 색인 로그 레코드 하나를 반영합니다."""
+        with self.lock:
+            if record[0] == REC_ADD:
+                _, chat_id, _, grams = record
+                if not grams:
+                    return
+                buckets = np.fromiter((_bucket(gram) for gram in grams), dtype=np.int32, count=len(grams))
+                counts = np.ones(len(grams), dtype=np.float32)
+                old = self.vectors.get(chat_id)
+                if old is not None:
+                    buckets = np.concatenate((old[0], buckets))
+                    counts = np.concatenate((old[1], counts))
+                self._set(chat_id, *_compact(buckets, counts))
+            elif record[0] == REC_REMOVE:
+                self._remove(record[1])
+
+    def _build_matrix(self):
+        """모든 세션 벡터를 이어 붙이고 TF-IDF 가중치와 벡터 크기를 계산합니다."""
+        ids = list(self.vectors)
+        if not ids:
+            return None
+        values = list(self.vectors.values())
+        lengths = np.fromiter((len(buckets) for buckets, _ in values), dtype=np.int64, count=len(ids))
+        buckets = np.concatenate([b for b, _ in values])
+        counts = np.concatenate([c for _, c in values])
+        offsets = np.concatenate(([0], np.cumsum(lengths)[:-1]))
+
+        idf = (np.log((1 + len(ids)) / (1 + self.df.astype(np.float32))) + 1).astype(np.float32)
+        weights = (1 + np.log(counts)) * idf[buckets]
+        norms = np.sqrt(np.add.reduceat(weights * weights, offsets))
+        return {
+            "ids": ids,
+            "positions": {chat_id: i for i, chat_id in enumerate(ids)},
+            "buckets": buckets,
+            "weights": weights,
+            "offsets": offsets,
+            "lengths": lengths,
+            "norms": norms,
+        }
+
+    def similar(self, chat_id, limit=5):
+        """
+        세션과 비슷한 세션을 유사도 순으로 반환합니다. [(chat_id, 코사인 유사도)]
+        """
+        with self.lock:
+            if self._matrix is None:
+                self._matrix = self._build_matrix()
+            matrix = self._matrix
+            if matrix is None or chat_id not in matrix["positions"]:
+                return []
+
+            position = matrix["positions"][chat_id]
+            start = matrix["offsets"][position]
+            segment = slice(start, start + matrix["lengths"][position])
+            query = np.zeros(VECTOR_DIM, dtype=np.float32)
+            query[matrix["buckets"][segment]] = matrix["weights"][segment]
+
+            # 모든 세션과의 내적을 한 번에 계산
+            dots = np.add.reduceat(matrix["weights"] * query[matrix["buckets"]], matrix["offsets"])
+            scores = dots / (matrix["norms"] * matrix["norms"][position] + 1e-12)
+            scores[position] = -1.0
+
+            count = min(limit, len(scores) - 1)
+            if count <= 0:
+                return []
+            top = np.argpartition(-scores, count - 1)[:count]
+            top = top[np.argsort(-scores[top])]
+            return [(matrix["ids"][i], float(scores[i])) for i in top if scores[i] >= MIN_SIMILARITY]
+
+
+class SessionVectorStore:
+    """
+    사용자별 세션 벡터의 메모리 캐시 (최근 사용한 VECTOR_CACHE_SIZE명만 유지)
+    """
+
+    def __init__(self, cache_size=VECTOR_CACHE_SIZE):
+        self.cache_size = cache_size
+        self._vectors = OrderedDict()
+        self._guard = threading.Lock()
+
+    def peek(self, username):
+        """메모리에 있는 사용자의 세션 벡터를 반환합니다. 없으면 None (만들지 않음)"""
+        with self._guard:
+            vectors = self._vectors.get(username)
+            if vectors is not None:
+                self._vectors.move_to_end(username)
+            return vectors
+
+    def get(self, username, load_index):
+        """
+        사용자의 세션 벡터를 반환합니다. 없으면 load_index()가 반환한 검색 색인에서 만듭니다.
+        """
+        with self._guard:
+            vectors = self._vectors.get(username)
+            if vectors is not None:
+                self._vectors.move_to_end(username)
+                return vectors
+
+        index = load_index()
+        with index.lock:
+            vectors = SessionVectors.from_index(index)
+        with self._guard:
+            vectors = self._vectors.setdefault(username, vectors)
+            self._vectors.move_to_end(username)
+            while len(self._vectors) > self.cache_size:
+                self._vectors.popitem(last=False)
+        return vectors
+
+    def apply(self, username, records):
+        """검색 색인 로그 레코드를 반영합니다. (메모리에 있는 사용자만)"""
+        with self._guard:
+            vectors = self._vectors.get(username)
+        if vectors is not None:
+            for record in records:
+                vectors.apply(record)
+
+    def invalidate(self, username):
+        """사용자의 세션 벡터를 버립니다. (검색 색인을 다시 만든 경우)"""
+        with self._guard:
+            self._vectors.pop(username, None)
@@ -0,0 +1,461 @@
+import json
+import os
+import sqlite3
+import threading
+
+from emotion_goals import apply_goal_event, empty_goals
+from emotion_stats import apply_stored_change
+from user_schema import upgrade_user_data
+from user_store import LogUserStore, VersionConflict, merge_messages
+
+# SQLite 기반 사용자 데이터 저장소
+#
+# users / chat_sessions / messages 세 테이블로 나누어 저장하고,
+# 진행 중인 감정 목표는 emotion_goals 테이블(목표 이벤트마다 이 행 하나만 갱신),
+# 달성한 감정 목표는 goal_archive 테이블에 따로 보관합니다.
+# 감정 누적 통계는 emotion_stats 테이블에 두고, 변경이 있을 때 트랜잭션 안에서 이 행을 읽고 고쳐 씁니다.
+# WAL 모드를 사용하므로 여러 Streamlit 워커 프로세스가 같은 DB 파일을
+# 동시에 읽고 쓸 수 있습니다. LogUserStore와 같은 인터페이스를 제공합니다.
+#
+# 쓰기는 BEGIN IMMEDIATE 트랜잭션 안에서 실행되므로 프로세스 간 잠금은 SQLite가 맡고,
+# 세션 버전 비교와 충돌 합치기는 LogUserStore와 같은 규칙을 따릅니다.
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    username TEXT PRIMARY KEY,
+    fields TEXT NOT NULL DEFAULT '{}'
+);
+
+CREATE TABLE IF NOT EXISTS chat_sessions (
+    username TEXT NOT NULL,
+    id TEXT NOT NULL,
+    date TEXT,
+    emotion TEXT,
+    preview TEXT,
+    extra TEXT NOT NULL DEFAULT '{}',
+    version INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (username, id)
+);
+
+CREATE INDEX IF NOT EXISTS idx_chat_sessions_date ON chat_sessions (username, date);
+CREATE INDEX IF NOT EXISTS idx_chat_sessions_emotion ON chat_sessions (username, emotion);
+
+CREATE TABLE IF NOT EXISTS messages (
+    username TEXT NOT NULL,
+    chat_id TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    role TEXT,
+    content TEXT,
+    PRIMARY KEY (username, chat_id, seq)
+);
+
+CREATE TABLE IF NOT EXISTS emotion_goals (
+    username TEXT PRIMARY KEY,
+    data TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS emotion_stats (
+    username TEXT PRIMARY KEY,
+    data TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS goal_archive (
+    username TEXT NOT NULL,
+    goal_id TEXT NOT NULL,
+    completion_date TEXT,
+    data TEXT NOT NULL,
+    PRIMARY KEY (username, goal_id)
+);
+"""
+
+# chat_sessions 테이블에 별도 컬럼으로 저장하는 세션 필드
+SESSION_COLUMNS = ("id", "date", "emotion", "preview", "version")
+
+# users.fields 대신 별도 테이블에 저장하는 최상위 필드
+TABLE_FIELDS = ("chat_sessions", "goal_archive", "emotion_goals", "emotion_stats")
+
+
+def _session_row(username, chat_session):
+    extra = {k: v for k, v in chat_session.items() if k not in SESSION_COLUMNS and k != "messages"}
+    return (
+        username,
+        chat_session["id"],
+        chat_session.get("date"),
+        chat_session.get("emotion"),
+        chat_session.get("preview"),
+        json.dumps(extra, ensure_ascii=False),
+        chat_session.get("version", 0),
+    )
+
+
+def _session_from_row(row):
+    chat = json.loads(row["extra"])
+    chat.update({
+        "id": row["id"],
+        "date": row["date"],
+        "emotion": row["emotion"],
+        "preview": row["preview"],
+        "version": row["version"],
+    })
+    # 저장할 때 없던 필드는 복원하지 않음
+    for key in ("preview", "emotion", "date"):
+        if chat[key] is None:
+            del chat[key]
+    return chat
+
+
+class SQLiteUserStore:
+    """
+    SQLite(WAL) 기반의 사용자 데이터 저장소
+    """
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self._local = threading.local()
+        conn = self._connect()
+        conn.executescript(SCHEMA)
+        # 버전 컬럼이 없던 이전 DB 업그레이드
+        columns = {row["name"] for row in conn.execute("PRAGMA table_info(chat_sessions)")}
+        if "version" not in columns:
+            conn.execute("ALTER TABLE chat_sessions ADD COLUMN version INTEGER NOT NULL DEFAULT 0")
+
+    def _connect(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _transaction(self):
+        return _Transaction(self._connect())
+
+    # 읽기
+    def exists(self, username):
+        row = self._connect().execute(
+            "SELECT 1 FROM users WHERE username = ?", (username,)
+        ).fetchone()
+        return row is not None
+
+    def load(self, username, include_messages=True):
+        """
+        사용자 데이터를 반환합니다. 저장된 데이터가 없으면 None을 반환합니다.
+        include_messages가 False이면 messages 테이블은 읽지 않습니다.
+        """
+        conn = self._connect()
+        row = conn.execute("SELECT fields FROM users WHERE username = ?", (username,)).fetchone()
+        if row is None:
+            return None
+
+        data = json.loads(row["fields"])
+        for key in ("emotion_goals", "emotion_stats"):
+            field_row = conn.execute(f"SELECT data FROM {key} WHERE username = ?", (username,)).fetchone()
+            if field_row is not None:
+                data[key] = json.loads(field_row["data"])
+        sessions = {}
+        for session_row in conn.execute(
+            "SELECT * FROM chat_sessions WHERE username = ? ORDER BY rowid", (username,)
+        ):
+            chat = _session_from_row(session_row)
+            sessions[chat["id"]] = chat
+
+        if not include_messages:
+            data["chat_sessions"] = list(sessions.values())
+            return data
+
+        for chat in sessions.values():
+            chat["messages"] = []
+        for message_row in conn.execute(
+            "SELECT chat_id, role, content FROM messages WHERE username = ? ORDER BY chat_id, seq",
+            (username,),
+        ):
+            chat = sessions.get(message_row["chat_id"])
+            if chat is not None:
+                chat["messages"].append({"role": message_row["role"], "content": message_row["content"]})
+
+        data["chat_sessions"] = list(sessions.values())
+        return data
+
+    def load_messages(self, username, chat_id):
+        """채팅 세션 하나의 메시지 목록을 반환합니다."""
+        return self._select_messages(self._connect(), username, chat_id)
+
+    def query_sessions(self, username, emotions=None, date_start=None, date_end=None):
+        """
+        조건에 맞는 채팅 세션 메타데이터를 최신 순으로 반환합니다. (메시지 제외)
+        date_start / date_end는 ISO 형식 문자열입니다.
+        """
+        sql = "SELECT * FROM chat_sessions WHERE username = ?"
+        params = [username]
+        if emotions:
+            sql += f" AND emotion IN ({', '.join('?' for _ in emotions)})"
+            params.extend(emotions)
+        if date_start:
+            sql += " AND date >= ?"
+            params.append(date_start)
+        if date_end:
+            sql += " AND date <= ?"
+            params.append(date_end)
+        sql += " ORDER BY date DESC"
+        return [_session_from_row(row) for row in self._connect().execute(sql, params)]
+
+    # 쓰기
+    def save(self, username, data):
+        """
+        전체 데이터를 저장합니다.
+        messages를 불러오지 않은 세션은 저장된 메시지를 그대로 유지하고,
+        저장된 버전이 더 높은 세션과 목록에 없는 세션은 건드리지 않습니다. (merge_sessions 참고)
+        스키마 변환으로 생긴 goal_archive 목록은 goal_archive 테이블에 기록합니다.
+        """
+        fields = {k: v for k, v in data.items() if k not in TABLE_FIELDS}
+
+        with self._transaction() as conn:
+            conn.execute(
+                "INSERT INTO users (username, fields) VALUES (?, ?) "
+                "ON CONFLICT(username) DO UPDATE SET fields = excluded.fields",
+                (username, json.dumps(fields, ensure_ascii=False)),
+            )
+            for key in ("emotion_goals", "emotion_stats"):
+                if key in data:
+                    self._write_field_row(conn, key, username, data[key])
+            self._archive_goals(conn, username, data.get("goal_archive", []))
+
+            stored_versions = {
+                row["id"]: row["version"]
+                for row in conn.execute("SELECT id, version FROM chat_sessions WHERE username = ?", (username,))
+            }
+            for chat in data.get("chat_sessions", []):
+                if stored_versions.get(chat["id"], 0) > chat.get("version", 0):
+                    continue
+                self._upsert_session(conn, username, chat)
+                if "messages" in chat:
+                    conn.execute(
+                        "DELETE FROM messages WHERE username = ? AND chat_id = ?", (username, chat["id"])
+                    )
+                    self._insert_messages(conn, username, chat["id"], chat["messages"], 0)
+
+    def save_chat_session(self, username, chat_session, rewrite_messages=False):
+        """
+        채팅 세션 하나를 저장하고 새 버전을 반환합니다. 이미 저장된 메시지 뒤에 추가된 메시지만 기록합니다.
+        messages가 없는 세션은 메타데이터만 저장합니다.
+        rewrite_messages가 True이면 메시지 전체를 다시 기록합니다.
+
+        세션의 "version"이 저장된 버전과 다르면 저장된 메시지와 합쳐서 기록하고,
+        합친 메시지를 chat_session["messages"]에 넣습니다. rewrite_messages일 때는
+        합칠 수 없으므로 VersionConflict를 냅니다.
+        """
+        chat_id = chat_session["id"]
+        with self._transaction() as conn:
+            self._ensure_user(conn, username)
+            row = conn.execute(
+                "SELECT version FROM chat_sessions WHERE username = ? AND id = ?", (username, chat_id)
+            ).fetchone()
+            known_version = row["version"] if row is not None else 0
+
+            merged = False
+            if row is not None and chat_session.get("version", 0) != known_version and "messages" in chat_session:
+                if rewrite_messages:
+                    raise VersionConflict(chat_id, chat_session.get("version", 0), known_version)
+                # 다른 곳에서 먼저 이어 쓴 메시지와 합치기
+                stored_messages = self._select_messages(conn, username, chat_id)
+                chat_session["messages"] = merge_messages(stored_messages, chat_session["messages"])
+                merged = True
+
+            version = known_version + 1
+            self._upsert_session(conn, username, dict(chat_session, version=version))
+
+            if "messages" in chat_session:
+                messages = chat_session["messages"]
+                stored = conn.execute(
+                    "SELECT COUNT(*) FROM messages WHERE username = ? AND chat_id = ?",
+                    (username, chat_id),
+                ).fetchone()[0]
+                if merged or rewrite_messages or len(messages) < stored:
+                    # 메시지가 줄어든 경우 전체를 다시 기록
+                    conn.execute(
+                        "DELETE FROM messages WHERE username = ? AND chat_id = ?", (username, chat_id)
+                    )
+                    stored = 0
+                self._insert_messages(conn, username, chat_id, messages[stored:], stored)
+
+        chat_session["version"] = version
+        return version
+
+    def delete_chat_session(self, username, chat_id):
+        """채팅 세션과 메시지를 삭제합니다."""
+        with self._transaction() as conn:
+            self._delete_session(conn, username, chat_id)
+
+    def set_field(self, username, key, value):
+        """users 테이블의 최상위 필드 하나를 갱신합니다."""
+        with self._transaction() as conn:
+            self._ensure_user(conn, username)
+            if key in ("emotion_goals", "emotion_stats"):
+                self._write_field_row(conn, key, username, value)
+                return
+            row = conn.execute("SELECT fields FROM users WHERE username = ?", (username,)).fetchone()
+            fields = json.loads(row["fields"])
+            fields[key] = value
+            conn.execute(
+                "UPDATE users SET fields = ? WHERE username = ?",
+                (json.dumps(fields, ensure_ascii=False), username),
+            )
+
+    def append_goal_events(self, username, events, completed=()):
+        """
+        감정 목표 이벤트를 emotion_goals 테이블의 행에 적용하고, 달성한 목표는 goal_archive 테이블에 기록합니다.
+        (users.fields는 읽거나 다시 쓰지 않음)
+        """
+        with self._transaction() as conn:
+            self._ensure_user(conn, username)
+            row = conn.execute("SELECT data FROM emotion_goals WHERE username = ?", (username,)).fetchone()
+            if row is not None:
+                goals = json.loads(row["data"])
+            else:
+                # 이전 DB: users.fields에 있던 목표를 처음 한 번 옮겨 옴
+                fields_row = conn.execute("SELECT fields FROM users WHERE username = ?", (username,)).fetchone()
+                goals = json.loads(fields_row["fields"]).get("emotion_goals") or empty_goals()
+            for event in events:
+                apply_goal_event(goals, event)
+            self._write_field_row(conn, "emotion_goals", username, goals)
+            self._archive_goals(conn, username, completed)
+
+    def apply_emotion_stats_change(self, username, chat_id, date, previous_emotion, emotion):
+        """
+        대화 하나의 감정 변경을 emotion_stats 테이블의 행에 반영합니다.
+        트랜잭션 안에서 저장된 통계를 읽고 고쳐 쓰므로 다른 탭의 변경을 덮어쓰지 않습니다.
+        """
+        if previous_emotion == emotion:
+            return
+        with self._transaction() as conn:
+            self._ensure_user(conn, username)
+            row = conn.execute("SELECT data FROM emotion_stats WHERE username = ?", (username,)).fetchone()
+            if row is not None:
+                stats = json.loads(row["data"])
+            else:
+                # 이전 DB: users.fields에 있던 통계를 처음 한 번 옮겨 옴
+                fields_row = conn.execute("SELECT fields FROM users WHERE username = ?", (username,)).fetchone()
+                stats = json.loads(fields_row["fields"]).get("emotion_stats")
+            sessions = [
+                dict(session_row)
+                for session_row in conn.execute(
+                    "SELECT id, date, emotion FROM chat_sessions WHERE username = ?", (username,)
+                )
+            ]
+            stats = apply_stored_change(stats, sessions, chat_id, date, previous_emotion, emotion)
+            self._write_field_row(conn, "emotion_stats", username, stats)
+
+    def load_goal_archive(self, username):
+        """달성한 감정 목표 목록을 반환합니다. (달성한 순서)"""
+        rows = self._connect().execute(
+            "SELECT data FROM goal_archive WHERE username = ? ORDER BY completion_date, rowid", (username,)
+        )
+        return [json.loads(row["data"]) for row in rows]
+
+    # 내부 함수
+    def _write_field_row(self, conn, table, username, value):
+        """emotion_goals / emotion_stats 테이블의 사용자 행을 씁니다."""
+        conn.execute(
+            f"INSERT INTO {table} (username, data) VALUES (?, ?) "
+            "ON CONFLICT(username) DO UPDATE SET data = excluded.data",
+            (username, json.dumps(value, ensure_ascii=False)),
+        )
+
+    def _archive_goals(self, conn, username, goals):
+        conn.executemany(
+            "INSERT OR REPLACE INTO goal_archive (username, goal_id, completion_date, data) VALUES (?, ?, ?, ?)",
+            [
+                (username, goal["id"], goal.get("completion_date"), json.dumps(goal, ensure_ascii=False))
+                for goal in goals
+            ],
+        )
+
+    def _select_messages(self, conn, username, chat_id):
+        rows = conn.execute(
+            "SELECT role, content FROM messages WHERE username = ? AND chat_id = ? ORDER BY seq",
+            (username, chat_id),
+        )
+        return [{"role": row["role"], "content": row["content"]} for row in rows]
+
+    def _ensure_user(self, conn, username):
+        conn.execute("INSERT OR IGNORE INTO users (username) VALUES (?)", (username,))
+
+    def _delete_session(self, conn, username, chat_id):
+        conn.execute("DELETE FROM chat_sessions WHERE username = ? AND id = ?", (username, chat_id))
+        conn.execute("DELETE FROM messages WHERE username = ? AND chat_id = ?", (username, chat_id))
+
+    def _upsert_session(self, conn, username, chat_session):
+        conn.execute(
+            "INSERT INTO chat_sessions (username, id, date, emotion, preview, extra, version) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?) "
+            "ON CONFLICT(username, id) DO UPDATE SET "
+            "date = excluded.date, emotion = excluded.emotion, "
+            "preview = excluded.preview, extra = excluded.extra, version = excluded.version",
+            _session_row(username, chat_session),
+        )
+
+    def _insert_messages(self, conn, username, chat_id, messages, start_seq):
+        conn.executemany(
+            "INSERT OR REPLACE INTO messages (username, chat_id, seq, role, content) VALUES (?, ?, ?, ?, ?)",
+            [
+                (username, chat_id, start_seq + i, msg.get("role"), msg.get("content"))
+                for i, msg in enumerate(messages)
+            ],
+        )
+
+
+class _Transaction:
+    """BEGIN IMMEDIATE ~ COMMIT/ROLLBACK 컨텍스트 매니저"""
+
+    def __init__(self, conn):
+        self.conn = conn
+
+    def __enter__(self):
+        self.conn.execute("BEGIN IMMEDIATE")
+        return self.conn
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.conn.execute("COMMIT")
+        else:
+            self.conn.execute("ROLLBACK")
+        return False
+
+
+# 파일 저장소 마이그레이션
+def import_file_user(store, file_store, username):
+    """
+    파일 저장소(LogUserStore)의 사용자 데이터 하나를 SQLite로 가져옵니다.
+    가져온 데이터를 반환하며, 파일이 없으면 None을 반환합니다.
+    """
+    data = file_store.load(username)
+    if data is None:
+        return None
+    upgrade_user_data(data)
+    # 파일 저장소의 목표 보관함도 함께 가져오기
+    data["goal_archive"] = file_store.load_goal_archive(username) + data.get("goal_archive", [])
+    store.save(username, data)
+    del data["goal_archive"]
+    return data
+
+
+def import_file_users(store, directory, overwrite=False):
+    """
+    디렉토리의 모든 사용자 데이터 파일(스냅샷 또는 이전 버전 피클)을 SQLite로 가져옵니다.
+    가져온 사용자 이름 목록을 반환합니다.
+    """
+    file_store = LogUserStore(directory)
+    usernames = sorted({
+        os.path.splitext(filename)[0]
+        for filename in os.listdir(directory)
+        if filename.endswith((".snapshot", ".pkl"))
+    })
+    imported = []
+    for username in usernames:
+        if not overwrite and store.exists(username):
+            continue
+        if import_file_user(store, file_store, username) is not None:
+            imported.append(username)
+    return imported
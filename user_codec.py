@@ -0,0 +1,87 @@
+import json
+import struct
+import zlib
+
+# 사용자 데이터 파일 형식
+#
+# pickle 대신 사용하는 버전이 붙은 바이너리 형식입니다. 값은 JSON으로 인코딩하므로
+# 읽을 때 임의 코드가 실행되지 않고, 한글이 많은 메시지 본문은 zlib로 압축합니다.
+#
+# 스냅샷: MAGIC(4) + 형식 버전(1) + CRC32(4) + zlib(JSON)
+# 로그:   레코드마다 길이(4) + CRC32(4) + 플래그(1) + 본문(JSON 배열, 플래그에 따라 zlib)
+#         길이/CRC가 맞지 않는 레코드(기록 도중 종료되어 잘린 꼬리)에서 읽기를 멈춥니다.
+
+SNAPSHOT_MAGIC = b"TCUD"
+FORMAT_VERSION = 1
+# 압축 수준. 6 이상은 저장 시간이 2배 넘게 걸리는 데 비해 크기는 크게 줄지 않음
+# (benchmarks/compare_user_data_format.py 참고)
+COMPRESS_LEVEL = 1
+
+# 이보다 짧은 로그 레코드는 압축하지 않음 (압축 헤더 때문에 오히려 커짐)
+COMPRESS_MIN_BYTES = 256
+
+FLAG_ZLIB = 0x01
+
+_SNAPSHOT_HEADER = struct.Struct("<4sBI")
+_RECORD_HEADER = struct.Struct("<IIB")
+
+
+class CorruptDataError(ValueError):
+    """파일 형식이 맞지 않거나 내용이 손상되었을 때 발생합니다."""
+
+
+def _dumps(value):
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def encode_snapshot(data, level=COMPRESS_LEVEL):
+    """사용자 데이터 전체를 스냅샷 바이트로 인코딩합니다. level: zlib 압축 수준"""
+    body = zlib.compress(_dumps(data), level)
+    return _SNAPSHOT_HEADER.pack(SNAPSHOT_MAGIC, FORMAT_VERSION, zlib.crc32(body)) + body
+
+
+def decode_snapshot(payload):
+    """스냅샷 바이트를 사용자 데이터로 디코딩합니다."""
+    if len(payload) < _SNAPSHOT_HEADER.size:
+        raise CorruptDataError("스냅샷이 너무 짧습니다.")
+    magic, version, crc = _SNAPSHOT_HEADER.unpack_from(payload)
+    if magic != SNAPSHOT_MAGIC:
+        raise CorruptDataError("사용자 데이터 스냅샷 파일이 아닙니다.")
+    if version > FORMAT_VERSION:
+        raise CorruptDataError(f"지원하지 않는 스냅샷 형식 버전입니다: {version}")
+    body = payload[_SNAPSHOT_HEADER.size:]
+    if zlib.crc32(body) != crc:
+        raise CorruptDataError("스냅샷 CRC가 맞지 않습니다.")
+    return json.loads(zlib.decompress(body))
+
+
+def encode_record(record):
+    """로그 레코드(튜플) 하나를 인코딩합니다."""
+    body = _dumps(record)
+    flags = 0
+    if len(body) >= COMPRESS_MIN_BYTES:
+        compressed = zlib.compress(body, COMPRESS_LEVEL)
+        if len(compressed) < len(body):
+            body, flags = compressed, FLAG_ZLIB
+    return _RECORD_HEADER.pack(len(body), zlib.crc32(body), flags) + body
+
+
+def decode_records(payload):
+    """
+    로그 바이트에서 레코드 목록을 디코딩합니다. (레코드는 리스트로 반환)
+    잘리거나 손상된 레코드를 만나면 그 앞까지만 읽습니다.
+    반환값: (레코드 목록, 정상적으로 읽은 바이트 수)
+    """
+    records = []
+    pos = 0
+    while pos + _RECORD_HEADER.size <= len(payload):
+        length, crc, flags = _RECORD_HEADER.unpack_from(payload, pos)
+        start = pos + _RECORD_HEADER.size
+        body = payload[start:start + length]
+        if len(body) < length or zlib.crc32(body) != crc:
+            break
+        if flags & FLAG_ZLIB:
+            body = zlib.decompress(body)
+        records.append(json.loads(body))
+        pos = start + length
+    return records, pos
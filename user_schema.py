@@ -0,0 +1,108 @@
+import datetime
+
+from emotion_goals import compact_goal
+from emotion_stats import rebuild_stats
+
+# 사용자 데이터 스키마 버전
+#
+# 저장된 사용자 데이터의 "schema_version"을 보고 필요한 변환을 순서대로 적용합니다.
+# 데이터 구조를 바꿀 때는 SCHEMA_VERSION을 올리고 MIGRATIONS에 변환 함수를 추가합니다.
+#
+# 버전 기록
+#   0: chat_history / emotions 목록만 있는 초기 형식
+#   1: chat_sessions 목록 (세션마다 id, date, emotion, preview, messages)
+#   2: emotion_stats 누적 통계 (감정별 대화 수, 날짜별 감정 수, 감정별 최근 시각)
+#   3: emotion_goals에는 진행 중인 목표만 (성과는 날짜별 횟수 hits), 달성한 목표는 목표 보관함
+#      (변환 직후에는 goal_archive 목록에 두고, 저장할 때 저장소가 보관함으로 옮김)
+#   4: 채팅 세션으로 변환한 뒤 남아 있던 chat_history 목록 삭제
+
+SCHEMA_VERSION = 4
+
+
+def _chat_history_to_sessions(data):
+    """0 → 1: 기존 채팅 기록을 채팅 세션 하나로 변환합니다."""
+    data['chat_sessions'] = []
+
+    # 기존 채팅 기록이 있으면 새 형식으로 변환
+    if 'chat_history' in data and data['chat_history']:
+        timestamp = datetime.datetime.now().isoformat()
+        chat_id = f"chat_legacy_{timestamp}"
+
+        emotion = None
+        if 'emotions' in data and data['emotions']:
+            emotion = data['emotions'][-1]
+
+        chat_preview = data['chat_history'][0]['content'] if data['chat_history'] else "이전 대화"
+
+        # 레거시 채팅 세션 생성
+        chat_session = {
+            "id": chat_id,
+            "date": timestamp,
+            "emotion": emotion,
+            "preview": chat_preview,
+            "messages": data['chat_history']
+        }
+
+        data['chat_sessions'].append(chat_session)
+
+    # 변환한 기록은 채팅 세션에 있으므로 삭제
+    data.pop('chat_history', None)
+
+
+def _add_emotion_stats(data):
+    """1 → 2: 채팅 세션 목록에서 감정 누적 통계를 만듭니다."""
+    data['emotion_stats'] = rebuild_stats(data.get('chat_sessions', []))
+
+
+def _compact_emotion_goals(data):
+    """2 → 3: 목표 성과를 날짜별 횟수로 모으고 달성한 목표를 보관함으로 옮길 목록에 둡니다."""
+    goals = data.get('emotion_goals') or {}
+    active = goals.get('active_goal')
+    if active and not active.get('completed'):
+        active = compact_goal(active, "goal_legacy_active")
+    else:
+        active = None
+    data['emotion_goals'] = {"active_goal": active}
+    data['goal_archive'] = [
+        compact_goal(goal, f"goal_legacy_{i}") for i, goal in enumerate(goals.get('history', []))
+    ]
+
+
+def _drop_chat_history(data):
+    """3 → 4: 0 → 1 변환 후에도 남아 있던 chat_history 목록을 삭제합니다. (이미 채팅 세션으로 변환됨)"""
+    data.pop('chat_history', None)
+
+
+# 버전 n 데이터를 n + 1로 바꾸는 함수
+MIGRATIONS = {
+    0: _chat_history_to_sessions,
+    1: _add_emotion_stats,
+    2: _compact_emotion_goals,
+    3: _drop_chat_history,
+}
+
+
+def get_schema_version(data):
+    """데이터의 스키마 버전을 반환합니다. (버전 기록 이전 데이터는 구조로 판단)"""
+    if "schema_version" in data:
+        return data["schema_version"]
+    return 1 if "chat_sessions" in data else 0
+
+
+def upgrade_user_data(data):
+    """
+    사용자 데이터를 현재 스키마 버전으로 변환합니다.
+    변환이 일어났으면(버전 기록 포함) True를 반환합니다.
+    """
+    version = get_schema_version(data)
+    if version > SCHEMA_VERSION:
+        raise ValueError(f"이 버전보다 새로운 사용자 데이터입니다. (스키마 버전 {version})")
+
+    while version < SCHEMA_VERSION:
+        MIGRATIONS[version](data)
+        version += 1
+
+    if data.get("schema_version") == version:
+        return False
+    data["schema_version"] = version
+    return True
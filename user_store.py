@@ -0,0 +1,568 @@
+import contextlib
+import copy
+import os
+import pickle
+import threading
+
+from emotion_goals import apply_goal_event, empty_goals
+from emotion_stats import apply_stored_change
+from file_lock import file_lock, read_counter, write_counter
+from file_writer import BackgroundWriter, atomic_write_bytes, append_bytes
+from user_codec import encode_snapshot, decode_snapshot, encode_record, decode_records
+
+# 사용자 데이터 저장소
+#
+# 사용자마다 스냅샷 파일(<username>.snapshot)과 추가 전용 로그(<username>.journal)를 둡니다.
+# 파일 형식은 user_codec을 참고하세요. 이전 버전의 피클 파일(<username>.pkl / .log)은
+# 처음 읽을 때 새 형식으로 변환하고 삭제합니다.
+# 메시지 추가나 세션 메타데이터 변경은 로그 끝에 레코드 하나를 덧붙이는 것으로 끝나고,
+# 로드할 때는 스냅샷 위에 로그를 순서대로 재생해서 상태를 복원합니다.
+# 로그가 일정 크기를 넘으면 백그라운드 스레드가 스냅샷으로 압축(compaction)합니다.
+#
+# 로그 레코드는 모두 "값을 덮어쓰는" 연산이므로 같은 레코드를 두 번 재생해도
+# 결과가 같습니다. 압축 도중 종료되어 로그가 다시 재생되어도 안전합니다.
+#
+# 파일 쓰기는 모두 BackgroundWriter 워커 스레드에서 요청 순서대로 실행합니다.
+# 스냅샷은 임시 파일 + fsync + os.replace로 교체하고, 로그 추가도 fsync합니다.
+#
+# 여러 탭 / 여러 프로세스가 같은 사용자를 쓸 수 있으므로, 쓰기는 사용자별 잠금 파일
+# (<username>.lock)을 잡고 실행하며 채팅 세션마다 버전 번호("version")를 둡니다.
+# 세션 저장은 compare-and-swap 방식입니다. 저장하려는 세션의 버전이 저장된 버전과 다르면
+# (다른 곳에서 먼저 이어 썼으면) 저장된 메시지와 새 메시지를 합친 뒤 기록합니다.
+#
+# 감정 목표 진행은 목표 이벤트 레코드 하나를 로그에 덧붙이고(emotion_goals 참고),
+# 달성한 목표는 사용자 데이터 밖의 목표 보관함(<username>.goals)에 레코드로 덧붙입니다.
+# 감정 누적 통계는 잠금 안에서 마지막으로 기록된 통계에 변경을 반영한 뒤 REC_SET으로 덧붙입니다.
+
+# 로그 압축 기준
+COMPACT_MAX_RECORDS = 500
+COMPACT_MAX_BYTES = 4 * 1024 * 1024
+
+# 로그 레코드 종류
+REC_SESSION = "session"    # (REC_SESSION, 메타데이터 dict) - 세션 생성/메타데이터 갱신
+REC_MESSAGES = "messages"  # (REC_MESSAGES, chat_id, offset, 메시지 목록) - messages[offset:] 교체
+REC_DELETE = "delete"      # (REC_DELETE, chat_id) - 세션 삭제
+REC_SET = "set"            # (REC_SET, key, value) - 최상위 필드 설정
+REC_VERSION = "version"    # (REC_VERSION, chat_id, version) - 세션 버전 설정
+REC_GOAL = "goal"          # (REC_GOAL, 목표 이벤트) - emotion_goals에 목표 이벤트 적용
+
+
+class VersionConflict(Exception):
+    """
+    저장하려는 채팅 세션이 다른 곳에서 먼저 변경되어 합칠 수 없을 때 발생합니다.
+    """
+
+    def __init__(self, chat_id, expected, current):
+        super().__init__(f"채팅 세션 {chat_id}의 버전이 맞지 않습니다. (기대: {expected}, 현재: {current})")
+        self.chat_id = chat_id
+        self.expected = expected
+        self.current = current
+
+
+def _session_meta(chat_session):
+    """메시지를 제외한 세션 메타데이터를 반환합니다."""
+    return {k: v for k, v in chat_session.items() if k != "messages"}
+
+
+def _content_meta(chat_session):
+    """변경 여부 비교용 메타데이터 (메시지와 버전 제외)"""
+    return {k: v for k, v in chat_session.items() if k not in ("messages", "version")}
+
+
+def _stored_messages(messages):
+    """저장할 메시지 목록 (화면 표시용 seq 제외)"""
+    return [{k: v for k, v in msg.items() if k != "seq"} for msg in messages]
+
+
+def merge_messages(stored, incoming):
+    """
+    같은 세션을 두 곳에서 이어 쓴 경우 메시지 목록을 합칩니다.
+    공통된 앞부분 뒤에 저장된 메시지를 두고, 그 뒤에 새로 들어온 메시지를 붙입니다.
+    """
+    common = 0
+    for a, b in zip(stored, incoming):
+        if (a.get("role"), a.get("content")) != (b.get("role"), b.get("content")):
+            break
+        common += 1
+    return list(stored) + list(incoming[common:])
+
+
+def merge_sessions(stored_sessions, sessions):
+    """
+    전체 저장 시 세션 목록을 합칩니다.
+    - 저장된 버전이 더 높은 세션은 저장된 것을 유지 (다른 곳에서 더 최근에 저장)
+    - messages를 불러오지 않은 세션은 저장된 메시지를 채움
+    - 목록에 없는 저장된 세션은 그대로 유지 (삭제는 delete_chat_session으로만)
+    """
+    stored_by_id = {chat["id"]: chat for chat in stored_sessions}
+    merged = []
+    for chat in sessions:
+        stored = stored_by_id.pop(chat["id"], None)
+        if stored is not None and stored.get("version", 0) > chat.get("version", 0):
+            merged.append(stored)
+        elif "messages" not in chat:
+            merged.append(dict(chat, messages=stored.get("messages", []) if stored else []))
+        else:
+            merged.append(chat)
+    merged.extend(stored_by_id.values())
+    return merged
+
+
+def apply_record(data, record):
+    """로그 레코드 하나를 사용자 데이터에 적용합니다."""
+    kind = record[0]
+    if kind == REC_SET:
+        data[record[1]] = record[2]
+        return
+    if kind == REC_GOAL:
+        apply_goal_event(data.setdefault("emotion_goals", empty_goals()), record[1])
+        return
+
+    sessions = data.setdefault("chat_sessions", [])
+    if kind == REC_SESSION:
+        meta = record[1]
+        for chat in sessions:
+            if chat["id"] == meta["id"]:
+                chat.update(meta)
+                break
+        else:
+            chat = dict(meta)
+            chat.setdefault("messages", [])
+            sessions.append(chat)
+    elif kind == REC_MESSAGES:
+        _, chat_id, offset, messages = record
+        for chat in sessions:
+            if chat["id"] == chat_id:
+                chat.setdefault("messages", [])[offset:] = messages
+                break
+    elif kind == REC_DELETE:
+        chat_id = record[1]
+        data["chat_sessions"] = [chat for chat in sessions if chat["id"] != chat_id]
+    elif kind == REC_VERSION:
+        _, chat_id, version = record
+        for chat in sessions:
+            if chat["id"] == chat_id:
+                chat["version"] = version
+                break
+
+
+def _copy_user_data(data):
+    """
+    워커 스레드가 직렬화하는 동안 요청 스레드가 바꾸지 못하도록
+    사용자 데이터의 세션 목록과 메시지 목록을 얕게 복사합니다.
+    """
+    copied = dict(data)
+    if "chat_sessions" in data:
+        copied["chat_sessions"] = [
+            dict(chat, messages=_stored_messages(chat["messages"])) if "messages" in chat else dict(chat)
+            for chat in data["chat_sessions"]
+        ]
+    return copied
+
+
+def _read_records(path):
+    """
+    로그 파일의 레코드를 순서대로 읽습니다.
+    기록 도중 종료되어 잘린 꼬리가 있으면 잘라내서 다음 레코드가 그 뒤에 붙지 않도록 합니다.
+    (잠금 안에서 호출)
+    """
+    try:
+        with open(path, "r+b") as f:
+            payload = f.read()
+            records, size = decode_records(payload)
+            if size < len(payload):
+                f.truncate(size)
+            return records
+    except FileNotFoundError:
+        return []
+
+
+def _read_pickle_records(path):
+    """이전 버전 피클 로그의 레코드를 읽습니다. 잘린 마지막 레코드는 무시합니다."""
+    records = []
+    try:
+        with open(path, "rb") as f:
+            while True:
+                try:
+                    records.append(pickle.load(f))
+                except EOFError:
+                    break
+                except (pickle.UnpicklingError, ValueError, TypeError):
+                    # 기록 도중 종료되어 잘린 레코드
+                    break
+    except FileNotFoundError:
+        pass
+    return records
+
+
+class LogUserStore:
+    """
+    스냅샷 + 추가 전용 로그 기반의 사용자 데이터 저장소
+    """
+
+    def __init__(self, directory, writer=None):
+        self.directory = directory
+        self.writer = writer or BackgroundWriter()
+        self._locks = {}
+        self._locks_guard = threading.Lock()
+        self._compacting = set()
+        # 사용자별 로그 레코드 수 / 세션별로 기록된 (메타데이터, 메시지 수, 버전)
+        self._log_records = {}
+        self._persisted = {}
+        # 사용자별로 마지막으로 기록된 감정 누적 통계
+        self._stats = {}
+        # 사용자별로 마지막으로 확인한 변경 카운터 (다른 프로세스의 쓰기 감지용)
+        self._counters = {}
+
+    # 경로 및 잠금
+    def snapshot_path(self, username):
+        return os.path.join(self.directory, f"{username}.snapshot")
+
+    def log_path(self, username):
+        return os.path.join(self.directory, f"{username}.journal")
+
+    def goal_archive_path(self, username):
+        return os.path.join(self.directory, f"{username}.goals")
+
+    def _legacy_paths(self, username):
+        """이전 버전 피클 파일 경로 (스냅샷, 압축 중이던 로그, 로그)"""
+        base = os.path.join(self.directory, username)
+        return f"{base}.pkl", f"{base}.log.compacting", f"{base}.log"
+
+    def _lock_path(self, username):
+        return os.path.join(self.directory, f"{username}.lock")
+
+    def _thread_lock(self, username):
+        with self._locks_guard:
+            lock = self._locks.get(username)
+            if lock is None:
+                lock = self._locks[username] = threading.Lock()
+            return lock
+
+    @contextlib.contextmanager
+    def _lock(self, username):
+        """
+        스레드 잠금 + 프로세스 간 파일 잠금
+        잠금 파일에는 사용자 파일을 바꿀 때마다 1씩 늘리는 변경 카운터를 기록합니다.
+        """
+        with self._thread_lock(username), file_lock(self._lock_path(username)) as f:
+            yield f
+
+    def _changed(self, username, lock_file):
+        """(잠금 안에서 호출) 사용자 파일을 바꿨음을 기록합니다."""
+        counter = read_counter(lock_file) + 1
+        write_counter(lock_file, counter)
+        self._counters[username] = counter
+
+    def _refresh(self, username, lock_file):
+        """
+        (잠금 안에서 호출) 마지막 확인 후 다른 프로세스가 파일을 바꿨으면
+        기록된 세션 상태를 파일에서 다시 읽습니다.
+        """
+        counter = read_counter(lock_file)
+        if self._counters.get(username) == counter and username in self._persisted:
+            return
+        try:
+            data, count = self._replay(username)
+        except FileNotFoundError:
+            data, count = {}, 0
+        self._log_records[username] = count
+        self._remember(username, data)
+        self._counters[username] = counter
+
+    def _remember(self, username, data):
+        """
+        세션별로 기록된 상태를 기억해 두어 다음 저장 때 변경분만 쓰도록 합니다.
+        """
+        self._persisted[username] = {
+            chat["id"]: (_content_meta(chat), len(chat.get("messages", [])), chat.get("version", 0))
+            for chat in data.get("chat_sessions", [])
+        }
+        self._stats[username] = data.get("emotion_stats")
+
+    def _upgrade_legacy_files(self, username):
+        """(잠금 안에서 호출) 이전 버전 피클 파일이 있으면 새 형식 스냅샷으로 변환합니다."""
+        snapshot_path, *log_paths = self._legacy_paths(username)
+        if os.path.exists(self.snapshot_path(username)) or not os.path.exists(snapshot_path):
+            return
+        with open(snapshot_path, "rb") as f:
+            data = pickle.load(f)
+        for path in log_paths:
+            for record in _read_pickle_records(path):
+                apply_record(data, record)
+        atomic_write_bytes(self.snapshot_path(username), encode_snapshot(data))
+        for path in (snapshot_path, *log_paths):
+            if os.path.exists(path):
+                os.remove(path)
+
+    # 읽기
+    def _replay(self, username):
+        self._upgrade_legacy_files(username)
+        with open(self.snapshot_path(username), "rb") as f:
+            data = decode_snapshot(f.read())
+        count = 0
+        for record in _read_records(self.log_path(username)):
+            apply_record(data, record)
+            count += 1
+        return data, count
+
+    def exists(self, username):
+        self.writer.flush()
+        return os.path.exists(self.snapshot_path(username)) or os.path.exists(self._legacy_paths(username)[0])
+
+    def load(self, username, include_messages=True):
+        """
+        스냅샷과 로그를 재생하여 사용자 데이터를 반환합니다.
+        include_messages가 False이면 세션 목록에서 messages를 제외합니다.
+        저장된 데이터가 없으면 None을 반환합니다.
+        """
+        self.writer.flush()
+        with self._lock(username) as lock_file:
+            try:
+                data, count = self._replay(username)
+            except FileNotFoundError:
+                return None
+            self._log_records[username] = count
+            self._remember(username, data)
+            self._counters[username] = read_counter(lock_file)
+
+        if not include_messages and "chat_sessions" in data:
+            data["chat_sessions"] = [_session_meta(chat) for chat in data.get("chat_sessions", [])]
+        return data
+
+    def load_messages(self, username, chat_id):
+        """채팅 세션 하나의 메시지 목록을 반환합니다."""
+        self.writer.flush()
+        with self._lock(username):
+            try:
+                data, _ = self._replay(username)
+            except FileNotFoundError:
+                return []
+        for chat in data.get("chat_sessions", []):
+            if chat["id"] == chat_id:
+                return chat.get("messages", [])
+        return []
+
+    def query_sessions(self, username, emotions=None, date_start=None, date_end=None):
+        """
+        조건에 맞는 채팅 세션 메타데이터를 최신 순으로 반환합니다. (메시지 제외)
+        date_start / date_end는 ISO 형식 문자열입니다.
+        """
+        data = self.load(username) or {}
+        sessions = []
+        for chat in data.get("chat_sessions", []):
+            if emotions and chat.get("emotion") not in emotions:
+                continue
+            date = chat.get("date", "")
+            if date_start and date < date_start:
+                continue
+            if date_end and date > date_end:
+                continue
+            sessions.append(_session_meta(chat))
+        sessions.sort(key=lambda x: x.get("date", ""), reverse=True)
+        return sessions
+
+    def load_goal_archive(self, username):
+        """목표 보관함의 달성한 목표 목록을 반환합니다. (보관한 순서)"""
+        self.writer.flush()
+        with self._lock(username):
+            goals = {goal["id"]: goal for goal in _read_records(self.goal_archive_path(username))}
+        return list(goals.values())
+
+    # 쓰기
+    def save(self, username, data):
+        """
+        전체 데이터를 스냅샷으로 저장하고 로그를 비웁니다.
+        저장된 세션과 합쳐서 기록합니다. (merge_sessions 참고)
+        스키마 변환으로 생긴 goal_archive 목록은 스냅샷 대신 목표 보관함에 기록합니다.
+        """
+        self.writer.submit(self._write_snapshot, username, _copy_user_data(data))
+
+    def _write_snapshot(self, username, data):
+        # 워커 스레드에서 실행
+        with self._lock(username) as lock_file:
+            try:
+                stored, _ = self._replay(username)
+            except FileNotFoundError:
+                stored = {}
+            data = dict(data)
+            archived = data.pop("goal_archive", None)
+            if archived:
+                self._archive_goals(username, archived)
+            data["chat_sessions"] = merge_sessions(stored.get("chat_sessions", []), data.get("chat_sessions", []))
+            atomic_write_bytes(self.snapshot_path(username), encode_snapshot(data))
+            if os.path.exists(self.log_path(username)):
+                os.remove(self.log_path(username))
+            self._log_records[username] = 0
+            self._remember(username, data)
+            self._changed(username, lock_file)
+
+    def _append(self, username, records):
+        if records:
+            self.writer.submit(self._write_records, username, records)
+
+    def _write_records(self, username, records):
+        # 워커 스레드에서 실행
+        with self._lock(username) as lock_file:
+            self._refresh(username, lock_file)
+            self._append_locked(username, lock_file, records)
+            for record in records:
+                if record[0] == REC_DELETE:
+                    self._persisted.get(username, {}).pop(record[1], None)
+
+    def _append_locked(self, username, lock_file, records):
+        payload = b"".join(encode_record(record) for record in records)
+        size = append_bytes(self.log_path(username), payload)
+        count = self._log_records.get(username, 0) + len(records)
+        self._log_records[username] = count
+        for record in records:
+            if record[0] == REC_SET and record[1] == "emotion_stats":
+                self._stats[username] = record[2]
+        self._changed(username, lock_file)
+        if count >= COMPACT_MAX_RECORDS or size >= COMPACT_MAX_BYTES:
+            self.compact_in_background(username)
+
+    def save_chat_session(self, username, chat_session, rewrite_messages=False):
+        """
+        채팅 세션 하나의 변경분을 로그에 추가하고 새 버전을 반환합니다.
+        메타데이터가 바뀐 경우에만 메타데이터를, 새로 추가된 메시지만 기록합니다.
+        messages가 없는 세션은 메타데이터만 기록합니다.
+        rewrite_messages가 True이면 메시지 전체를 다시 기록합니다.
+
+        세션의 "version"이 저장된 버전과 다르면 저장된 메시지와 합쳐서 기록하고,
+        합친 메시지를 chat_session["messages"]에 넣습니다. rewrite_messages일 때는
+        합칠 수 없으므로 VersionConflict를 냅니다.
+        버전 확인 결과를 돌려주기 위해 쓰기가 끝날 때까지 기다립니다.
+        """
+        return self.writer.submit(self._write_session, username, chat_session, rewrite_messages).result()
+
+    def _write_session(self, username, chat_session, rewrite_messages):
+        # 워커 스레드에서 실행
+        chat_id = chat_session["id"]
+        with self._lock(username) as lock_file:
+            self._refresh(username, lock_file)
+            persisted = self._persisted.setdefault(username, {})
+            known = persisted.get(chat_id)
+            known_meta, known_count, known_version = known or (None, 0, 0)
+
+            merged = False
+            if known is not None and chat_session.get("version", 0) != known_version and "messages" in chat_session:
+                if rewrite_messages:
+                    raise VersionConflict(chat_id, chat_session.get("version", 0), known_version)
+                # 다른 곳에서 먼저 이어 쓴 메시지와 합치기
+                stored, _ = self._replay(username)
+                stored_messages = next(
+                    (chat.get("messages", []) for chat in stored.get("chat_sessions", []) if chat["id"] == chat_id), []
+                )
+                chat_session["messages"] = merge_messages(stored_messages, chat_session["messages"])
+                merged = True
+
+            records = []
+            meta = _content_meta(chat_session)
+            count = known_count
+            if "messages" in chat_session:
+                messages = chat_session["messages"]
+                if merged or rewrite_messages or known is None or len(messages) < known_count:
+                    # 처음 기록하거나, 합쳤거나, 메시지가 줄어든 경우 전체를 다시 기록
+                    offset = 0
+                else:
+                    offset = known_count
+                if offset < len(messages) or offset != known_count:
+                    records.append((REC_MESSAGES, chat_id, offset, _stored_messages(messages[offset:])))
+                count = len(messages)
+
+            version = known_version
+            if records or meta != known_meta:
+                version += 1
+                if meta != known_meta:
+                    records.insert(0, (REC_SESSION, dict(meta, version=version)))
+                else:
+                    records.append((REC_VERSION, chat_id, version))
+                self._append_locked(username, lock_file, records)
+                persisted[chat_id] = (meta, count, version)
+
+        chat_session["version"] = version
+        return version
+
+    def delete_chat_session(self, username, chat_id):
+        """채팅 세션 삭제를 로그에 추가합니다."""
+        self._append(username, [(REC_DELETE, chat_id)])
+
+    def set_field(self, username, key, value):
+        """최상위 필드 하나(예: emotion_stats)의 값을 로그에 추가합니다."""
+        self._append(username, [(REC_SET, key, value)])
+
+    def apply_emotion_stats_change(self, username, chat_id, date, previous_emotion, emotion):
+        """
+        대화 하나의 감정 변경을 저장된 감정 누적 통계에 반영합니다.
+        잠금 안에서 마지막으로 기록된 통계를 고쳐 기록하므로 다른 탭의 변경을 덮어쓰지 않습니다.
+        """
+        if previous_emotion != emotion:
+            self.writer.submit(self._write_stats_change, username, chat_id, date, previous_emotion, emotion)
+
+    def _write_stats_change(self, username, chat_id, date, previous_emotion, emotion):
+        # 워커 스레드에서 실행
+        with self._lock(username) as lock_file:
+            self._refresh(username, lock_file)
+            sessions = [meta for meta, _, _ in self._persisted.get(username, {}).values()]
+            stats = apply_stored_change(
+                copy.deepcopy(self._stats.get(username)), sessions, chat_id, date, previous_emotion, emotion
+            )
+            self._append_locked(username, lock_file, [(REC_SET, "emotion_stats", stats)])
+
+    def append_goal_events(self, username, events, completed=()):
+        """
+        감정 목표 이벤트를 로그에 추가합니다.
+        completed: 이 이벤트로 달성한 목표 (로그보다 먼저 목표 보관함에 기록)
+        """
+        if events or completed:
+            self.writer.submit(self._write_goal_events, username, list(events), list(completed))
+
+    def _write_goal_events(self, username, events, completed):
+        # 워커 스레드에서 실행
+        with self._lock(username) as lock_file:
+            self._refresh(username, lock_file)
+            if completed:
+                self._archive_goals(username, completed)
+            if events:
+                self._append_locked(username, lock_file, [(REC_GOAL, event) for event in events])
+
+    def _archive_goals(self, username, goals):
+        """(잠금 안에서 호출) 목표 보관함에 목표를 덧붙입니다. 같은 id는 나중 것이 우선합니다."""
+        # 기록 도중 잘린 꼬리가 있으면 먼저 잘라냄
+        _read_records(self.goal_archive_path(username))
+        append_bytes(self.goal_archive_path(username), b"".join(encode_record(goal) for goal in goals))
+
+    # 압축
+    def compact_in_background(self, username):
+        """백그라운드 스레드에서 로그 압축을 시작합니다."""
+        with self._locks_guard:
+            if username in self._compacting:
+                return
+            self._compacting.add(username)
+        thread = threading.Thread(target=self._compact_guarded, args=(username,), daemon=True)
+        thread.start()
+
+    def _compact_guarded(self, username):
+        try:
+            self.compact(username)
+        except Exception as e:
+            print(f"로그 압축 오류 ({username}): {e}")
+        finally:
+            with self._locks_guard:
+                self._compacting.discard(username)
+
+    def compact(self, username):
+        """
+        현재 로그를 스냅샷에 반영합니다.
+        다른 프로세스의 압축과 겹치지 않도록 잠금을 잡은 채로 실행합니다.
+        (요청 스레드는 쓰기 큐에 넣기만 하므로 기다리지 않습니다.)
+        """
+        with self._lock(username) as lock_file:
+            if not os.path.exists(self.log_path(username)):
+                return
+            data, _ = self._replay(username)
+            atomic_write_bytes(self.snapshot_path(username), encode_snapshot(data))
+            os.remove(self.log_path(username))
+            self._log_records[username] = 0
+            self._changed(username, lock_file)